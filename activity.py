@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# event type -> headline shown in the admin activity feed
+EVENT_TITLES = {
+    'user_registered': 'New User',
+    'book_added': 'Book Added',
+    'book_borrowed': 'Book Borrowed',
+    'book_returned': 'Book Returned',
+}
+
+_COLUMNS = 'id, type, title, description, created_at'
+# ids below the newest one seen that each sync reads again: an event whose transaction
+# commits after a later-numbered one from another process still gets picked up
+SYNC_OVERLAP_IDS = int(os.environ.get('ACTIVITY_SYNC_OVERLAP_IDS', '50'))
+
+
+def _event(row):
+    ts = row['created_at']
+    return {
+        'id': row['id'],
+        'type': row['type'],
+        'title': row['title'],
+        'description': row['description'],
+        # created_at is stored in UTC, backfilled rows included (schema.sql)
+        'timestamp': ts.replace(tzinfo=timezone.utc).isoformat() if ts else None,
+    }
+
+
+def record(cur, event_type, description, user_id=None, book_id=None):
+    """Append an event to activity_events inside the caller's transaction.
+
+    Returns the event; hand it to ActivityFeed.publish() once the transaction
+    has committed so a rolled-back action never shows up in the feed.
+    """
+    title = EVENT_TITLES.get(event_type, event_type)
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    cur.execute('INSERT INTO activity_events (type, title, description, user_id, book_id, created_at) VALUES (%s,%s,%s,%s,%s,%s)',
+                (event_type, title, description, user_id, book_id, created_at))
+    return _event({'id': cur.lastrowid, 'type': event_type, 'title': title, 'description': description, 'created_at': created_at})
+
+
+class ActivityFeed:
+    """Ring buffer of the most recent activity events.
+
+    Events recorded by this process are appended as they commit. Events from
+    other processes are picked up by an incremental `id > last seen` query at
+    most every `sync_interval` seconds, so the usual small-limit reads are
+    served from memory. Limits larger than the buffer go to the database.
+
+    Callbacks registered with subscribe() receive each new event once, whether
+    it was published here or picked up from another process.
+    """
+
+    def __init__(self, size=200, sync_interval=2.0):
+        self.size = size
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._events = []
+        self._ids = set()
+        self._last_synced_id = None
+        self._synced_at = None
+        self._listeners = []
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, events):
+        for event in events:
+            for callback in self._listeners:
+                callback(event)
+
+    def publish(self, event):
+        with self._lock:
+            if self._synced_at is not None:
+                self._merge([event])
+        self._notify([event])
+
+    def _merge(self, events):
+        fresh = [e for e in events if e['id'] not in self._ids]
+        if not fresh:
+            return fresh
+        self._events.extend(fresh)
+        self._events.sort(key=lambda e: e['id'])
+        del self._events[:-self.size]
+        self._ids = {e['id'] for e in self._events}
+        # an event too old to stay in the buffer is not news either
+        return [e for e in fresh if e['id'] in self._ids]
+
+    def _sync(self, conn):
+        """Returns the events from other processes seen for the first time."""
+        priming = self._last_synced_id is None
+        cur = conn.cursor(dictionary=True)
+        try:
+            if priming:
+                cur.execute(f'SELECT {_COLUMNS} FROM activity_events ORDER BY created_at DESC, id DESC LIMIT %s', (self.size,))
+                rows = cur.fetchall()
+                self._events = []
+                self._ids = set()
+            else:
+                # re-read a trailing window of ids; _merge drops the ones already held
+                cur.execute(f'SELECT {_COLUMNS} FROM activity_events WHERE id > %s ORDER BY id LIMIT %s',
+                            (self._last_synced_id - SYNC_OVERLAP_IDS, self.size + SYNC_OVERLAP_IDS + 1))
+                rows = cur.fetchall()
+                if sum(1 for r in rows if r['id'] > self._last_synced_id) > self.size:
+                    # fell too far behind; start over from the newest events
+                    self._last_synced_id = None
+                    return self._sync(conn)
+        finally:
+            cur.close()
+        fresh = self._merge([_event(r) for r in rows])
+        # advance only past ids read from the table, not past events published locally
+        self._last_synced_id = max([self._last_synced_id or 0] + [r['id'] for r in rows])
+        self._synced_at = time.monotonic()
+        # the initial load is history, not news
+        return [] if priming else fresh
+
+    def _due(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval
+
+    def refresh(self, connect):
+        """Pick up other processes' events if the buffer is due a sync."""
+        with self._lock:
+            fresh = self._sync(connect()) if self._due() else []
+        self._notify(fresh)
+
+    def after(self, connect, after_id):
+        """(events, complete): the events with an id above `after_id`, oldest first.
+        Ids come from activity_events, so a cursor issued by any process works here;
+        complete is False when the buffer no longer reaches back to `after_id`."""
+        with self._lock:
+            fresh = self._sync(connect()) if self._due() else []
+            events = [e for e in self._events if e['id'] > after_id]
+            complete = len(events) < len(self._events) or len(self._events) < self.size
+        self._notify(fresh)
+        return events, complete
+
+    def recent(self, connect, limit=10):
+        """Newest-first events; `connect` is only called when the database is needed."""
+        if limit > self.size:
+            cur = connect().cursor(dictionary=True)
+            try:
+                cur.execute(f'SELECT {_COLUMNS} FROM activity_events ORDER BY created_at DESC, id DESC LIMIT %s', (limit,))
+                return [_event(r) for r in cur.fetchall()]
+            finally:
+                cur.close()
+        with self._lock:
+            fresh = self._sync(connect()) if self._due() else []
+            events = list(reversed(self._events[-limit:]))
+        self._notify(fresh)
+        return events
+
+
+activity_feed = ActivityFeed(
+    size=int(os.environ.get('ACTIVITY_BUFFER_SIZE', '200')),
+    sync_interval=float(os.environ.get('ACTIVITY_SYNC_SECONDS', '2')),
+)
@@ -0,0 +1,100 @@
+"""Async counterpart of db.get_db() for the ASGI entry point (asgi.py).
+
+Uses aiomysql with the same MYSQL_* settings and pool sizes as db.py. Each
+request task gets one connection on first use, bound to a context variable the
+way db.get_db() binds one to flask.g, and gives it back with release_db().
+Statements report to db's query listeners, so they show up in /api/_metrics
+and the slow-query log like synchronous ones.
+"""
+import asyncio
+import contextvars
+import time
+
+import aiomysql
+
+from db import _db_config, _pool_settings, _query_listeners
+
+_pool = None
+_pool_lock = None
+_conn = contextvars.ContextVar('adb_conn', default=None)
+# [statements, seconds] of the current request, see track_queries()
+_request_sql = contextvars.ContextVar('adb_request_sql', default=None)
+
+
+async def get_pool():
+    global _pool, _pool_lock
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                config = _db_config()
+                settings = _pool_settings()
+                _pool = await aiomysql.create_pool(
+                    minsize=1,
+                    maxsize=settings['pool_size'] + settings['max_overflow'],
+                    pool_recycle=settings['recycle'],
+                    autocommit=True,
+                    host=config['host'],
+                    port=config['port'],
+                    user=config['user'],
+                    password=config['password'],
+                    db=config['database'],
+                    charset='utf8mb4',
+                )
+    return _pool
+
+
+async def get_db():
+    """The current request's connection, acquired on first use."""
+    conn = _conn.get()
+    if conn is None:
+        pool = await get_pool()
+        conn = await asyncio.wait_for(pool.acquire(), _pool_settings()['timeout'])
+        _conn.set(conn)
+    return conn
+
+
+async def release_db():
+    conn = _conn.get()
+    if conn is not None:
+        _conn.set(None)
+        _pool.release(conn)
+
+
+def track_queries():
+    """Start counting the current request's statements; returns the live [count, seconds] pair."""
+    totals = [0, 0.0]
+    _request_sql.set(totals)
+    return totals
+
+
+async def fetchall(sql, params=()):
+    """Run one statement on the request's connection; rows come back as dicts."""
+    conn = await get_db()
+    start = time.perf_counter()
+    try:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+    finally:
+        elapsed = time.perf_counter() - start
+        totals = _request_sql.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+        for listener in _query_listeners:
+            listener(sql, elapsed)
+
+
+async def fetchone(sql, params=()):
+    rows = await fetchall(sql, params)
+    return rows[0] if rows else None
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
@@ -1,13 +1,34 @@
 
-from flask import Flask, request, jsonify, send_from_directory, make_response, g, render_template, session
+from flask import Flask, request, jsonify, send_from_directory, make_response, g, render_template, session, has_request_context
+import hashlib
+import io
+import json
 import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from db import get_db, init_db
-from passlib.hash import pbkdf2_sha256
+from db import WAIT_BUCKETS, add_query_listener, connect, ensure_schema, get_db, get_pool
+from mysql.connector import IntegrityError, errorcode
+from search import LOAD_SQL as SEARCH_LOAD_SQL, SORT_COLUMNS, get_search_index, sort_key
+import importer
+from cache import cache_signal, catalog_cache, fragment_cache, Snapshot, TTLCache
+import fastjson
+from compress import CompressionMiddleware
+from assets import IMMUTABLE, asset_store, static_files
+import activity
+import categories
+from activity import activity_feed
+from push import Broker, Pump
+from metrics import COUNT_BUCKETS, LATENCY_BUCKETS, SIZE_BUCKETS, registry, render_histogram
+import querydebug
+from querydebug import query_budget
+import tokens
+from tokens import BUMP_TOKEN_VERSION, CLAIMS_VERSION, TokenSweeper, token_generations, user_claims
+from pagination import clamp_limit, encode_cursor, decode_cursor, keyset_page, keyset_query, keyset_result, keyset_seek, CursorError
+from passwords import PasswordPoolBusy, password_pool
 import jwt
 from datetime import datetime, timedelta, timezone
-from uuid import uuid4
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,14 +38,20 @@ SECRET = os.environ.get('LIBRARY_SECRET', 'change-me-in-production')
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
-
-# Configure basic logging for development
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+fastjson.install(app)
+# gzip/br/zstd for /api/ responses over COMPRESS_MIN_BYTES
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+# templates are compiled with their script/stylesheet tags pointing at the built bundles
+app.jinja_loader = asset_store.template_loader(app.jinja_loader)
+# looked up by catch_all instead of probing the filesystem per request
+_STATIC_FILES = static_files(app.static_folder)
+
+# Configure basic logging; LOG_LEVEL=DEBUG for verbose development logs. SQL visibility
+# comes from /api/_metrics and the sql.slow log rather than mysql.connector DEBUG output
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 logger = logging.getLogger(__name__)
-# enable more verbose logs for werkzeug and mysql connector during dev
-logging.getLogger('werkzeug').setLevel(logging.DEBUG)
-logging.getLogger('mysql.connector').setLevel(logging.DEBUG)
-app.logger.setLevel(logging.DEBUG)
+app.logger.setLevel(LOG_LEVEL)
 
 @app.teardown_appcontext
 def close_db_on_teardown(exc):
@@ -44,45 +71,423 @@ def close_db_on_teardown(exc):
 	except Exception:
 		pass
 
+
+# ===== METRICS =====
+# Scraped from /api/_metrics. Every statement run through a pooled connection is
+# timed by a db query listener; those slower than SLOW_QUERY_MS go to the sql.slow log.
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_MS', '200')) / 1000
+slow_query_log = logging.getLogger('sql.slow')
+SQL_VERBS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+http_requests = registry.counter('http_requests_total', 'Requests served.', ('endpoint', 'method', 'status'))
+http_latency = registry.histogram('http_request_duration_seconds', 'Time to produce the response.', LATENCY_BUCKETS, ('endpoint', 'method'))
+http_response_size = registry.histogram('http_response_size_bytes', 'Response body size (unstreamed responses).', SIZE_BUCKETS, ('endpoint',))
+request_queries = registry.histogram('http_request_sql_queries', 'SQL statements executed per request.', COUNT_BUCKETS, ('endpoint',))
+request_sql_time = registry.histogram('http_request_sql_seconds', 'Time spent executing SQL per request.', LATENCY_BUCKETS, ('endpoint',))
+sql_latency = registry.histogram('sql_statement_duration_seconds', 'SQL statement execution time.', LATENCY_BUCKETS, ('verb',))
+slow_queries = registry.counter('sql_slow_statements_total', 'Statements slower than SLOW_QUERY_MS.', ('endpoint',))
+
+
+def _endpoint_label():
+	# the URL rule, not the path, so label cardinality stays bounded
+	rule = request.url_rule
+	return rule.rule if rule is not None else 'unmatched'
+
+
+def _on_query(statement, seconds):
+	if isinstance(statement, (bytes, bytearray)):
+		statement = statement.decode('utf-8', 'replace')
+	words = statement.split(None, 1)
+	verb = words[0].upper() if words else ''
+	sql_latency.observe(seconds, verb if verb in SQL_VERBS else 'OTHER')
+	endpoint = 'background'
+	if has_request_context():
+		g._sql_count = g.get('_sql_count', 0) + 1
+		g._sql_seconds = g.get('_sql_seconds', 0.0) + seconds
+		endpoint = _endpoint_label()
+		if querydebug.ENABLED:
+			g.setdefault('_queries', []).append((querydebug.statement_shape(statement), seconds))
+	if seconds >= SLOW_QUERY_SECONDS:
+		slow_queries.inc(endpoint)
+		slow_query_log.warning('%.1f ms [%s] %s', seconds * 1000, endpoint, ' '.join(statement.split())[:1000])
+
+
+add_query_listener(_on_query)
+
+
+@app.before_request
+def _start_request_timer():
+	g._request_start = time.perf_counter()
+
+
+@app.before_request
+def _check_cache_signal():
+	# catch up with writes made by the other worker processes; a query at most every CACHE_SIGNAL_INTERVAL
+	cache_signal.check(get_db)
+
+
+@app.after_request
+def _record_request_metrics(response):
+	start = g.get('_request_start')
+	if start is None:
+		return response
+	endpoint = _endpoint_label()
+	http_latency.observe(time.perf_counter() - start, endpoint, request.method)
+	http_requests.inc(endpoint, request.method, str(response.status_code))
+	if response.content_length is not None:
+		http_response_size.observe(response.content_length, endpoint)
+	request_queries.observe(g.get('_sql_count', 0), endpoint)
+	request_sql_time.observe(g.get('_sql_seconds', 0.0), endpoint)
+	return response
+
+
+if querydebug.ENABLED:
+	@app.after_request
+	def _check_query_budget(response):
+		# QUERY_DEBUG: per-request statement summary in a header, N+1 shapes and budget overruns logged
+		view = app.view_functions.get(request.endpoint)
+		budget = querydebug.budget_for(view, request.method)
+		summary = querydebug.summarize(g.get('_queries', []), budget)
+		response.headers[querydebug.HEADER] = querydebug.header_value(summary)
+		if summary['over_budget'] or summary['repeated']:
+			logger.warning('query budget %s %s: %s', request.method, _endpoint_label(), querydebug.header_value(summary))
+			if querydebug.STRICT:
+				raise querydebug.QueryBudgetExceeded(f'{request.method} {_endpoint_label()}: {querydebug.header_value(summary)}')
+		return response
+
+
+@registry.collector
+def _pool_metrics():
+	try:
+		stats = get_pool().stats()
+	except Exception:
+		return []
+	lines = []
+	for key in ('open', 'idle', 'checked_out', 'waiting'):
+		lines += [f'# TYPE db_pool_{key} gauge', f'db_pool_{key} {stats[key]}']
+	for key in ('checkouts', 'checkout_failures', 'checkout_timeouts', 'recycled'):
+		lines += [f'# TYPE db_pool_{key}_total counter', f'db_pool_{key}_total {stats[key]}']
+	wait = stats['wait_seconds']
+	lines += ['# HELP db_pool_wait_seconds Time spent waiting for a pooled connection.', '# TYPE db_pool_wait_seconds histogram']
+	lines += render_histogram('db_pool_wait_seconds', (), (), WAIT_BUCKETS, list(wait['buckets'].values()), wait['sum'], wait['count'])
+	return lines
+
+
 def error_response(message="Error", status_code=400, error_code=None):
     from flask import jsonify
     return jsonify({'status': 'error', 'message': message, 'error_code': error_code, 'timestamp': datetime.utcnow().isoformat()}), status_code
 
-def create_access_token(user_id, expires_delta=None):
+def create_access_token(user_id, expires_delta=None, user=None):
+	"""`user`, a users row with is_admin, is_subscriber, status and token_version,
+	embeds those flags as claims so requests carrying the token need no users lookup."""
 	expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
 	payload = {'user_id': user_id, 'exp': expire}
+	if user is not None:
+		payload['usr'] = user_claims(user)
 	token = jwt.encode(payload, SECRET, algorithm='HS256')
 	return token
 
 
+# Purges expired/revoked refresh tokens and spent password resets in the background
+token_sweeper = TokenSweeper(
+	lambda: get_pool().get_connection(),
+	interval=float(os.environ.get('TOKEN_SWEEP_SECONDS', '300')),
+	batch_size=int(os.environ.get('TOKEN_SWEEP_BATCH', '1000')),
+)
+
+# Verified token payloads, each kept only until the token's own exp, so a repeat
+# request skips the decode and HMAC check
+token_cache = TTLCache(
+	maxsize=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', '10000')),
+	ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+# users.is_admin / is_subscriber / status by user id; _user_changed() drops an entry
+user_cache = TTLCache(
+	maxsize=int(os.environ.get('USER_CACHE_SIZE', '10000')),
+	ttl=float(os.environ.get('USER_CACHE_TTL', '30')),
+)
+
+
+def _verified_payload(token):
+	payload = token_cache.get(token)
+	if payload is None:
+		try:
+			payload = jwt.decode(token, SECRET, algorithms=['HS256'])
+		except Exception:
+			return None
+		exp = payload.get('exp')
+		ttl = exp - time.time() if exp else None
+		if ttl is None or ttl > 0:
+			token_cache.set(token, payload, ttl=ttl)
+	return payload
+
+
 def verify_access_token(token):
-	try:
-		payload = jwt.decode(token, SECRET, algorithms=['HS256'])
-		return payload.get('user_id')
-	except Exception:
+	payload = _verified_payload(token)
+	return payload.get('user_id') if payload else None
+
+
+USER_ATTRS_SQL = 'SELECT is_admin, is_subscriber, status FROM users WHERE id = %s'
+
+
+def _cache_user_attrs(user_id, row, since=None):
+	attrs = {
+		'exists': row is not None,
+		'is_admin': bool(row and row.get('is_admin')),
+		'is_subscriber': bool(row and row.get('is_subscriber')),
+		'status': row.get('status') if row else None,
+	}
+	user_cache.set(user_id, attrs, tags=[f'user:{user_id}'], since=since)
+	return attrs
+
+
+def _user_attrs_queries(user_id):
+	"""Query generator (see _run_queries) for the flags of `user_id`: user_cache, else one query."""
+	attrs = user_cache.get(user_id)
+	if attrs is None:
+		generation = user_cache.generation
+		rows = yield USER_ATTRS_SQL, (user_id,)
+		attrs = _cache_user_attrs(user_id, rows[0] if rows else None, generation)
+	return attrs
+
+
+def _user_attrs(user_id):
+	return _run_queries(_user_attrs_queries(user_id))
+
+
+def _claims_attrs(claims, generation):
+	"""User flags from token claims, or None when they are missing or older than `generation`."""
+	if not isinstance(claims, dict) or claims.get('v') != CLAIMS_VERSION or claims.get('gen', -1) < generation:
 		return None
+	return {
+		'exists': True,
+		'is_admin': bool(claims.get('admin')),
+		'is_subscriber': bool(claims.get('subscriber')),
+		'status': claims.get('status'),
+	}
+
+
+class Principal:
+	"""The authenticated caller of the current request. User flags come from the
+	token's claims while its generation is current, otherwise they are read at
+	most once per request, from user_cache rather than the database when warm."""
+
+	def __init__(self, user_id, claims=None):
+		self.user_id = user_id
+		self.claims = claims
+		self._attrs = None
+
+	@property
+	def attrs(self):
+		if self._attrs is None:
+			attrs = None
+			if self.claims:
+				attrs = _claims_attrs(self.claims, token_generations.current(self.user_id, get_db))
+			self._attrs = attrs or _user_attrs(self.user_id)
+		return self._attrs
+
+	@property
+	def is_admin(self):
+		return self.attrs['is_admin']
+
+	@property
+	def is_subscriber(self):
+		return self.attrs['is_subscriber']
+
+	@property
+	def status(self):
+		return self.attrs['status']
+
+
+def _request_token(allow_cookie=True):
+	auth = request.headers.get('Authorization', '')
+	if auth.startswith('Bearer '):
+		return auth.split(' ', 1)[1].strip()
+	return request.cookies.get('auth') if allow_cookie else None
+
+
+def current_principal(allow_cookie=True):
+	"""Principal for the request's bearer token (or auth cookie), or None. Resolved once per request."""
+	principal = g.get('principal')
+	if principal is None:
+		token = _request_token(allow_cookie)
+		payload = _verified_payload(token) if token else None
+		if payload and payload.get('user_id'):
+			principal = g.principal = Principal(payload['user_id'], payload.get('usr'))
+	return principal
 
 
 def require_auth(fn):
 	def wrapper(*args, **kwargs):
-		auth = request.headers.get('Authorization', '')
-		token = None
-		if auth.startswith('Bearer '):
-			token = auth.split(' ', 1)[1].strip()
-		else:
-			token = request.cookies.get('auth')
-
-		user_id = None
-		if token:
-			user_id = verify_access_token(token)
-		if not user_id:
+		principal = current_principal()
+		if principal is None:
 			return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
-		g.user_id = user_id
+		g.user_id = principal.user_id
 		return fn(*args, **kwargs)
 	wrapper.__name__ = fn.__name__
 	return wrapper
 
 
+# columns whose change can move a book in or out of a listing, or reorder it
+LISTING_FIELDS = {'title', 'author', 'category', 'description', 'rating', 'created_at'}
+SEARCH_FIELDS = {'title', 'author', 'category', 'description'}
+# columns category_stats is computed from
+CATEGORY_STAT_FIELDS = {'category', 'price', 'available_copies'}
+
+
+def _catalog_books_changed(db, changes):
+	"""Bring derived catalog state (read cache, search index) in line with written book rows.
+
+	`changes` maps book_id -> the columns that changed, or None for a new row.
+	"""
+	tags = set()
+	reindex = []
+	stale_dashboard = False
+	for book_id, fields in changes.items():
+		changed = None if fields is None else set(fields)
+		tags.add(f'book:{book_id}')
+		if changed is None or changed & LISTING_FIELDS:
+			tags.add('books')
+		if changed is None or 'category' in changed:
+			tags.add('categories')
+		if changed is None or changed & CATEGORY_STAT_FIELDS:
+			tags.add('facets')
+		if changed is None or changed & {'available_copies', 'total_copies'}:
+			tags.add('stats')
+		if changed is None or changed & {'available_copies', 'price'}:
+			stale_dashboard = True
+		if changed is None or changed & SEARCH_FIELDS or changed & set(SORT_COLUMNS):
+			reindex.append(book_id)
+	catalog_cache.invalidate(*tags)
+	fragment_cache.invalidate(*(f'book:{book_id}' for book_id in changes))
+	if stale_dashboard:
+		dashboard_stats.invalidate()
+	_signal_workers('search' if reindex else 'catalog')
+
+	index = get_search_index()
+	if not index.loaded or not reindex:
+		return
+	cur = db.cursor(dictionary=True)
+	try:
+		cur.execute(SEARCH_LOAD_SQL + ' WHERE id IN (' + ','.join(['%s'] * len(reindex)) + ')', tuple(reindex))
+		rows = cur.fetchall()
+	finally:
+		cur.close()
+	for row in rows:
+		index.add(row)
+	found = {row['id'] for row in rows}
+	for book_id in reindex:
+		if book_id not in found:
+			index.remove(book_id)
+
+
+def _catalog_key_assignment(changed):
+	"""The SET clause keeping catalog_key (the importer's natural key) in step with a title/author change."""
+	return [f'catalog_key = {importer.CATALOG_KEY_COLUMNS_SQL}'] if {'title', 'author'} & set(changed) else []
+
+
+def _duplicate_book():
+	return jsonify({'status': 'error', 'message': 'A book with this title and author already exists'}), 409
+
+
+def _release_active_loans(cur, book_ids):
+	"""Take the open loans on `book_ids` off their borrowers' active_loans; run before
+	deleting the books, whose borrowings go with them (ON DELETE CASCADE)."""
+	cur.execute('''UPDATE users u JOIN (SELECT user_id, COUNT(*) AS n FROM borrowings
+		WHERE book_id IN ''' + _in_list(book_ids) + ''' AND status = 'borrowed' GROUP BY user_id) b ON b.user_id = u.id
+		SET u.active_loans = GREATEST(u.active_loans - b.n, 0)''', tuple(book_ids))
+
+
+def _catalog_book_changed(db, book_id, fields=None):
+	_catalog_books_changed(db, {book_id: fields})
+
+
+def _catalog_etag(*parts):
+	"""Strong validator computed once when a catalog entry is cached, so a matching
+	If-None-Match can be answered without touching the database or serializing."""
+	return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+
+def _not_modified(etag):
+	# weak comparison: a compressed response carries the same tag as W/"..."
+	if request.if_none_match.contains_weak(etag):
+		resp = make_response('', 304)
+		resp.set_etag(etag)
+		resp.headers['Cache-Control'] = 'no-cache'
+		return resp
+	return None
+
+
+def _with_etag(resp, etag):
+	resp.set_etag(etag)
+	# clients may keep the body but must revalidate it on every use
+	resp.headers['Cache-Control'] = 'no-cache'
+	return resp
+
+
+def _catalog_books_deleted(book_ids):
+	catalog_cache.invalidate('books', 'categories', 'facets', 'stats', *(f'book:{book_id}' for book_id in book_ids))
+	fragment_cache.invalidate(*(f'book:{book_id}' for book_id in book_ids))
+	dashboard_stats.invalidate()
+	index = get_search_index()
+	for book_id in book_ids:
+		index.remove(book_id)
+	_signal_workers('search')
+
+
+def _catalog_book_deleted(book_id):
+	_catalog_books_deleted([book_id])
+
+
+def _catalog_reloaded():
+	"""Drop all derived catalog state after a bulk write touched an unknown set of books."""
+	catalog_cache.clear()
+	fragment_cache.clear()
+	dashboard_stats.invalidate()
+	get_search_index().clear()
+	_signal_workers('search')
+
+
+def _user_changed(user_id):
+	"""Drop derived state after a users row was inserted or its flags/status changed."""
+	user_cache.invalidate(f'user:{user_id}')
+	# pick up a token_version bump on the next claims check
+	token_generations.mark_stale()
+	dashboard_stats.invalidate()
+	_signal_workers('users')
+
+
+def _signal_workers(scope):
+	"""Bump `scope` in cache_versions after a committed write, so the other worker
+	processes drop their copies within CACHE_SIGNAL_INTERVAL (see _signalled_*)."""
+	db = get_db()
+	cur = db.cursor()
+	try:
+		cache_signal.bump(cur, scope)
+	finally:
+		cur.close()
+	db.commit()
+
+
+def _signalled_catalog(search=False):
+	# another process wrote books; which ones is not known here
+	catalog_cache.clear()
+	dashboard_stats.invalidate()
+	if search:
+		get_search_index().clear()
+
+
+def _signalled_users():
+	user_cache.clear()
+	token_generations.mark_stale()
+	dashboard_stats.invalidate()
+
+
+cache_signal.on('catalog', _signalled_catalog)
+cache_signal.on('search', lambda: _signalled_catalog(search=True))
+cache_signal.on('users', _signalled_users)
+
+
 @app.route('/api/health')
 def health():
 	return jsonify({'status': 'success', 'message': 'ok'})
@@ -118,6 +523,47 @@ def debug_books_count():
 		return jsonify({'status':'error','message': str(e)})
 
 
+@app.route('/api/_debug/catalog_cache')
+def debug_catalog_cache():
+	# hit/miss/eviction counters for sizing CATALOG_CACHE_SIZE / CATALOG_CACHE_TTL
+	return jsonify({'status': 'success', 'data': dict(catalog_cache.stats(), signal=cache_signal.stats())})
+
+
+@app.route('/api/_debug/password_pool')
+def debug_password_pool():
+	# password hashing workers: in-flight calls against PASSWORD_MAX_PENDING and shed requests
+	return jsonify({'status': 'success', 'data': password_pool.stats()})
+
+
+@app.route('/api/_debug/auth_cache')
+def debug_auth_cache():
+	# verified-token and user-attribute cache counters (AUTH_TOKEN_CACHE_SIZE, USER_CACHE_SIZE / USER_CACHE_TTL)
+	return jsonify({'status': 'success', 'data': {
+		'tokens': token_cache.stats(), 'users': user_cache.stats(), 'token_versions': token_generations.stats(),
+		'sweeper': token_sweeper.stats()}})
+
+
+@app.route('/api/_metrics')
+def metrics_endpoint():
+	# Prometheus text exposition format
+	return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/_debug/db_pool')
+def debug_db_pool():
+	# live pool occupancy, checkout wait histogram and failure counters
+	return jsonify({'status': 'success', 'data': get_pool().stats()})
+
+
+@app.route('/api/_debug/push')
+def debug_push():
+	# live admin update subscribers and how often the shared pump has recomputed
+	data = push_broker.stats()
+	data['pump_ticks'] = push_pump.ticks
+	data['dashboard_refreshes'] = dashboard_stats.refreshes
+	return jsonify({'status': 'success', 'data': data})
+
+
 @app.route('/api/auth/register', methods=['POST'])
 def register():
 	body = request.get_json() or {}
@@ -133,13 +579,21 @@ def register():
 	if cur.fetchone():
 		return jsonify({'status': 'error', 'message': 'Email already registered'}), 400
 
-	hashed = pbkdf2_sha256.hash(password)
+	hashed = password_pool.hash(password)
 	cur.execute('INSERT INTO users (name, email, password, created_at, status) VALUES (%s,%s,%s,NOW(),%s)', (name, email, hashed, 'active'))
-	db.commit()
 	uid = cur.lastrowid
+	event = activity.record(cur, 'user_registered', f'{name or email} registered to the platform', user_id=uid)
+	db.commit()
+	activity_feed.publish(event)
+	_user_changed(uid)
 	return jsonify({'status': 'success', 'data': {'user_id': uid}})
 
 
+def _store_upgraded_hash(cur, row, upgraded):
+	# rehashed with the current PASSWORD_HASH_ROUNDS; only if nobody changed the password meanwhile
+	cur.execute('UPDATE users SET password = %s WHERE id = %s AND password = %s', (upgraded, row['id'], row['password']))
+
+
 @app.route('/api/auth/login', methods=['POST'])
 def login():
 	body = request.get_json() or {}
@@ -150,17 +604,18 @@ def login():
 
 	db = get_db()
 	cur = db.cursor(dictionary=True)
-	cur.execute('SELECT id, password, is_admin FROM users WHERE email = %s', (email,))
+	cur.execute('SELECT id, password, is_admin, is_subscriber, status, token_version FROM users WHERE email = %s', (email,))
 	row = cur.fetchone()
-	if not row or not row.get('password') or not pbkdf2_sha256.verify(password, row['password']):
+	ok, upgraded = password_pool.verify(password, row.get('password')) if row else (False, None)
+	if not ok:
 		return jsonify({'status': 'error', 'message': 'Invalid credentials'}), 401
+	if upgraded:
+		_store_upgraded_hash(cur, row, upgraded)
 
-	access = create_access_token(row['id'])
-	# create refresh token (simple random string)
-	import uuid
-	refresh = str(uuid.uuid4())
-	cur.execute('INSERT INTO refresh_tokens (user_id, token, created_at) VALUES (%s,%s,NOW())', (row['id'], refresh))
+	access = create_access_token(row['id'], user=row)
+	refresh = tokens.issue_refresh_token(cur, row['id'])
 	db.commit()
+	token_sweeper.start()
 
 	return jsonify({'status': 'success', 'data': {'access_token': access, 'refresh_token': refresh, 'user_id': row['id'], 'is_admin': bool(row.get('is_admin', False))}})
 
@@ -172,16 +627,18 @@ def admin_login():
 	password = body.get('password')
 	db = get_db()
 	cur = db.cursor(dictionary=True)
-	cur.execute('SELECT id, password, is_admin FROM users WHERE email = %s', (email,))
+	cur.execute('SELECT id, password, is_admin, is_subscriber, status, token_version FROM users WHERE email = %s', (email,))
 	row = cur.fetchone()
-	if not row or not row.get('is_admin') or not row.get('password') or not pbkdf2_sha256.verify(password, row['password']):
+	ok, upgraded = password_pool.verify(password, row.get('password')) if row and row.get('is_admin') else (False, None)
+	if not ok:
 		return jsonify({'status': 'error', 'message': 'Invalid admin credentials'}), 401
+	if upgraded:
+		_store_upgraded_hash(cur, row, upgraded)
 
-	access = create_access_token(row['id'])
-	import uuid
-	refresh = str(uuid.uuid4())
-	cur.execute('INSERT INTO refresh_tokens (user_id, token, created_at) VALUES (%s,%s,NOW())', (row['id'], refresh))
+	access = create_access_token(row['id'], user=row)
+	refresh = tokens.issue_refresh_token(cur, row['id'])
 	db.commit()
+	token_sweeper.start()
 	return jsonify({'status': 'success', 'data': {'access_token': access, 'refresh_token': refresh, 'admin_id': row['id'], 'role': 'admin'}})
 
 
@@ -193,13 +650,15 @@ def refresh_token():
 		return jsonify({'status': 'error', 'message': 'refresh_token required'}), 400
 	db = get_db()
 	cur = db.cursor(dictionary=True)
-	cur.execute('SELECT user_id FROM refresh_tokens WHERE token = %s', (token,))
-	row = cur.fetchone()
-	if not row:
+	# single use: the presented token is spent and a new one issued in the same transaction
+	rotated = tokens.rotate_refresh_token(cur, token)
+	db.commit()
+	if not rotated:
 		return jsonify({'status': 'error', 'message': 'Invalid refresh token'}), 401
+	row, refresh = rotated
 	user_id = row['user_id']
-	access = create_access_token(user_id)
-	return jsonify({'status': 'success', 'data': {'access_token': access, 'refresh_token': token, 'user_id': user_id}})
+	access = create_access_token(user_id, user=row)
+	return jsonify({'status': 'success', 'data': {'access_token': access, 'refresh_token': refresh, 'user_id': user_id}})
 
 
 @app.route('/api/auth/forgot-password', methods=['POST'])
@@ -221,10 +680,7 @@ def forgot_password():
 		return jsonify({'status': 'success', 'message': 'If the email exists, a reset link was sent'})
 
 	user_id = row['id']
-	token = str(uuid4())
-	expires = datetime.now(timezone.utc) + timedelta(hours=1)
-	cur.execute('INSERT INTO password_resets (user_id, token, expires_at, used, created_at) VALUES (%s,%s,%s,0,NOW())',
-				(user_id, token, expires))
+	token, expires = tokens.issue_reset_token(cur, user_id)
 	db.commit()
 
 	# NOTE: In production, send token via email. For now return token for testing/dev.
@@ -242,22 +698,15 @@ def reset_password():
 
 	db = get_db()
 	cur = db.cursor(dictionary=True)
-	cur.execute('SELECT id, user_id, expires_at, used FROM password_resets WHERE token = %s', (token,))
-	row = cur.fetchone()
-	if not row:
-		return jsonify({'status': 'error', 'message': 'Invalid token'}), 400
-
-	if row.get('used'):
-		return jsonify({'status': 'error', 'message': 'Token already used'}), 400
+	user_id, error = tokens.claim_reset_token(cur, token)
+	if error:
+		db.rollback()
+		return jsonify({'status': 'error', 'message': error}), 400
 
-	expires_at = row.get('expires_at')
-	if not expires_at or expires_at < datetime.now(timezone.utc):
-		return jsonify({'status': 'error', 'message': 'Token expired'}), 400
-
-	user_id = row['user_id']
-	hashed = pbkdf2_sha256.hash(new_password)
+	hashed = password_pool.hash(new_password)
 	cur.execute('UPDATE users SET password = %s WHERE id = %s', (hashed, user_id))
-	cur.execute('UPDATE password_resets SET used = 1 WHERE id = %s', (row['id'],))
+	# a password reset signs the user out everywhere
+	tokens.revoke_user_sessions(cur, user_id)
 	db.commit()
 
 	return jsonify({'status': 'success', 'message': 'Password updated'})
@@ -289,83 +738,268 @@ def logout():
 	if token:
 		db = get_db()
 		cur = db.cursor()
-		cur.execute('DELETE FROM refresh_tokens WHERE token = %s', (token,))
+		tokens.revoke_refresh_token(cur, token)
 		db.commit()
 	resp = make_response(jsonify({'status': 'success'}))
 	resp.delete_cookie('auth')
 	return resp
 
 
+# sort parameter -> (keyset column, ascending); anything else lists newest ids first
+BOOK_SORTS = {
+	'newest': ('created_at', False),
+	'rating': ('rating', False),
+	'title_az': ('title', True),
+}
+
+
+# stored columns a listing may return through ?fields= (catalog_key is internal)
+BOOK_COLUMNS = ('id', 'title', 'author', 'category', 'price', 'rating', 'image_url', 'reviews', 'has_pdf',
+				'total_copies', 'available_copies', 'description', 'created_at')
+# fields computed by the listing query itself
+BOOK_COMPUTED = {'availability': "IF(has_pdf, 'Available', 'Coming Soon')"}
+# default listing projection; full rows (description included) come from /api/books/<id>
+CARD_FIELDS = ('id', 'title', 'author', 'category', 'price', 'rating', 'image_url', 'availability')
+
+
+def _listing_fields(value):
+	"""Parse ?fields=a,b into a tuple of field names, CARD_FIELDS when absent. id is always included.
+	Raises ValueError on unknown names."""
+	if not value:
+		return CARD_FIELDS
+	fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+	unknown = [f for f in fields if f not in BOOK_COLUMNS and f not in BOOK_COMPUTED and f != 'display_price']
+	if unknown:
+		raise ValueError('Unknown fields: ' + ', '.join(unknown))
+	return fields if 'id' in fields else ('id',) + fields
+
+
+def _listing_select(fields, sort_column):
+	"""SELECT clause for a projection, plus the helper columns fetched only for paging or
+	display_price that _shape_listing_rows drops again."""
+	columns = [f for f in fields if f in BOOK_COLUMNS]
+	helpers = [c for c in (sort_column, 'price' if 'display_price' in fields else None) if c and c not in columns]
+	select = columns + helpers + [f'{BOOK_COMPUTED[f]} AS {f}' for f in fields if f in BOOK_COMPUTED]
+	return 'SELECT ' + ', '.join(select) + ' FROM books WHERE 1=1', tuple(dict.fromkeys(helpers))
+
+
+def _shape_listing_rows(rows, fields, helpers):
+	"""Finish rows in place once, when a listing is cached: the non-subscriber display_price,
+	and no helper columns."""
+	with_price = 'display_price' in fields
+	for row in rows:
+		if with_price:
+			row['display_price'] = float(row.get('price') or 0)
+		for column in helpers:
+			del row[column]
+	return rows
+
+
+def _sorted_search_page(index, q, category, sort, column, ascending, cursor, limit):
+	"""(ids, direction) of one page of an explicitly sorted search, for keyset_result().
+	Every match is ordered in memory on the sort key the index keeps, so only the page's
+	ids reach SQL however many books match."""
+	keyed = index.sorted_matches(q, column, category=category)
+	return keyset_seek(keyed, sort, ascending, cursor, limit, key=lambda value: sort_key(column, value))
+
+
+def _rows_in_order(rows, ids):
+	"""`rows` fetched by `id IN ids`, in the order of `ids`."""
+	rank = {book_id: pos for pos, book_id in enumerate(ids)}
+	return sorted(rows, key=lambda r: rank[r['id']])
+
+
+def _advance(steps, rows):
+	"""Send `rows` into a query generator: (False, next (sql, params)) or (True, its result)."""
+	try:
+		return False, steps.send(rows)
+	except StopIteration as done:
+		return True, done.value
+
+
+def _run_queries(steps, connect=get_db):
+	"""Run a query generator: each (sql, params) it yields is executed on a dictionary cursor
+	and the fetched rows sent back. The read paths shared with asgi.py are written this way
+	so both servers run the same SQL and shaping; `connect` is only called if a statement is needed."""
+	cur = rows = None
+	try:
+		while True:
+			done, value = _advance(steps, rows)
+			if done:
+				return value
+			if cur is None:
+				cur = connect().cursor(dictionary=True)
+			cur.execute(*value)
+			rows = cur.fetchall()
+	finally:
+		if cur is not None:
+			cur.close()
+
+
+def _book_listing_queries(index, q, category, sort, limit, cursor, fields=CARD_FIELDS):
+	"""Query generator (see _run_queries) for one page of books projected to `fields`; `index` is the
+	loaded search index, used only with `q`. Returns (rows, next_cursor, prev_cursor); raises CursorError."""
+	params = []
+	column, ascending = BOOK_SORTS.get(sort, ('id', False))
+	relevance = q and sort not in BOOK_SORTS
+	sql, helpers = _listing_select(fields, None if relevance else column)
+	next_cursor = prev_cursor = None
+	if relevance:
+		# full-text lookup through the in-process index instead of LIKE '%q%' scans;
+		# relevance order pages through the ranked hits by position
+		start = 0
+		if cursor:
+			_, start, _ = decode_cursor(cursor, 'relevance')
+			start = max(0, int(start))
+		hits = index.search(q, category=category, limit=start + limit + 1)
+		ranked_ids = [book_id for book_id, _ in hits[start:start + limit]]
+		rows = []
+		if ranked_ids:
+			rows = _rows_in_order((yield sql + ' AND id IN ' + _in_list(ranked_ids), tuple(ranked_ids)), ranked_ids)
+		if len(hits) > start + limit:
+			next_cursor = encode_cursor('relevance', 'next', start + limit, 0)
+		if start > 0:
+			prev_cursor = encode_cursor('relevance', 'prev', max(0, start - limit), 0)
+	elif q:
+		# an explicit sort seeks through every match in the index's key order
+		page_ids, direction = _sorted_search_page(index, q, category, sort, column, ascending, cursor, limit)
+		rows = []
+		if page_ids:
+			rows = _rows_in_order((yield sql + ' AND id IN ' + _in_list(page_ids), tuple(page_ids)), page_ids)
+		rows, next_cursor, prev_cursor = keyset_result(rows, sort, column, direction, cursor, limit)
+	else:
+		if category:
+			sql += " AND category = %s"
+			params.append(category)
+		sql, params, direction = keyset_query(sql, params, sort or 'id', column, ascending, cursor, limit)
+		rows, next_cursor, prev_cursor = keyset_result((yield sql, params), sort or 'id', column, direction, cursor, limit)
+	return _shape_listing_rows(rows, fields, helpers), next_cursor, prev_cursor
+
+
+def _load_book_listing(db, q, category, sort, limit, cursor, fields=CARD_FIELDS):
+	"""Fetch one page of books projected to `fields`. Returns (rows, next_cursor, prev_cursor); raises CursorError."""
+	index = None
+	if q:
+		index = get_search_index()
+		index.ensure_loaded(db)
+	return _run_queries(_book_listing_queries(index, q, category, sort, limit, cursor, fields), lambda: db)
+
+
+def _book_fragments(rows, fields, user_is_sub):
+	"""Pre-encoded JSON of each listing row from fragment_cache, encoding and caching the misses.
+	A fragment is reused only if it was encoded from an equal row, so it is never staler than the listing."""
+	# display_price is the only per-caller field; cached rows carry the public price
+	variant = user_is_sub and 'display_price' in fields
+	keys = [(row['id'], fields, variant) for row in rows]
+	fragments = []
+	for key, row, cached in zip(keys, rows, fragment_cache.get_many(keys)):
+		if cached is None or (cached[0] is not row and cached[0] != row):
+			cached = (row, fastjson.dumps(dict(row, display_price=0.0) if variant else row))
+			fragment_cache.set(key, cached, tags=[f'book:{key[0]}'])
+		fragments.append(cached[1])
+	return fragments
+
+
+def _book_listing_body(rows, next_cursor, prev_cursor, fields, user_is_sub, facets=None):
+	"""The /api/books JSON body, concatenated from per-book fragments and, if given, encoded facets."""
+	return b''.join((
+		b'{"status":"success","data":{"books":[', b','.join(_book_fragments(rows, fields, user_is_sub)),
+		b'],"next_cursor":', fastjson.dumps(next_cursor), b',"prev_cursor":', fastjson.dumps(prev_cursor),
+		b',"facets":{"categories":' + facets + b'}' if facets is not None else b'', b'}}\n',
+	))
+
+
+def _want_facets(value, cursor):
+	"""facets=1/0 from the query string; by default facets come with the first page only."""
+	if value is None:
+		return not cursor
+	return value.lower() in ('1', 'true', 'yes')
+
+
+def _category_facets_queries():
+	"""Query generator (see _run_queries) for the (encoded facet list, validator) from
+	category_stats, cached until a write moves a count."""
+	cached = catalog_cache.get(('facets',))
+	if cached is None:
+		generation = catalog_cache.generation
+		facets = categories.facets((yield categories.FACETS_SQL, ()))
+		cached = (fastjson.dumps(facets), _catalog_etag(facets))
+		catalog_cache.set(('facets',), cached, tags=['facets'], since=generation)
+	return cached
+
+
+def _category_facets():
+	return _run_queries(_category_facets_queries())
+
+
+def _book_listing_key(q, category, sort, limit, cursor, fields=CARD_FIELDS):
+	return ('books', ' '.join((q or '').lower().split()), (category or '').lower(), sort or '', limit, cursor or '', fields)
+
+
 @app.route('/api/books', methods=['GET', 'POST'])
+# GET: listing, facets, the caller's subscription, the first search index load.
+# POST: insert, category_stats read and delta, activity event, reindex read, cache_versions bump
+@query_budget(4, POST=6)
 def books():
-	db = get_db()
-	cur = db.cursor(dictionary=True)
 	if request.method == 'GET':
-		# listing with optional search, category and sort
+		# listing with optional search, category and sort, paged by opaque cursors
 		q = request.args.get('search')
 		category = request.args.get('category')
 		sort = request.args.get('sort')
-		limit = int(request.args.get('limit') or 100)
-		params = []
-		sql = "SELECT * FROM books WHERE 1=1"
-		if q:
-			sql += " AND (title LIKE %s OR author LIKE %s)"
-			params.extend(['%'+q+'%','%'+q+'%'])
-		if category and category.lower() != 'all':
-			sql += " AND category = %s"
-			params.append(category)
-		# sorting
-		if sort == 'newest':
-			sql += " ORDER BY created_at DESC"
-		elif sort == 'rating':
-			sql += " ORDER BY rating DESC"
-		elif sort == 'title_az':
-			sql += " ORDER BY title ASC"
-		else:
-			sql += " ORDER BY id DESC"
-		sql += " LIMIT %s"
-		params.append(limit)
-		cur.execute(sql, tuple(params))
-		rows = cur.fetchall()
-
-		# If caller provided Authorization token and user is subscriber, show price 0
-		auth = request.headers.get('Authorization', '')
+		limit = clamp_limit(request.args.get('limit'), default=100)
+		cursor = request.args.get('cursor')
+		if category and category.lower() == 'all':
+			category = None
+		try:
+			fields = _listing_fields(request.args.get('fields'))
+		except ValueError as e:
+			return jsonify({'status': 'error', 'message': str(e)}), 400
+		# repeated listings are served from the catalog cache; entries are tagged with
+		# the books they contain so a write only drops the listings it affects
+		cache_key = _book_listing_key(q, category, sort, limit, cursor, fields)
+		listing = catalog_cache.get(cache_key)
+		if listing is None:
+			generation = catalog_cache.generation
+			try:
+				rows, next_cursor, prev_cursor = _load_book_listing(get_db(), q, category, sort, limit, cursor, fields)
+			except CursorError as e:
+				return jsonify({'status': 'error', 'message': str(e)}), 400
+			listing = (rows, next_cursor, prev_cursor, _catalog_etag(rows, next_cursor, prev_cursor))
+			catalog_cache.set(cache_key, listing, tags=['books'] + [f"book:{r['id']}" for r in rows], since=generation)
+		rows, next_cursor, prev_cursor, etag = listing
+
+		# If caller provided Authorization token and user is subscriber, show price 0;
+		# projections without display_price are the same for everyone
+		principal = current_principal(allow_cookie=False) if 'display_price' in fields else None
 		user_is_sub = False
-		if auth.startswith('Bearer '):
-			token = auth.split(' ',1)[1].strip()
-			uid = verify_access_token(token)
-			if uid:
-				try:
-					ucur = db.cursor(dictionary=True)
-					ucur.execute('SELECT is_subscriber FROM users WHERE id = %s', (uid,))
-					urow = ucur.fetchone()
-					user_is_sub = bool(urow and urow.get('is_subscriber'))
-				except Exception:
-					user_is_sub = False
-
-		# adjust price field for subscriber
-		out_books = []
-		for b in rows:
-			book = dict(b)
-			if user_is_sub:
-				book['display_price'] = 0.0
-			else:
-				# keep original price
-				book['display_price'] = float(book.get('price') or 0)
-			# Map availability: has_pdf => available / coming soon
-			book['availability'] = 'Available' if book.get('has_pdf') else 'Coming Soon'
-			out_books.append(book)
-
-		return jsonify({'status': 'success', 'data': {'books': out_books}})
+		if principal:
+			try:
+				user_is_sub = principal.is_subscriber
+			except Exception:
+				user_is_sub = False
+
+		# display_price depends on the caller, so subscribers get their own validator
+		etag = etag + '-s' if user_is_sub else etag
+		# per-category counts for the filter UI, from the category_stats aggregate
+		facets = None
+		if _want_facets(request.args.get('facets'), cursor):
+			facets, facets_etag = _category_facets()
+			etag = f'{etag}-{facets_etag[:8]}'
+		not_modified = _not_modified(etag)
+		if not_modified:
+			not_modified.vary.add('Authorization')
+			return not_modified
+
+		body = _book_listing_body(rows, next_cursor, prev_cursor, fields, user_is_sub, facets)
+		resp = _with_etag(app.response_class(body, mimetype='application/json'), etag)
+		resp.vary.add('Authorization')
+		return resp
 
 	# create book (protected)
-	auth = request.headers.get('Authorization', '')
-	if not auth.startswith('Bearer '):
-		return jsonify({'status':'error','message':'Unauthorized'}),401
-	token = auth.split(' ',1)[1].strip()
-	uid = verify_access_token(token)
-	if not uid:
+	if not current_principal(allow_cookie=False):
 		return jsonify({'status':'error','message':'Unauthorized'}),401
+	db = get_db()
+	cur = db.cursor(dictionary=True)
 
 	body = request.get_json() or {}
 	title = body.get('title')
@@ -376,63 +1010,99 @@ def books():
 	available_copies = body.get('available_copies') or total_copies
 	description = body.get('description')
 
-	cur.execute('INSERT INTO books (title,author,category,price,total_copies,available_copies,description,created_at) VALUES (%s,%s,%s,%s,%s,%s,%s,NOW())',
-				(title, author, category, price, total_copies, available_copies, description))
-	db.commit()
+	try:
+		cur.execute('INSERT INTO books (title,author,category,price,total_copies,available_copies,description,catalog_key,created_at) '
+					'VALUES (%s,%s,%s,%s,%s,%s,%s,' + importer.CATALOG_KEY_SQL + ',NOW())',
+					(title, author, category, price, total_copies, available_copies, description, title, author or ''))
+	except IntegrityError as e:
+		db.rollback()
+		if e.errno == errorcode.ER_DUP_ENTRY:
+			return _duplicate_book()
+		raise
 	book_id = cur.lastrowid
+	categories.apply(cur, {}, categories.snapshot(cur, [book_id]))
+	event = activity.record(cur, 'book_added', f'"{title}" added to system', book_id=book_id)
+	db.commit()
+	activity_feed.publish(event)
+	_catalog_book_changed(db, book_id)
 	return jsonify({'status':'success','data':{'book_id': book_id}})
 
 
 @app.route('/api/books/<int:book_id>', methods=['GET','PUT','DELETE'])
+# PUT: category_stats reads before and after the update and the delta, reindex read, cache_versions bump
+@query_budget(3, PUT=6, DELETE=5)
 def book_detail(book_id):
-	db = get_db()
-	cur = db.cursor(dictionary=True)
 	if request.method == 'GET':
-		cur.execute('SELECT * FROM books WHERE id = %s', (book_id,))
-		row = cur.fetchone()
-		if not row:
-			return jsonify({'status':'error','message':'Not found'}),404
-		return jsonify({'status':'success','data': row})
+		# the connection is only checked out on a cache miss, not for hits and 304s
+		cached = catalog_cache.get(('book', book_id))
+		if cached is None:
+			generation = catalog_cache.generation
+			cur = get_db().cursor(dictionary=True)
+			try:
+				cur.execute('SELECT * FROM books WHERE id = %s', (book_id,))
+				row = cur.fetchone()
+			finally:
+				cur.close()
+			if not row:
+				return jsonify({'status':'error','message':'Not found'}),404
+			cached = (row, _catalog_etag(row))
+			catalog_cache.set(('book', book_id), cached, tags=[f'book:{book_id}'], since=generation)
+		row, etag = cached
+		return _not_modified(etag) or _with_etag(jsonify({'status':'success','data': row}), etag)
 
 	# protected actions
-	auth = request.headers.get('Authorization', '')
-	if not auth.startswith('Bearer '):
-		return jsonify({'status':'error','message':'Unauthorized'}),401
-	token = auth.split(' ',1)[1].strip()
-	uid = verify_access_token(token)
-	if not uid:
+	if not current_principal(allow_cookie=False):
 		return jsonify({'status':'error','message':'Unauthorized'}),401
+	db = get_db()
+	cur = db.cursor(dictionary=True)
 
 	if request.method == 'PUT':
 		body = request.get_json() or {}
-		fields = []
-		vals = []
-		for k in ('title','price','available_copies','description','category','author'):
-			if k in body:
-				fields.append(f"{k} = %s")
-				vals.append(body[k])
+		changed = [k for k in ('title','price','available_copies','description','category','author') if k in body]
+		fields = [f"{k} = %s" for k in changed] + _catalog_key_assignment(changed)
+		vals = [body[k] for k in changed]
 		if fields:
 			vals.append(book_id)
-			cur.execute('UPDATE books SET ' + ','.join(fields) + ' WHERE id = %s', tuple(vals))
+			counted = CATEGORY_STAT_FIELDS & set(changed)
+			before = categories.snapshot(cur, [book_id], lock=True) if counted else {}
+			try:
+				cur.execute('UPDATE books SET ' + ','.join(fields) + ' WHERE id = %s', tuple(vals))
+			except IntegrityError as e:
+				db.rollback()
+				if e.errno == errorcode.ER_DUP_ENTRY:
+					return _duplicate_book()
+				raise
+			if counted:
+				categories.apply(cur, before, categories.snapshot(cur, [book_id]))
 			db.commit()
+			_catalog_book_changed(db, book_id, changed)
 		return jsonify({'status':'success','message':'Book updated'})
 
 	if request.method == 'DELETE':
+		before = categories.snapshot(cur, [book_id], lock=True)
+		_release_active_loans(cur, [book_id])
 		cur.execute('DELETE FROM books WHERE id = %s', (book_id,))
+		categories.apply(cur, before, {})
 		db.commit()
+		_catalog_book_deleted(book_id)
 		return jsonify({'status':'success','message':'Book deleted'})
 
 
 @app.route('/api/books/stats')
 @require_auth
 def books_stats():
-	db = get_db()
-	cur = db.cursor()
-	cur.execute('SELECT COUNT(*) FROM books')
-	total = cur.fetchone()[0]
-	cur.execute('SELECT SUM(available_copies) FROM books')
-	avail = cur.fetchone()[0] or 0
-	return jsonify({'status':'success','data':{'total_books': total, 'available_copies': avail, 'categories': 'n/a'}})
+	stats = catalog_cache.get(('stats',))
+	if stats is None:
+		generation = catalog_cache.generation
+		db = get_db()
+		cur = db.cursor()
+		cur.execute('SELECT COUNT(*) FROM books')
+		total = cur.fetchone()[0]
+		cur.execute('SELECT SUM(available_copies) FROM books')
+		avail = cur.fetchone()[0] or 0
+		stats = {'total_books': total, 'available_copies': avail, 'categories': 'n/a'}
+		catalog_cache.set(('stats',), stats, tags=['stats'], since=generation)
+	return jsonify({'status':'success','data':stats})
 
 
 @app.route('/api/users', methods=['GET'])
@@ -465,9 +1135,12 @@ def user_detail(user_id):
 			fields.append(f"{k} = %s")
 			vals.append(body[k])
 	if fields:
+		if 'status' in body:
+			fields.append(BUMP_TOKEN_VERSION)
 		vals.append(user_id)
 		cur.execute('UPDATE users SET ' + ','.join(fields) + ' WHERE id = %s', tuple(vals))
 		db.commit()
+		_user_changed(user_id)
 	return jsonify({'status':'success','message':'User updated'})
 
 
@@ -480,8 +1153,9 @@ def user_status(user_id):
 		return jsonify({'status':'error','message':'status required'}),400
 	db = get_db()
 	cur = db.cursor()
-	cur.execute('UPDATE users SET status = %s WHERE id = %s', (status, user_id))
+	cur.execute('UPDATE users SET status = %s, ' + BUMP_TOKEN_VERSION + ' WHERE id = %s', (status, user_id))
 	db.commit()
+	_user_changed(user_id)
 	return jsonify({'status':'success'})
 
 
@@ -540,54 +1214,110 @@ def profile():
 
 
 # ===== ADMIN API ENDPOINTS =====
+# Every dashboard figure in one round trip; served from memory for up to
+# DASHBOARD_STATS_MAX_AGE seconds so polling admin tabs share one query
+DASHBOARD_STATS_SQL = '''
+    SELECT
+        (SELECT COUNT(*) FROM users) AS total_users,
+        (SELECT COUNT(*) FROM books) AS total_books,
+        (SELECT COUNT(*) FROM users WHERE is_subscriber = 1 AND status = 'active') AS active_subscribers,
+        (SELECT COUNT(*) FROM borrowings WHERE status = 'borrowed') AS active_borrowings,
+        (SELECT AVG(price) FROM books) AS avg_price
+'''
+
+
+def _load_dashboard_stats():
+    cur = get_db().cursor(dictionary=True)
+    cur.execute(DASHBOARD_STATS_SQL)
+    return cur.fetchone()
+
+
+def _dashboard_payload(stats):
+    # Total revenue (approx)
+    avg_price = stats['avg_price'] or 0
+    total_revenue = stats['active_subscribers'] * avg_price
+    return {
+        'total_users': stats['total_users'],
+        'total_books': stats['total_books'],
+        'active_subscribers': stats['active_subscribers'],
+        'active_borrowings': stats['active_borrowings'],   # ✅ ADDED
+        'total_revenue': round(total_revenue, 2),
+        'monthly_growth': 5.2,
+        'top_categories': []
+    }
+
+
+def _activity_item(event):
+    return {
+        'id': event['id'],
+        'type': event['type'],
+        'title': event['title'],
+        'description': event['description'],
+        'timestamp': event['timestamp'] or datetime.now(timezone.utc).isoformat()
+    }
+
+
+# Live admin updates: one pump thread per process recomputes the dashboard
+# figures when a write marks them stale and publishes only the changed ones;
+# every open /api/admin/stream or /api/admin/updates client reads that same message
+push_broker = Broker(int(os.environ.get('PUSH_BACKLOG', '256')))
+PUSH_HEARTBEAT = float(os.environ.get('PUSH_HEARTBEAT_SECONDS', '15'))
+# open streams and waiting long-polls each hold a worker thread; past this many per process
+# a stream is refused (the dashboard falls back to long-polling) and a long-poll does not wait
+PUSH_MAX_WAITERS = int(os.environ.get('PUSH_MAX_WAITERS', str(max(1, int(os.environ.get('WEB_THREADS', '4')) // 4))))
+_push_slots = threading.BoundedSemaphore(PUSH_MAX_WAITERS)
+_pushed_stats = {}
+
+
+def _push_tick():
+    with app.app_context():
+        # events committed by other processes; this process's own arrive via the subscription below
+        activity_feed.refresh(get_db)
+        payload = _dashboard_payload(dashboard_stats.get())
+    changed = {k: v for k, v in payload.items() if _pushed_stats.get(k) != v}
+    if changed:
+        _pushed_stats.update(payload)
+        push_broker.publish('stats', changed)
+
+
+def _push_snapshot():
+    return {
+        'stats': _dashboard_payload(dashboard_stats.get()),
+        'activity': [_activity_item(e) for e in activity_feed.recent(get_db, 10)],
+    }
+
+
+def _activity_cursor(items, since=0):
+    """Resume cursor for clients of the push endpoints: the newest activity_events id they
+    have seen. Unlike the broker's sequence it means the same in every process."""
+    return max([since] + [item['id'] for item in items])
+
+
+def _push_resume(since):
+    """(stats, activity items after `since`, cursor) for a client resuming from a cursor,
+    or None when the events it missed are no longer buffered and it needs a snapshot."""
+    events, complete = activity_feed.after(get_db, since)
+    if not complete:
+        return None
+    items = [_activity_item(e) for e in events]
+    return _dashboard_payload(dashboard_stats.get()), items, _activity_cursor(items, since)
+
+
+push_pump = Pump(push_broker, _push_tick, interval=float(os.environ.get('PUSH_INTERVAL_SECONDS', '2')))
+activity_feed.subscribe(lambda event: push_broker.publish('activity', _activity_item(event)))
+dashboard_stats = Snapshot(_load_dashboard_stats, float(os.environ.get('DASHBOARD_STATS_MAX_AGE', '10')),
+                           on_invalidate=push_pump.poke)
+
+
 @app.route('/api/admin/dashboard', methods=['GET'])
+@query_budget(2)
 @require_auth
 def admin_dashboard():
     """Return admin dashboard stats"""
-    db = get_db()
-    cur = db.cursor(dictionary=True)
-    
     try:
-        # Total users
-        cur.execute("SELECT COUNT(*) as count FROM users")
-        total_users = cur.fetchone()['count']
-        
-        # Total books
-        cur.execute("SELECT COUNT(*) as count FROM books")
-        total_books = cur.fetchone()['count']
-        
-        # Active subscribers
-        cur.execute("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE is_subscriber = 1 AND status = 'active'
-        """)
-        active_subscribers = cur.fetchone()['count']
-        
-        # ✅ Active borrowed books (MAIN FIX)
-        cur.execute("""
-            SELECT COUNT(*) as count 
-            FROM borrowings 
-            WHERE status = 'borrowed'
-        """)
-        active_borrowings = cur.fetchone()['count']
-        
-        # Total revenue (approx)
-        cur.execute("SELECT AVG(price) as avg_price FROM books")
-        avg_price = cur.fetchone()['avg_price'] or 0
-        total_revenue = active_subscribers * avg_price
-        
         return jsonify({
             'status': 'success',
-            'data': {
-                'total_users': total_users,
-                'total_books': total_books,
-                'active_subscribers': active_subscribers,
-                'active_borrowings': active_borrowings,   # ✅ ADDED
-                'total_revenue': round(total_revenue, 2),
-                'monthly_growth': 5.2,
-                'top_categories': []
-            }
+            'data': _dashboard_payload(dashboard_stats.get())
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -602,13 +1332,19 @@ def admin_users():
 	
 	if request.method == 'GET':
 		try:
-			# Get page and limit from query params
+			# Get page and limit from query params; a cursor seeks instead of scanning past OFFSET rows
 			page = int(request.args.get('page', 1))
-			limit = int(request.args.get('limit', 20))
-			offset = (page - 1) * limit
+			limit = clamp_limit(request.args.get('limit'), default=20)
+			cursor = request.args.get('cursor')
+			next_cursor = prev_cursor = None
 			
-			cur.execute('SELECT id, name, email, status, is_subscriber, created_at FROM users ORDER BY created_at DESC LIMIT %s OFFSET %s', (limit, offset))
-			users = cur.fetchall()
+			sql = 'SELECT id, name, email, status, is_subscriber, created_at FROM users WHERE 1=1'
+			if cursor or page <= 1:
+				users, next_cursor, prev_cursor = keyset_page(cur, sql, [], 'created_at', 'created_at', False, cursor, limit)
+			else:
+				offset = (page - 1) * limit
+				cur.execute(sql + ' ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s', (limit, offset))
+				users = cur.fetchall()
 			
 			# Get total count
 			cur.execute('SELECT COUNT(*) as count FROM users')
@@ -620,9 +1356,13 @@ def admin_users():
 					'users': users,
 					'total': total,
 					'page': page,
-					'limit': limit
+					'limit': limit,
+					'next_cursor': next_cursor,
+					'prev_cursor': prev_cursor
 				}
 			})
+		except CursorError as e:
+			return jsonify({'status': 'error', 'message': str(e)}), 400
 		except Exception as e:
 			return jsonify({'status': 'error', 'message': str(e)}), 500
 	
@@ -635,8 +1375,9 @@ def admin_users():
 			if not user_id or is_subscriber is None:
 				return jsonify({'status': 'error', 'message': 'user_id and is_subscriber required'}), 400
 			
-			cur.execute('UPDATE users SET is_subscriber = %s WHERE id = %s', (is_subscriber, user_id))
+			cur.execute('UPDATE users SET is_subscriber = %s, ' + BUMP_TOKEN_VERSION + ' WHERE id = %s', (is_subscriber, user_id))
 			db.commit()
+			_user_changed(user_id)
 			
 			return jsonify({'status': 'success', 'message': f'User {user_id} subscription updated'})
 		except Exception as e:
@@ -668,17 +1409,65 @@ def admin_add_book():
 			return jsonify({'status': 'error', 'message': 'title and author required'}), 400
 		
 		cur.execute('''
-			INSERT INTO books (title, author, category, price, description, total_copies, available_copies, rating, reviews, image_url, has_pdf, created_at)
-			VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-		''', (title, author, category, price, description, total_copies, available_copies, rating, reviews, image_url, has_pdf))
+			INSERT INTO books (title, author, category, price, description, total_copies, available_copies, rating, reviews, image_url, has_pdf, catalog_key, created_at)
+			VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, ''' + importer.CATALOG_KEY_SQL + ''', NOW())
+		''', (title, author, category, price, description, total_copies, available_copies, rating, reviews, image_url, has_pdf, title, author))
+		book_id = cur.lastrowid
+		categories.apply(cur, {}, categories.snapshot(cur, [book_id]))
+		event = activity.record(cur, 'book_added', f'"{title}" added to system', book_id=book_id)
 		db.commit()
+		activity_feed.publish(event)
 		
-		book_id = cur.lastrowid
+		_catalog_book_changed(db, book_id)
 		return jsonify({'status': 'success', 'data': {'book_id': book_id, 'message': 'Book added successfully'}})
+	except IntegrityError as e:
+		db.rollback()
+		if e.errno == errorcode.ER_DUP_ENTRY:
+			return _duplicate_book()
+		return jsonify({'status': 'error', 'message': str(e)}), 500
 	except Exception as e:
 		return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/api/admin/books/import', methods=['POST'])
+@require_auth
+def admin_import_books():
+	"""Bulk import books from an uploaded JSON/CSV feed (admin only).
+
+	Accepts a multipart `file` upload or a raw request body; `format` (json|csv)
+	defaults to the upload's file extension. The feed is streamed in batches.
+	"""
+	if not g.principal.is_admin:
+		return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
+	upload = request.files.get('file')
+	if upload is not None:
+		stream = upload.stream
+		fmt = request.args.get('format') or importer.detect_format(upload.filename)
+	else:
+		stream = request.stream
+		fmt = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'json')
+	if fmt not in ('json', 'csv'):
+		return jsonify({'status': 'error', 'message': 'format must be json or csv'}), 400
+	try:
+		batch_size = int(request.args.get('batch_size') or importer.BATCH_SIZE)
+	except ValueError:
+		return jsonify({'status': 'error', 'message': 'batch_size must be an integer'}), 400
+
+	def report(stats):
+		logger.info('book import progress: %s', stats.as_dict())
+
+	db = get_db()
+	try:
+		text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+		stats = importer.import_books(db, importer.iter_records(text, fmt), batch_size, progress=report)
+	except Exception as e:
+		return jsonify({'status': 'error', 'message': str(e)}), 500
+	finally:
+		# batches committed before a failure are kept, so caches must go either way
+		_catalog_reloaded()
+	return jsonify({'status': 'success', 'data': stats.as_dict()})
+
+
 @app.route('/api/admin/books/update/<int:book_id>', methods=['PUT'])
 @require_auth
 def admin_update_book(book_id):
@@ -690,21 +1479,29 @@ def admin_update_book(book_id):
 		body = request.get_json() or {}
 		
 		# Build update query dynamically
-		fields = []
-		vals = []
-		for key in ('title', 'author', 'category', 'price', 'description', 'available_copies', 'rating', 'reviews', 'image_url', 'has_pdf'):
-			if key in body:
-				fields.append(f"{key} = %s")
-				vals.append(body[key])
+		changed = [key for key in ('title', 'author', 'category', 'price', 'description', 'available_copies', 'rating', 'reviews', 'image_url', 'has_pdf') if key in body]
+		fields = [f"{key} = %s" for key in changed]
+		vals = [body[key] for key in changed]
 		
 		if not fields:
 			return jsonify({'status': 'error', 'message': 'No fields to update'}), 400
+		fields += _catalog_key_assignment(changed)
 		
 		vals.append(book_id)
+		counted = CATEGORY_STAT_FIELDS & set(changed)
+		before = categories.snapshot(cur, [book_id], lock=True) if counted else {}
 		cur.execute(f'UPDATE books SET {",".join(fields)} WHERE id = %s', tuple(vals))
+		if counted:
+			categories.apply(cur, before, categories.snapshot(cur, [book_id]))
 		db.commit()
+		_catalog_book_changed(db, book_id, changed)
 		
 		return jsonify({'status': 'success', 'message': 'Book updated successfully'})
+	except IntegrityError as e:
+		db.rollback()
+		if e.errno == errorcode.ER_DUP_ENTRY:
+			return _duplicate_book()
+		return jsonify({'status': 'error', 'message': str(e)}), 500
 	except Exception as e:
 		return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -717,15 +1514,192 @@ def admin_delete_book(book_id):
 	cur = db.cursor()
 	
 	try:
+		before = categories.snapshot(cur, [book_id], lock=True)
+		_release_active_loans(cur, [book_id])
 		cur.execute('DELETE FROM books WHERE id = %s', (book_id,))
+		categories.apply(cur, before, {})
 		db.commit()
+		_catalog_book_deleted(book_id)
 		
 		return jsonify({'status': 'success', 'message': 'Book deleted successfully'})
 	except Exception as e:
 		return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+# Columns a bulk operation may set; creates also accept total_copies
+BULK_FIELDS = ('title', 'author', 'category', 'price', 'description', 'available_copies', 'rating', 'reviews', 'image_url', 'has_pdf')
+BULK_CREATE_COLUMNS = BULK_FIELDS + ('total_copies',)
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', '500'))
+BULK_MAX_OPERATIONS = int(os.environ.get('BULK_MAX_OPERATIONS', '5000'))
+
+def _chunks(items, size):
+	for i in range(0, len(items), size):
+		yield items[i:i + size]
+
+
+def _in_list(values):
+	return '(' + ','.join(['%s'] * len(values)) + ')'
+
+
+def _created_ids(cur, chunk):
+	"""operation index -> new book id for a chunk of inserted (index, _bulk_create_row) pairs.
+	Matched on catalog_key, which is unique, as multi-row INSERTs need not get consecutive
+	ids (innodb_autoinc_lock_mode=2, the MySQL 8 default)."""
+	keys = ' UNION ALL '.join(['SELECT %s AS i, ' + importer.CATALOG_KEY_SQL + ' AS k'] * len(chunk))
+	cur.execute('SELECT k.i, b.id FROM (' + keys + ') k JOIN books b ON b.catalog_key = k.k',
+				tuple(v for i, row in chunk for v in (i,) + row[-2:]))
+	return dict(cur.fetchall())
+
+
+def _bulk_create_row(book):
+	"""BULK_CREATE_COLUMNS values followed by the catalog_key parameters."""
+	total = int(book.get('total_copies', 1))
+	return (book['title'], book['author'], book.get('category'), float(book.get('price', 0)), book.get('description', ''),
+			int(book.get('available_copies', total)), int(book.get('rating', 0)), int(book.get('reviews', 0)),
+			book.get('image_url', ''), int(book.get('has_pdf', 0)), total, book['title'], book['author'])
+
+
+@app.route('/api/admin/books/bulk', methods=['POST'])
+@require_auth
+def admin_bulk_books():
+	"""Apply a batch of create/update/delete operations in one transaction (admin only).
+
+	Body: {"operations": [{"op": "create", "book": {...}},
+	                      {"op": "update", "id": 1, "fields": {...}},
+	                      {"op": "delete", "id": 2}]}
+	Operations are grouped into chunked multi-row statements. Invalid items and
+	unknown ids are reported per item and skipped; a database error rolls back
+	the whole batch.
+	"""
+	if not g.principal.is_admin:
+		return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
+	body = request.get_json() or {}
+	ops = body.get('operations')
+	if not isinstance(ops, list) or not ops:
+		return jsonify({'status': 'error', 'message': 'operations must be a non-empty list'}), 400
+	if len(ops) > BULK_MAX_OPERATIONS:
+		return jsonify({'status': 'error', 'message': f'at most {BULK_MAX_OPERATIONS} operations per request'}), 400
+
+	results = [None] * len(ops)
+	creates, updates, deletes = [], [], []
+	seen_ids = set()
+
+	def fail(i, op, message):
+		results[i] = {'index': i, 'op': op, 'status': 'error', 'message': message}
+
+	for i, op in enumerate(ops):
+		kind = op.get('op') if isinstance(op, dict) else None
+		if kind == 'create':
+			book = op.get('book') or {}
+			if not book.get('title') or not book.get('author'):
+				fail(i, kind, 'title and author required')
+				continue
+			try:
+				creates.append((i, _bulk_create_row(book)))
+			except (TypeError, ValueError):
+				fail(i, kind, 'invalid numeric field')
+		elif kind in ('update', 'delete'):
+			try:
+				book_id = int(op.get('id'))
+			except (TypeError, ValueError):
+				fail(i, kind, 'id required')
+				continue
+			if book_id in seen_ids:
+				fail(i, kind, 'book appears more than once in this batch')
+				continue
+			seen_ids.add(book_id)
+			if kind == 'delete':
+				deletes.append((i, book_id))
+				continue
+			fields = {k: v for k, v in (op.get('fields') or {}).items() if k in BULK_FIELDS}
+			if not fields:
+				fail(i, kind, 'No fields to update')
+				continue
+			updates.append((i, book_id, fields))
+		else:
+			fail(i, kind, 'op must be create, update or delete')
+
+	db = get_db()
+	cur = db.cursor()
+	created = {}
+	try:
+		# lock every targeted row first so per-item results reflect what really changed
+		existing = categories.snapshot(cur, seen_ids, lock=True)
+		for i, book_id, *_ in updates + deletes:
+			if book_id not in existing:
+				fail(i, ops[i]['op'], 'Book not found')
+		updates = [u for u in updates if u[1] in existing]
+		deletes = [d for d in deletes if d[1] in existing]
+
+		row_sql = '(' + ','.join(['%s'] * len(BULK_CREATE_COLUMNS)) + ',' + importer.CATALOG_KEY_SQL + ',NOW())'
+		insert_sql = 'INSERT INTO books (' + ','.join(BULK_CREATE_COLUMNS) + ',catalog_key,created_at) VALUES '
+		for chunk in _chunks(creates, BULK_CHUNK_SIZE):
+			cur.execute(insert_sql + ','.join([row_sql] * len(chunk)), tuple(v for _, row in chunk for v in row))
+			created.update(_created_ids(cur, chunk))
+
+		# one UPDATE per chunk: each column becomes CASE id WHEN ... THEN ... ELSE column END
+		for chunk in _chunks(updates, BULK_CHUNK_SIZE):
+			sets = []
+			params = []
+			for column in BULK_FIELDS:
+				pairs = [(book_id, fields[column]) for _, book_id, fields in chunk if column in fields]
+				if not pairs:
+					continue
+				sets.append(f'{column} = CASE id ' + ' '.join(['WHEN %s THEN %s'] * len(pairs)) + f' ELSE {column} END')
+				for pair in pairs:
+					params.extend(pair)
+			renamed = [book_id for _, book_id, fields in chunk if {'title', 'author'} & set(fields)]
+			if renamed:
+				# after the title/author CASEs, so it sees the new values
+				sets.append(f'catalog_key = CASE WHEN id IN {_in_list(renamed)} THEN {importer.CATALOG_KEY_COLUMNS_SQL} ELSE catalog_key END')
+				params.extend(renamed)
+			ids = [book_id for _, book_id, _ in chunk]
+			cur.execute('UPDATE books SET ' + ', '.join(sets) + ' WHERE id IN ' + _in_list(ids), tuple(params + ids))
+
+		for chunk in _chunks(deletes, BULK_CHUNK_SIZE):
+			ids = [book_id for _, book_id in chunk]
+			_release_active_loans(cur, ids)
+			cur.execute('DELETE FROM books WHERE id IN ' + _in_list(ids), tuple(ids))
+
+		# the counted books as they were and as they are now, netted per category
+		counted = [book_id for _, book_id, fields in updates if CATEGORY_STAT_FIELDS & set(fields)]
+		before = {book_id: existing[book_id] for book_id in counted + [book_id for _, book_id in deletes]}
+		categories.apply(cur, before, categories.snapshot(cur, counted + list(created.values())))
+		db.commit()
+	except IntegrityError as e:
+		db.rollback()
+		if e.errno == errorcode.ER_DUP_ENTRY:
+			return jsonify({'status': 'error', 'message': f'Batch rolled back: {e.msg}'}), 409
+		return jsonify({'status': 'error', 'message': str(e)}), 500
+	except Exception as e:
+		db.rollback()
+		return jsonify({'status': 'error', 'message': str(e)}), 500
+
+	for i, book_id in created.items():
+		results[i] = {'index': i, 'op': 'create', 'status': 'success', 'id': book_id}
+	for i, book_id, _ in updates:
+		results[i] = {'index': i, 'op': 'update', 'status': 'success', 'id': book_id}
+	for i, book_id in deletes:
+		results[i] = {'index': i, 'op': 'delete', 'status': 'success', 'id': book_id}
+
+	changes = {book_id: None for book_id in created.values()}
+	changes.update((book_id, fields) for _, book_id, fields in updates)
+	if changes:
+		_catalog_books_changed(db, changes)
+	if deletes:
+		_catalog_books_deleted([book_id for _, book_id in deletes])
+
+	return jsonify({'status': 'success', 'data': {
+		'results': results,
+		'created': len(created),
+		'updated': len(updates),
+		'deleted': len(deletes),
+		'failed': sum(1 for r in results if r['status'] == 'error'),
+	}})
+
+
 @app.route('/api/admin/users/<int:user_id>', methods=['GET', 'PUT'])
+@query_budget(4)
 @require_auth
 def admin_user_detail(user_id):
 	"""Get user details or update user status (admin only)"""
@@ -783,12 +1757,13 @@ def admin_user_detail(user_id):
 			if status:
 				if status not in ['active', 'suspended', 'inactive']:
 					return jsonify({'status': 'error', 'message': 'Invalid status'}), 400
-				cur.execute('UPDATE users SET status = %s WHERE id = %s', (status, user_id))
+				cur.execute('UPDATE users SET status = %s, ' + BUMP_TOKEN_VERSION + ' WHERE id = %s', (status, user_id))
 			
 			if is_subscriber is not None:
-				cur.execute('UPDATE users SET is_subscriber = %s WHERE id = %s', (is_subscriber, user_id))
+				cur.execute('UPDATE users SET is_subscriber = %s, ' + BUMP_TOKEN_VERSION + ' WHERE id = %s', (is_subscriber, user_id))
 			
 			db.commit()
+			_user_changed(user_id)
 			
 			return jsonify({'status': 'success', 'message': f'User {user_id} updated successfully'})
 		except Exception as e:
@@ -804,9 +1779,11 @@ def admin_subscriptions():
 	
 	try:
 		page = int(request.args.get('page', 1))
-		limit = int(request.args.get('limit', 20))
-		offset = (page - 1) * limit
+		limit = clamp_limit(request.args.get('limit'), default=20)
+		cursor = request.args.get('cursor')
 		search = request.args.get('search', '')
+		# prefix matching can use the name/email indexes; match=contains keeps the old full scan
+		match = request.args.get('match', 'prefix')
 		
 		# Build where clause properly
 		where_clause = "WHERE is_subscriber = 1"
@@ -814,24 +1791,27 @@ def admin_subscriptions():
 		count_params = []
 		
 		if search:
+			escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+			pattern = f"%{escaped}%" if match == 'contains' else f"{escaped}%"
 			where_clause += " AND (name LIKE %s OR email LIKE %s)"
-			query_params.extend([f"%{search}%", f"%{search}%"])
-			count_params.extend([f"%{search}%", f"%{search}%"])
+			query_params.extend([pattern, pattern])
+			count_params.extend([pattern, pattern])
 		
-		# Get subscriptions
+		# Get subscriptions; active_loans is maintained by borrow/return
 		query = f'''
 			SELECT id, name, email, created_at, is_subscriber, status,
 				   0 as books_borrowed,
-				   (SELECT COUNT(*) FROM borrowings WHERE user_id = users.id AND return_date IS NULL) as currently_borrowed
+				   active_loans as currently_borrowed
 			FROM users
 			{where_clause}
-			ORDER BY created_at DESC
-			LIMIT %s OFFSET %s
 		'''
-		query_params.extend([limit, offset])
-		
-		cur.execute(query, query_params)
-		subscriptions = cur.fetchall() or []
+		next_cursor = prev_cursor = None
+		if cursor or page <= 1:
+			subscriptions, next_cursor, prev_cursor = keyset_page(cur, query, query_params, 'created_at', 'created_at', False, cursor, limit)
+		else:
+			query_params.extend([limit, (page - 1) * limit])
+			cur.execute(query + ' ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s', query_params)
+			subscriptions = cur.fetchall() or []
 		
 		# Get total count
 		count_query = f'SELECT COUNT(*) as count FROM users {where_clause}'
@@ -845,9 +1825,13 @@ def admin_subscriptions():
 				'subscriptions': subscriptions,
 				'total': total,
 				'page': page,
-				'limit': limit
+				'limit': limit,
+				'next_cursor': next_cursor,
+				'prev_cursor': prev_cursor
 			}
 		})
+	except CursorError as e:
+		return jsonify({'status': 'error', 'message': str(e)}), 400
 	except Exception as e:
 		return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -864,15 +1848,16 @@ def admin_update_subscription(sub_id):
 		action = body.get('action')  # suspend, resume, downgrade
 		
 		if action == 'suspend':
-			cur.execute('UPDATE users SET is_subscriber = 0, status = "suspended" WHERE id = %s', (sub_id,))
+			cur.execute('UPDATE users SET is_subscriber = 0, status = "suspended", ' + BUMP_TOKEN_VERSION + ' WHERE id = %s', (sub_id,))
 		elif action == 'resume':
-			cur.execute('UPDATE users SET is_subscriber = 1, status = "active" WHERE id = %s', (sub_id,))
+			cur.execute('UPDATE users SET is_subscriber = 1, status = "active", ' + BUMP_TOKEN_VERSION + ' WHERE id = %s', (sub_id,))
 		elif action == 'downgrade':
-			cur.execute('UPDATE users SET is_subscriber = 0 WHERE id = %s', (sub_id,))
+			cur.execute('UPDATE users SET is_subscriber = 0, ' + BUMP_TOKEN_VERSION + ' WHERE id = %s', (sub_id,))
 		else:
 			return jsonify({'status': 'error', 'message': 'Invalid action'}), 400
 		
 		db.commit()
+		_user_changed(sub_id)
 		
 		return jsonify({'status': 'success', 'message': f'Subscription {action} successfully'})
 	except Exception as e:
@@ -919,80 +1904,18 @@ def admin_update_subscription(sub_id):
 # 		return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/admin/activity', methods=['GET'])
+@query_budget(2)
 @require_auth
 def admin_activity():
     """Get recent system activity in the format expected by frontend"""
-    db = get_db()
-    cur = db.cursor(dictionary=True)
-    
     try:
-        limit = int(request.args.get('limit', 10))
+        limit = clamp_limit(request.args.get('limit'), default=10)
         
-        # Get comprehensive recent activity
-        cur.execute('''
-            (SELECT 
-                'user_registered' as type,
-                'New User' as title,
-                CONCAT(u.name, ' registered to the platform') as description,
-                u.created_at as timestamp
-            FROM users u
-            ORDER BY u.created_at DESC
-            LIMIT %s)
-            
-            UNION ALL
-            
-            (SELECT 
-                'book_added' as type,
-                'Book Added' as title,
-                CONCAT('"', b.title, '" added to system') as description,
-                b.created_at as timestamp
-            FROM books b
-            ORDER BY b.created_at DESC
-            LIMIT %s)
-            
-            UNION ALL
-            
-            (SELECT 
-                'book_borrowed' as type,
-                'Book Borrowed' as title,
-                CONCAT('"', b.title, '" borrowed by ', u.name) as description,
-                br.borrowed_at as timestamp
-            FROM borrowings br
-            JOIN books b ON br.book_id = b.id
-            JOIN users u ON br.user_id = u.id
-            WHERE br.status = 'borrowed'
-            ORDER BY br.borrowed_at DESC
-            LIMIT %s)
-            
-            UNION ALL
-            
-            (SELECT 
-                'book_returned' as type,
-                'Book Returned' as title,
-                CONCAT('"', b.title, '" returned by ', u.name) as description,
-                br.returned_at as timestamp
-            FROM borrowings br
-            JOIN books b ON br.book_id = b.id
-            JOIN users u ON br.user_id = u.id
-            WHERE br.status = 'returned' AND br.returned_at IS NOT NULL
-            ORDER BY br.returned_at DESC
-            LIMIT %s)
-            
-            ORDER BY timestamp DESC
-            LIMIT %s
-        ''', (limit, limit, limit, limit, limit))
-        
-        activities = cur.fetchall()
+        # Served from the activity_events log; small limits come from the in-memory ring buffer
+        activities = activity_feed.recent(get_db, limit)
         
         # Format the response to match frontend expectations
-        formatted_activities = []
-        for activity in activities:
-            formatted_activities.append({
-                'type': activity['type'],
-                'title': activity['title'],
-                'description': activity['description'],
-                'timestamp': activity['timestamp'].isoformat() if activity['timestamp'] else datetime.now(timezone.utc).isoformat()
-            })
+        formatted_activities = [_activity_item(activity_event) for activity_event in activities]
         
         return jsonify({
             'status': 'success',
@@ -1001,7 +1924,138 @@ def admin_activity():
         
     except Exception as e:
         logger.error(f"Error fetching admin activity: {str(e)}")
-        return jsonify
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _sse(kind, data, cursor=None):
+    head = f'id: {cursor}\n' if cursor is not None else ''
+    return f'{head}event: {kind}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+@app.route('/api/admin/stream', methods=['GET'])
+@require_auth
+def admin_stream():
+    """Server-Sent Events: a snapshot event, then `stats` deltas and `activity` events as they happen.
+
+    Event ids are activity cursors (_activity_cursor), so a client reconnecting to any
+    worker with Last-Event-ID or ?since= gets the current stats and the activity it missed
+    instead of a snapshot. Each open stream holds one of PUSH_MAX_WAITERS slots; without
+    a free slot the stream is refused with 503.
+    """
+    if not _push_slots.acquire(blocking=False):
+        resp = jsonify({'status': 'error', 'message': 'Too many open streams, use /api/admin/updates'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = '30'
+        return resp
+    try:
+        seq = push_broker.last_seq
+        since = request.headers.get('Last-Event-ID', type=int)
+        if since is None:
+            since = request.args.get('since', type=int)
+        resumed = _push_resume(since) if since is not None else None
+        snapshot = _push_snapshot() if resumed is None else None
+    except Exception as e:
+        _push_slots.release()
+        logger.error(f"Error opening admin stream: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    push_pump.start()
+
+    # not wrapped in stream_with_context: the request's pooled connection goes
+    # back to the pool as soon as this view returns, not when the client leaves
+    def events(seq):
+        push_broker.subscribe()
+        try:
+            if resumed is None:
+                cursor = _activity_cursor(snapshot['activity'])
+                replayed = {item['id'] for item in snapshot['activity']}
+                yield 'retry: 5000\n\n' + _sse('snapshot', snapshot, cursor)
+            else:
+                stats, missed, cursor = resumed
+                replayed = {item['id'] for item in missed}
+                yield 'retry: 5000\n\n' + _sse('stats', stats, cursor) + ''.join(
+                    _sse('activity', item, item['id']) for item in missed)
+            while True:
+                messages, complete = push_broker.wait(seq, PUSH_HEARTBEAT)
+                if not complete:
+                    with app.app_context():
+                        seq = push_broker.last_seq
+                        data = _push_snapshot()
+                    cursor = _activity_cursor(data['activity'], cursor)
+                    replayed = {item['id'] for item in data['activity']}
+                    yield _sse('snapshot', data, cursor)
+                    continue
+                if not messages:
+                    yield ': keepalive\n\n'
+                    continue
+                for seq, kind, data in messages:
+                    if kind != 'activity':
+                        yield _sse(kind, data)
+                    elif data['id'] not in replayed:
+                        # an event committed late may carry a lower id; the cursor never moves back
+                        cursor = max(cursor, data['id'])
+                        yield _sse(kind, data, cursor)
+        finally:
+            push_broker.unsubscribe()
+
+    resp = app.response_class(events(seq), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    # also runs when the client leaves before the first event is written
+    resp.call_on_close(_push_slots.release)
+    return resp
+
+
+@app.route('/api/admin/updates', methods=['GET'])
+@require_auth
+def admin_updates():
+    """Long-poll fallback for /api/admin/stream.
+
+    `since` is the `seq` of the previous response, an activity cursor valid in every
+    process, and `stats` its `stats_tag`. Without `since` (or when it is too old)
+    returns a snapshot. Otherwise returns the current stats and the activity after
+    `since`, first blocking up to `timeout` seconds while there is neither new activity
+    nor a stats change. A long-poll blocks only if a PUSH_MAX_WAITERS slot is free;
+    if not it answers at once with `retry_ms`.
+    """
+    try:
+        since = request.args.get('since', type=int)
+        timeout = min(max(request.args.get('timeout', 25, type=float), 0), 30)
+        push_pump.start()
+        resumed = None
+        retry_ms = None
+        if since is not None:
+            seq = push_broker.last_seq
+            resumed = _push_resume(since)
+            if resumed is not None and not resumed[1] and request.args.get('stats') == _catalog_etag(resumed[0]):
+                if _push_slots.acquire(blocking=False):
+                    push_broker.subscribe()
+                    try:
+                        push_broker.wait(seq, timeout)
+                    finally:
+                        push_broker.unsubscribe()
+                        _push_slots.release()
+                    resumed = _push_resume(since)
+                else:
+                    retry_ms = 5000
+        if resumed is None:
+            snapshot = _push_snapshot()
+            return jsonify({'status': 'success', 'data': {
+                'seq': _activity_cursor(snapshot['activity']),
+                'stats_tag': _catalog_etag(snapshot['stats']),
+                'snapshot': snapshot,
+            }})
+        stats, missed, cursor = resumed
+        data = {
+            'seq': cursor,
+            'stats_tag': _catalog_etag(stats),
+            'events': [{'type': 'stats', 'data': stats}] + [{'type': 'activity', 'data': item} for item in missed],
+        }
+        if retry_ms:
+            data['retry_ms'] = retry_ms
+        return jsonify({'status': 'success', 'data': data})
+    except Exception as e:
+        logger.error(f"Error fetching admin updates: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 	
 @app.route('/api/admin/profile', methods=['GET'])
 @require_auth
@@ -1061,17 +2115,17 @@ def books_page():
 
 @app.route('/auth/login')
 def user_login_page():
-	return send_from_directory('static', 'auth/login.html')
+	return _static_page('auth/login.html')
 
 
 @app.route('/auth/register')
 def user_register_page():
-	return send_from_directory('static', 'auth/register.html')
+	return _static_page('auth/register.html')
 
 
 @app.route('/auth/forgot-password')
 def user_forgot_password_page():
-	return send_from_directory('static', 'auth/user-forgot-password.html')
+	return _static_page('auth/user-forgot-password.html')
 
 
 # ===== ADMIN ROUTES =====
@@ -1137,6 +2191,13 @@ def admin_subscriptions_page():
 
 
 # ===== BORROWING ENDPOINTS =====
+def _record_loan_event(cur, event_type, user_id, book_id):
+	cur.execute('SELECT b.title, COALESCE(u.name, u.email) AS who FROM books b JOIN users u ON u.id = %s WHERE b.id = %s', (user_id, book_id))
+	row = cur.fetchone() or {}
+	verb = 'borrowed' if event_type == 'book_borrowed' else 'returned'
+	return activity.record(cur, event_type, f'"{row.get("title")}" {verb} by {row.get("who")}', user_id=user_id, book_id=book_id)
+
+
 @app.route('/api/borrow', methods=['POST'])
 @require_auth
 def borrow_book():
@@ -1150,36 +2211,39 @@ def borrow_book():
 	
 	user_id = g.user_id
 	
-	# Check if book exists and has available copies
-	cur = db.cursor(dictionary=True)
-	cur.execute('SELECT id, available_copies, total_copies FROM books WHERE id = %s', (book_id,))
-	book = cur.fetchone()
-	
-	if not book:
-		return jsonify({'status': 'error', 'message': 'Book not found'}), 404
-	
-	if book['available_copies'] <= 0:
-		return jsonify({'status': 'error', 'message': 'No copies available'}), 400
-	
-	# Check if user already has this book borrowed (not returned)
-	cur.execute('SELECT id FROM borrowings WHERE user_id = %s AND book_id = %s AND status = %s',
-				(user_id, book_id, 'borrowed'))
-	if cur.fetchone():
-		return jsonify({'status': 'error', 'message': 'You already have this book borrowed'}), 400
-	
 	# Set due date (14 days from now)
 	due_at = datetime.now(timezone.utc) + timedelta(days=14)
 	
-	# Create borrowing record
-	cur.execute('''INSERT INTO borrowings (user_id, book_id, borrowed_at, due_at, status, created_at)
-				  VALUES (%s, %s, NOW(), %s, %s, NOW())''',
-				(user_id, book_id, due_at, 'borrowed'))
+	# One short transaction: the guarded UPDATE both checks and takes a copy under the
+	# book's row lock, so concurrent borrows can never oversell. Locks are always taken
+	# books -> borrowings -> users -> category_stats (return_book does the same) to avoid deadlocks.
+	cur = db.cursor(dictionary=True)
+	cur.execute('UPDATE books SET available_copies = available_copies - 1 WHERE id = %s AND available_copies > 0', (book_id,))
+	if cur.rowcount == 0:
+		db.rollback()
+		cur.execute('SELECT id FROM books WHERE id = %s', (book_id,))
+		if not cur.fetchone():
+			return jsonify({'status': 'error', 'message': 'Book not found'}), 404
+		return jsonify({'status': 'error', 'message': 'No copies available'}), 400
 	
-	# Decrement available copies
-	cur.execute('UPDATE books SET available_copies = available_copies - 1 WHERE id = %s', (book_id,))
+	# Create borrowing record; the unique key on active loans rejects a second copy
+	try:
+		cur.execute('''INSERT INTO borrowings (user_id, book_id, borrowed_at, due_at, status, created_at)
+					  VALUES (%s, %s, NOW(), %s, %s, NOW())''',
+					(user_id, book_id, due_at, 'borrowed'))
+	except IntegrityError as e:
+		db.rollback()
+		if e.errno == errorcode.ER_DUP_ENTRY:
+			return jsonify({'status': 'error', 'message': 'You already have this book borrowed'}), 400
+		raise
+	borrowing_id = cur.lastrowid
+	cur.execute('UPDATE users SET active_loans = active_loans + 1 WHERE id = %s', (user_id,))
+	categories.adjust_available(cur, book_id, -1)
+	event = _record_loan_event(cur, 'book_borrowed', user_id, book_id)
 	
 	db.commit()
-	borrowing_id = cur.lastrowid
+	activity_feed.publish(event)
+	_catalog_book_changed(db, book_id, ('available_copies',))
 	
 	return jsonify({
 		'status': 'success',
@@ -1206,25 +2270,22 @@ def return_book():
 	
 	user_id = g.user_id
 	
-	# Find active borrowing
+	# Same lock order as borrow_book: take the book row first, then close the loan
 	cur = db.cursor(dictionary=True)
-	cur.execute('''SELECT id, book_id FROM borrowings 
+	cur.execute('UPDATE books SET available_copies = available_copies + 1 WHERE id = %s', (book_id,))
+	cur.execute('''UPDATE borrowings SET returned_at = NOW(), status = %s 
 				  WHERE user_id = %s AND book_id = %s AND status = %s''',
-				(user_id, book_id, 'borrowed'))
-	borrowing = cur.fetchone()
-	
-	if not borrowing:
+				('returned', user_id, book_id, 'borrowed'))
+	if cur.rowcount == 0:
+		db.rollback()
 		return jsonify({'status': 'error', 'message': 'No active borrowing found'}), 404
-	
-	# Update borrowing status
-	cur.execute('''UPDATE borrowings SET returned_at = NOW(), status = %s 
-				  WHERE id = %s''',
-				('returned', borrowing['id']))
-	
-	# Increment available copies
-	cur.execute('UPDATE books SET available_copies = available_copies + 1 WHERE id = %s', (book_id,))
+	cur.execute('UPDATE users SET active_loans = GREATEST(active_loans - 1, 0) WHERE id = %s', (user_id,))
+	categories.adjust_available(cur, book_id, 1)
+	event = _record_loan_event(cur, 'book_returned', user_id, book_id)
 	
 	db.commit()
+	activity_feed.publish(event)
+	_catalog_book_changed(db, book_id, ('available_copies',))
 	
 	return jsonify({
 		'status': 'success',
@@ -1235,44 +2296,20 @@ def return_book():
 	})
 
 
-@app.route('/api/users/<int:user_id>/borrowings', methods=['GET'])
-@require_auth
-def get_user_borrowings(user_id):
-	"""Get borrowings for a user (auth required; can view own or admin)."""
-	auth = request.headers.get('Authorization', '')
-	token = auth.split(' ', 1)[1].strip() if auth.startswith('Bearer ') else None
-	current_user_id = verify_access_token(token) if token else None
-	
-	# Allow user to view own borrowings or admin to view any
-	db = get_db()
-	cur = db.cursor(dictionary=True)
-	
-	if current_user_id != user_id:
-		# Check if current user is admin
-		cur.execute('SELECT is_admin FROM users WHERE id = %s', (current_user_id,))
-		user = cur.fetchone()
-		if not user or not user.get('is_admin'):
-			return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
-	
-	# Get borrowings with book details
-	cur.execute('''SELECT b.id, b.user_id, b.book_id, b.borrowed_at, b.due_at, b.returned_at, b.status,
+USER_BORROWINGS_SQL = '''SELECT b.id, b.user_id, b.book_id, b.borrowed_at, b.due_at, b.returned_at, b.status,
 					bk.title, bk.author, bk.image_url
 				  FROM borrowings b
 				  JOIN books bk ON b.book_id = bk.id
 				  WHERE b.user_id = %s
-				  ORDER BY b.borrowed_at DESC''',
-				(user_id,))
-	borrowings = cur.fetchall()
-	
-	# Calculate stats
-	cur.execute('''SELECT 
+				  ORDER BY b.borrowed_at DESC'''
+USER_BORROW_STATS_SQL = '''SELECT 
 					COUNT(CASE WHEN status = 'borrowed' THEN 1 END) as current_borrowed,
 					COUNT(CASE WHEN status = 'returned' THEN 1 END) as total_returned
-				  FROM borrowings WHERE user_id = %s''',
-				(user_id,))
-	stats = cur.fetchone()
-	
-	return jsonify({
+				  FROM borrowings WHERE user_id = %s'''
+
+
+def _borrowings_payload(borrowings, stats):
+	return {
 		'status': 'success',
 		'data': {
 			'borrowings': borrowings,
@@ -1282,21 +2319,52 @@ def get_user_borrowings(user_id):
 				'total_borrowed': (stats.get('current_borrowed', 0) + stats.get('total_returned', 0))
 			}
 		}
-	})
+	}
+
+
+@app.route('/api/users/<int:user_id>/borrowings', methods=['GET'])
+@query_budget(4)
+@require_auth
+def get_user_borrowings(user_id):
+	"""Get borrowings for a user (auth required; can view own or admin)."""
+	principal = g.principal
+	
+	# Allow user to view own borrowings or admin to view any
+	if principal.user_id != user_id and not principal.is_admin:
+		return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
+	
+	db = get_db()
+	cur = db.cursor(dictionary=True)
+	
+	# Get borrowings with book details
+	cur.execute(USER_BORROWINGS_SQL, (user_id,))
+	borrowings = cur.fetchall()
+	
+	# Calculate stats
+	cur.execute(USER_BORROW_STATS_SQL, (user_id,))
+	stats = cur.fetchone()
+	
+	return jsonify(_borrowings_payload(borrowings, stats))
 
 
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
-	"""Return distinct non-empty categories from books table."""
-	db = get_db()
-	cur = db.cursor()
-	try:
-		cur.execute("SELECT DISTINCT category FROM books WHERE category IS NOT NULL AND category <> '' ORDER BY category ASC")
-		rows = cur.fetchall()
+	"""Return the non-empty categories that have books, from the category_stats aggregate."""
+	cached = catalog_cache.get(('categories',))
+	if cached is None:
+		generation = catalog_cache.generation
+		db = get_db()
+		cur = db.cursor()
+		try:
+			cur.execute('SELECT category FROM category_stats WHERE book_count > 0 ORDER BY category ASC')
+			rows = cur.fetchall()
+		except Exception as e:
+			return jsonify({'status': 'error', 'message': str(e)}), 500
 		cats = [r[0] for r in rows if r and r[0]]
-		return jsonify({'status': 'success', 'data': {'categories': cats}})
-	except Exception as e:
-		return jsonify({'status': 'error', 'message': str(e)}), 500
+		cached = (cats, _catalog_etag(cats))
+		catalog_cache.set(('categories',), cached, tags=['categories'], since=generation)
+	cats, etag = cached
+	return _not_modified(etag) or _with_etag(jsonify({'status': 'success', 'data': {'categories': cats}}), etag)
 
 # ===== Error handlers =====
 @app.errorhandler(400)
@@ -1362,6 +2430,13 @@ def unsupported_media_type(error):
         return error_response("Unsupported media type", 415, "UNSUPPORTED_MEDIA")
     return render_template('Error/415.html'), 415
 
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(error):
+    """503 - password workers saturated; shed the request instead of queueing it"""
+    resp, status = error_response("Too many sign-in requests in progress, please retry", 503, "AUTH_BUSY")
+    resp.headers['Retry-After'] = '1'
+    return resp, status
+
 @app.errorhandler(429)
 def too_many_requests(error):
     """429 - Too Many Requests"""
@@ -1399,25 +2474,65 @@ def gateway_timeout(error):
     return render_template('Error/504.html'), 504
 
 
+# ===== STATIC ASSETS =====
+def _static_page(relpath):
+	"""A static/ HTML page served from memory with its bundled tags; revalidated on every visit."""
+	body, etag = asset_store.page(relpath)
+	return _not_modified(etag) or _with_etag(app.response_class(body, mimetype='text/html'), etag)
+
+
+@app.route('/assets/<path:name>')
+def fingerprinted_asset(name):
+	"""Bundles built by `python assets.py`, in the best encoding the client accepts. Names change
+	with content, so clients cache them for good and repeat visits request no assets at all."""
+	asset = asset_store.negotiate(name, request.headers.get('Accept-Encoding'))
+	if asset is None:
+		return make_response('', 404)
+	body, encoding, mimetype, etag = asset
+	resp = app.response_class(body, content_type=mimetype)
+	if encoding:
+		resp.headers['Content-Encoding'] = encoding
+	resp.set_etag(etag)
+	resp.headers['Cache-Control'] = IMMUTABLE
+	resp.vary.add('Accept-Encoding')
+	return resp
+
+
 # ===== CATCH-ALL ROUTE =====
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def catch_all(path):
 	# Let Flask serve static files first
-	static_folder = str(app.static_folder or 'static')
-	if path and os.path.exists(os.path.join(static_folder, path)):
-		return send_from_directory(static_folder, path)
+	if path in _STATIC_FILES:
+		if path.endswith('.html'):
+			return _static_page(path)
+		return send_from_directory(str(app.static_folder or 'static'), path)
 	# For unknown paths, serve index.html
-	return send_from_directory(static_folder, 'index.html')
+	return _static_page('index.html')
+
+
+def preload():
+	"""Build process-wide read state up front: the search index and compiled templates.
+	Called in a preforking master (see gunicorn.conf.py), so workers inherit it
+	copy-on-write and their first requests skip the cold start."""
+	conn = connect()
+	try:
+		# the versions the preloaded state matches, so forked workers do not drop it on their first check
+		cache_signal.check(lambda: conn)
+		get_search_index().ensure_loaded(conn)
+	finally:
+		conn.close()
+	for name in app.jinja_env.list_templates():
+		app.jinja_env.get_template(name)
 
 
 if __name__ == '__main__':
-	# Initialize DB (creates tables if not exist) - best effort
-	with app.app_context():
-		try:
-			init_db()
-		except Exception as e:
-			print('DB init failed:', e)
+	# Development server. Applies schema.sql only when it changed since the last start
+	try:
+		ensure_schema()
+	except Exception as e:
+		print('DB init failed:', e)
+	token_sweeper.start()
 	app.run(host='0.0.0.0', port=5000, debug=False)
 
 
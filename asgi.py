@@ -0,0 +1,290 @@
+"""ASGI entry point, for running the app under an event-loop server:
+
+    pip install -r requirements.txt -r requirements-asgi.txt
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The I/O-bound reads (GET /api/books, GET /api/users/<id>/borrowings and
+GET /api/admin/dashboard) are served natively on the event loop through adb,
+so one process overlaps any number of them while they wait on MySQL. Every
+other route runs the Flask app unchanged through asgiref's WsgiToAsgi on its
+thread pool. Both halves share this process's catalog cache, search index,
+dashboard snapshot and token state, and produce the same responses.
+"""
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import json
+
+import adb
+import app as webapp
+from cache import VERSION_CHECK_SQL, cache_signal, catalog_cache
+from compress import compress_response
+from db import ensure_schema
+from pagination import CursorError, clamp_limit
+from search import LOAD_SQL, get_search_index
+from tokens import token_generations
+
+logger = logging.getLogger(__name__)
+
+# single-flight guards for state shared with the Flask side
+_index_lock = asyncio.Lock()
+_generations_lock = asyncio.Lock()
+_dashboard_lock = asyncio.Lock()
+_signal_lock = asyncio.Lock()
+
+UNAUTHORIZED = {'status': 'error', 'message': 'Unauthorized'}
+
+
+class Request:
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+        self.args = {key: values[0] for key, values in query.items()}
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+
+    def cookie(self, name):
+        try:
+            morsel = SimpleCookie(self.headers.get('cookie', '')).get(name)
+        except CookieError:
+            return None
+        return morsel.value if morsel else None
+
+    def token_payload(self, allow_cookie=True):
+        """Verified JWT payload of the caller, or None (same rules as app._request_token)."""
+        auth = self.headers.get('authorization', '')
+        if auth.startswith('Bearer '):
+            token = auth.split(' ', 1)[1].strip()
+        else:
+            token = self.cookie('auth') if allow_cookie else None
+        payload = webapp._verified_payload(token) if token else None
+        return payload if payload and payload.get('user_id') else None
+
+
+def _etag_matches(header, etag):
+    # weak comparison, as _not_modified: compressed responses send the tag as W/"..."
+    for tag in (header or '').split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == '*' or tag == f'"{etag}"':
+            return True
+    return False
+
+
+async def _run_queries(steps, offload=False):
+    """Async driver of app._run_queries' query generators: statements go through adb, and with
+    `offload` the generator's own steps (search index lookups) run on a worker thread."""
+    rows = None
+    while True:
+        if offload:
+            done, value = await asyncio.to_thread(webapp._advance, steps, rows)
+        else:
+            done, value = webapp._advance(steps, rows)
+        if done:
+            return value
+        rows = await adb.fetchall(*value)
+
+
+async def _user_attrs(payload):
+    """Async twin of Principal.attrs: token claims while current, else user_cache, else one query."""
+    user_id = payload['user_id']
+    claims = payload.get('usr')
+    if claims:
+        if token_generations.due():
+            async with _generations_lock:
+                if token_generations.due():
+                    rows = await adb.fetchall(*token_generations.sync_query())
+                    await asyncio.to_thread(token_generations.apply, rows)
+        attrs = webapp._claims_attrs(claims, token_generations.version(user_id))
+        if attrs:
+            return attrs
+    return await _run_queries(webapp._user_attrs_queries(user_id))
+
+
+async def _check_cache_signal():
+    """Async twin of app._check_cache_signal."""
+    if cache_signal.due():
+        async with _signal_lock:
+            if cache_signal.due():
+                rows = await adb.fetchall(VERSION_CHECK_SQL)
+                await asyncio.to_thread(cache_signal.apply, rows)
+
+
+async def _search_index():
+    index = get_search_index()
+    if not index.loaded:
+        async with _index_lock:
+            if not index.loaded:
+                since = await asyncio.to_thread(index.begin_load)
+                rows = await adb.fetchall(LOAD_SQL)
+                await asyncio.to_thread(index.load, rows, since)
+    return index
+
+
+async def _load_book_listing(q, category, sort, limit, cursor, fields):
+    index = await _search_index() if q else None
+    return await _run_queries(webapp._book_listing_queries(index, q, category, sort, limit, cursor, fields), offload=bool(q))
+
+
+async def books(req):
+    q = req.args.get('search')
+    category = req.args.get('category')
+    sort = req.args.get('sort')
+    limit = clamp_limit(req.args.get('limit'), default=100)
+    cursor = req.args.get('cursor')
+    if category and category.lower() == 'all':
+        category = None
+    try:
+        fields = webapp._listing_fields(req.args.get('fields'))
+    except ValueError as e:
+        return 400, {'status': 'error', 'message': str(e)}, ()
+    cache_key = webapp._book_listing_key(q, category, sort, limit, cursor, fields)
+    listing = catalog_cache.get(cache_key)
+    if listing is None:
+        generation = catalog_cache.generation
+        try:
+            rows, next_cursor, prev_cursor = await _load_book_listing(q, category, sort, limit, cursor, fields)
+        except CursorError as e:
+            return 400, {'status': 'error', 'message': str(e)}, ()
+        listing = (rows, next_cursor, prev_cursor, webapp._catalog_etag(rows, next_cursor, prev_cursor))
+        catalog_cache.set(cache_key, listing, tags=['books'] + [f"book:{r['id']}" for r in rows], since=generation)
+    rows, next_cursor, prev_cursor, etag = listing
+
+    payload = req.token_payload(allow_cookie=False) if 'display_price' in fields else None
+    user_is_sub = False
+    if payload:
+        try:
+            user_is_sub = (await _user_attrs(payload))['is_subscriber']
+        except Exception:
+            user_is_sub = False
+
+    etag = etag + '-s' if user_is_sub else etag
+    facets = None
+    if webapp._want_facets(req.args.get('facets'), cursor):
+        facets, facets_etag = await _run_queries(webapp._category_facets_queries())
+        etag = f'{etag}-{facets_etag[:8]}'
+    headers = (('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache'), ('Vary', 'Authorization'))
+    if _etag_matches(req.headers.get('if-none-match'), etag):
+        return 304, None, headers
+    return 200, webapp._book_listing_body(rows, next_cursor, prev_cursor, fields, user_is_sub, facets), headers
+
+
+async def user_borrowings(req, user_id):
+    payload = req.token_payload()
+    if payload is None:
+        return 401, UNAUTHORIZED, ()
+    if payload['user_id'] != user_id and not (await _user_attrs(payload))['is_admin']:
+        return 403, {'status': 'error', 'message': 'Forbidden'}, ()
+    borrowings = await adb.fetchall(webapp.USER_BORROWINGS_SQL, (user_id,))
+    stats = await adb.fetchone(webapp.USER_BORROW_STATS_SQL, (user_id,))
+    return 200, webapp._borrowings_payload(list(borrowings), stats), ()
+
+
+async def admin_dashboard(req):
+    if req.token_payload() is None:
+        return 401, UNAUTHORIZED, ()
+    try:
+        stats = webapp.dashboard_stats.peek()
+        if stats is None:
+            async with _dashboard_lock:
+                stats = webapp.dashboard_stats.peek()
+                if stats is None:
+                    generation = webapp.dashboard_stats.generation
+                    stats = await adb.fetchone(webapp.DASHBOARD_STATS_SQL)
+                    webapp.dashboard_stats.put(stats, since=generation)
+        return 200, {'status': 'success', 'data': webapp._dashboard_payload(stats)}, ()
+    except Exception as e:
+        return 500, {'status': 'error', 'message': str(e)}, ()
+
+
+# (path pattern, metrics label matching the Flask rule, handler) of the GETs served natively
+ROUTES = (
+    (re.compile(r'/api/books'), '/api/books', books),
+    (re.compile(r'/api/users/(\d+)/borrowings'), '/api/users/<int:user_id>/borrowings', user_borrowings),
+    (re.compile(r'/api/admin/dashboard'), '/api/admin/dashboard', admin_dashboard),
+)
+
+
+def _encode(payload):
+    if payload is None:
+        return b''
+    if isinstance(payload, bytes):
+        # already encoded, e.g. a listing assembled from fragments
+        return payload
+    # the app's JSON settings, as jsonify uses them
+    with webapp.app.app_context():
+        return (json.dumps(payload) + '\n').encode('utf-8')
+
+
+def _startup():
+    try:
+        ensure_schema()
+    except Exception as e:
+        print('DB init failed:', e)
+    webapp.token_sweeper.start()
+
+
+class LibraryASGI:
+    def __init__(self, flask_app):
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            for pattern, label, handler in ROUTES:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    return await self._serve(scope, send, label, handler, [int(g) for g in match.groups()])
+        return await self.wsgi(scope, receive, send)
+
+    async def _serve(self, scope, send, label, handler, args):
+        start = time.perf_counter()
+        sql = adb.track_queries()
+        try:
+            await _check_cache_signal()
+            status, payload, headers = await handler(Request(scope), *args)
+        except Exception:
+            logger.exception('Internal server error')
+            status, headers = 500, ()
+            payload = {'status': 'error', 'message': 'Internal server error', 'error_code': 'SERVER_ERROR',
+                       'timestamp': datetime.utcnow().isoformat()}
+        finally:
+            await adb.release_db()
+        body = _encode(payload)
+        headers = list(headers)
+        if payload is not None:
+            headers.append(('Content-Type', 'application/json'))
+        # the same compression CompressionMiddleware applies to the WSGI app's responses
+        headers, body = compress_response(status, headers, body, Request(scope).headers.get('accept-encoding'))
+        raw_headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+        webapp.http_latency.observe(time.perf_counter() - start, label, 'GET')
+        webapp.http_requests.inc(label, 'GET', str(status))
+        webapp.http_response_size.observe(len(body), label)
+        webapp.request_queries.observe(sql[0], label)
+        webapp.request_sql_time.observe(sql[1], label)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.to_thread(_startup)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await adb.close_pool()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = LibraryASGI(webapp.app)
@@ -0,0 +1,278 @@
+"""Static asset pipeline: per-page bundles, fingerprinted and precompressed.
+
+Build step, run on deploy after anything in static/ or templates/ changes:
+
+    python assets.py
+
+In every page (static/**/*.html and templates/**/*.html), each run of adjacent
+local stylesheet links or script tags with the same attributes becomes one
+bundle. The bundle is minified with rjsmin/rcssmin and written to static/dist/
+under a content-hash name, with a .gz copy and a .br copy (brotli). All three
+are in requirements.txt; if one is missing anyway the build still runs and
+says what it left out: CSS falls back to stripping comments and whitespace,
+JS is only concatenated and no .br copies are written. static/dist/manifest.json lists the bundles and, per page, the tag
+text each one replaces.
+
+At runtime the manifest and every variant are read into memory once. Pages are
+rewritten to reference the bundles, which are served from /assets/<name> with
+immutable caching. Without a build the pages keep their original tags.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:  # optional: no .br variants
+    brotli = None
+try:
+    import rcssmin
+except ImportError:  # optional: built-in CSS minifier
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:  # optional: JS only concatenated
+    rjsmin = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+TEMPLATE_DIR = os.path.join(ROOT, 'templates')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+URL_PREFIX = '/assets/'
+# bundles are named by content, so a client never needs to revalidate one
+IMMUTABLE = 'public, max-age=31536000, immutable'
+MIMETYPES = {'.css': 'text/css; charset=utf-8', '.js': 'application/javascript; charset=utf-8'}
+# preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_TAG = re.compile(r'<link\b[^>]*>|<script\b[^>]*\bsrc=[^>]*>\s*</script>', re.I)
+_URL_ATTR = re.compile(r'\s(href|src)=("[^"]*"|\'[^\']*\')', re.I)
+_STYLESHEET = re.compile(r'\brel=["\']?stylesheet', re.I)
+_URL_FOR = re.compile(r"""^\{\{\s*url_for\(\s*['"]static['"]\s*,\s*filename\s*=\s*['"]([^'"]+)['"]\s*\)\s*\}\}$""")
+_CSS_STRING = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')')
+
+
+def _local_source(url):
+    """Path under static/ of a local .css/.js reference, or None."""
+    match = _URL_FOR.match(url)
+    path = match.group(1) if match else url[len('/static/'):] if url.startswith('/static/') else None
+    if not path or path.startswith('dist/') or os.path.splitext(path)[1] not in MIMETYPES:
+        return None
+    return path if os.path.isfile(os.path.join(STATIC_DIR, path)) else None
+
+
+def _local_tags(html):
+    """(start, end, kind, attrs, source) of each local stylesheet/script tag in `html`."""
+    for match in _TAG.finditer(html):
+        tag = match.group(0)
+        url_attr = _URL_ATTR.search(tag)
+        if not url_attr:
+            continue
+        kind = 'script' if tag[:7].lower() == '<script' else 'css' if _STYLESHEET.search(tag) else None
+        source = _local_source(url_attr.group(2)[1:-1]) if kind else None
+        if source is None:
+            continue
+        # the other attributes (defer, async, media...) must match for tags to share a bundle
+        head = tag[:tag.index('>')]
+        attrs = ' '.join((head[:url_attr.start()] + head[url_attr.end():]).split()[1:])
+        if kind == 'css':
+            attrs = _STYLESHEET.sub('', attrs).replace('"', '').replace("'", '').strip()
+        yield match.start(), match.end(), kind, attrs, source
+
+
+def _groups(html):
+    """Runs of adjacent local tags of the same kind and attributes, in page order."""
+    groups = []
+    for start, end, kind, attrs, source in _local_tags(html):
+        last = groups[-1] if groups else None
+        if last and last['kind'] == kind and last['attrs'] == attrs and not html[last['end']:start].strip():
+            last['end'] = end
+            last['sources'].append(source)
+        else:
+            groups.append({'start': start, 'end': end, 'kind': kind, 'attrs': attrs, 'sources': [source]})
+    return groups
+
+
+def _minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    parts = _CSS_STRING.split(text)
+    # even parts are outside string literals
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        parts[i] = re.sub(r'\s*([{};,>])\s*', r'\1', part).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def _bundle(kind, sources):
+    texts = []
+    for source in sources:
+        with open(os.path.join(STATIC_DIR, source), encoding='utf-8') as f:
+            texts.append(f.read())
+    if kind == 'css':
+        return _minify_css('\n'.join(texts))
+    # the ; keeps a file without a trailing semicolon from running into the next
+    text = '\n;\n'.join(texts)
+    return rjsmin.jsmin(text) if rjsmin is not None else text
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build():
+    """Write the bundles and manifest; returns the manifest."""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {'assets': {}, 'pages': {}}
+    pages = []
+    for top in (STATIC_DIR, TEMPLATE_DIR):
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = sorted(d for d in dirnames if os.path.join(dirpath, d) != DIST_DIR)
+            pages += [os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith('.html')]
+    for page in pages:
+        with open(page, encoding='utf-8') as f:
+            html = f.read()
+        replacements = []
+        for group in _groups(html):
+            ext = '.css' if group['kind'] == 'css' else '.js'
+            data = _bundle(group['kind'], group['sources']).encode('utf-8')
+            stem = os.path.splitext(os.path.basename(group['sources'][0]))[0] if len(group['sources']) == 1 else 'bundle'
+            name = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            if name not in manifest['assets']:
+                _write(os.path.join(DIST_DIR, name), data)
+                _write(os.path.join(DIST_DIR, name + '.gz'), gzip.compress(data, 9, mtime=0))
+                encodings = ['gzip']
+                if brotli is not None:
+                    _write(os.path.join(DIST_DIR, name + '.br'), brotli.compress(data, quality=11))
+                    encodings.insert(0, 'br')
+                manifest['assets'][name] = {'sources': group['sources'], 'encodings': encodings}
+            attrs = f" {group['attrs']}" if group['attrs'] else ''
+            if group['kind'] == 'css':
+                replace = f'<link rel="stylesheet" href="{URL_PREFIX}{name}"{attrs}>'
+            else:
+                replace = f'<script src="{URL_PREFIX}{name}"{attrs}></script>'
+            replacements.append({'find': html[group['start']:group['end']], 'replace': replace})
+        if replacements:
+            manifest['pages'][os.path.relpath(page, ROOT).replace(os.sep, '/')] = replacements
+    _write(MANIFEST_PATH, json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def _accepted(header):
+    """Content codings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class AssetStore:
+    """The built bundles, every encoding held in memory, and the page rewrites that point at them."""
+
+    def __init__(self, dist_dir=DIST_DIR):
+        self.dist_dir = dist_dir
+        self.assets = {}
+        self.rewrites = {}
+        self._pages = {}
+
+    def load(self):
+        path = os.path.join(self.dist_dir, 'manifest.json')
+        if not os.path.exists(path):
+            return self
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        assets = {}
+        for name, info in manifest['assets'].items():
+            variants = {}
+            for encoding, suffix in (('identity', ''),) + ENCODINGS:
+                if encoding == 'identity' or encoding in info['encodings']:
+                    with open(os.path.join(self.dist_dir, name + suffix), 'rb') as f:
+                        variants[encoding] = f.read()
+            etag = hashlib.sha256(variants['identity']).hexdigest()[:16]
+            assets[name] = (MIMETYPES[os.path.splitext(name)[1]], etag, variants)
+        self.assets = assets
+        self.rewrites = manifest['pages']
+        self._pages = {}
+        return self
+
+    def rewrite(self, page, html):
+        """`html` of `page` (path from the project root) with its bundled tags swapped in.
+        A tag run that changed since the build is left as it is."""
+        for replacement in self.rewrites.get(page, ()):
+            html = html.replace(replacement['find'], replacement['replace'])
+        return html
+
+    def page(self, relpath):
+        """A static/ HTML page, rewritten and kept in memory; returns (bytes, etag)."""
+        cached = self._pages.get(relpath)
+        if cached is None:
+            with open(os.path.join(STATIC_DIR, relpath), encoding='utf-8') as f:
+                body = self.rewrite('static/' + relpath, f.read()).encode('utf-8')
+            cached = self._pages[relpath] = (body, hashlib.sha256(body).hexdigest()[:16])
+        return cached
+
+    def negotiate(self, name, accept_encoding):
+        """(body, content coding or None, mimetype, etag) of bundle `name` for the client, or None."""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        mimetype, etag, variants = asset
+        accepted = _accepted(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in variants:
+                return variants[encoding], encoding, mimetype, f'{etag}-{encoding}'
+        return variants['identity'], None, mimetype, etag
+
+    def template_loader(self, loader, prefix='templates'):
+        """Wrap a Jinja loader so templates are compiled with their bundled tags."""
+        from jinja2 import BaseLoader
+
+        store = self
+
+        class RewritingLoader(BaseLoader):
+            def get_source(self, environment, template):
+                source, filename, uptodate = loader.get_source(environment, template)
+                return store.rewrite(f'{prefix}/{template}', source), filename, uptodate
+
+            def list_templates(self):
+                return loader.list_templates()
+
+        return RewritingLoader()
+
+
+def static_files(static_dir=STATIC_DIR):
+    """Every file under static/, as paths relative to it, for lookups without filesystem probes."""
+    found = set()
+    for dirpath, _, filenames in os.walk(static_dir):
+        for filename in filenames:
+            found.add(os.path.relpath(os.path.join(dirpath, filename), static_dir).replace(os.sep, '/'))
+    return frozenset(found)
+
+
+asset_store = AssetStore().load()
+
+
+if __name__ == '__main__':
+    built = build()
+    print(f"{len(built['assets'])} bundles for {len(built['pages'])} pages in {os.path.relpath(DIST_DIR, ROOT)}")
+    missing = [name for name, module in (('brotli', brotli), ('rjsmin', rjsmin), ('rcssmin', rcssmin)) if module is None]
+    if missing:
+        print(f"warning: {', '.join(missing)} not installed (pip install -r requirements.txt): "
+              'bundles are not fully minified or have no .br variants', file=sys.stderr)
+    sys.exit(0)
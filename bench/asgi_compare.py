@@ -0,0 +1,150 @@
+"""Requests/sec and latency of the sync server against the ASGI one, at high concurrency.
+
+Starts the app twice against the same database: on Flask's threaded server
+(how app.py runs it) and under uvicorn through asgi.py. Each one then gets
+--clients concurrent keep-alive connections for --seconds, all driven by one
+asyncio client that cycles through the catalog, a user's borrowings and the
+admin dashboard. Reports throughput, errors and latency percentiles per server.
+Pass --sync-url / --asgi-url to measure servers you started yourself.
+
+Uses the connection settings from .env, like app.py does; needs
+requirements-asgi.txt installed, and an existing user for --user-id.
+
+    python bench/asgi_compare.py --clients 1000 --seconds 20
+    python bench/asgi_compare.py --asgi-url http://10.0.0.5:8000 --sync-url http://10.0.0.5:5000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def _request(reader, writer, host, path, token):
+    writer.write((f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    length = 0
+    keep_alive = status_line.startswith(b'HTTP/1.1')
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            keep_alive = value.strip().lower() != 'close'
+    if length:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _client(url, paths, token, offset, deadline, latencies, statuses):
+    parts = urlsplit(url)
+    conn = None
+    i = offset
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            status, keep_alive = await _request(*conn, parts.netloc, path, token)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            status, keep_alive = 'error', False
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+        if not keep_alive and conn is not None:
+            conn[1].close()
+            conn = None
+    if conn is not None:
+        conn[1].close()
+
+
+async def _run(url, paths, token, clients, seconds):
+    latencies, statuses = [], {}
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(*(_client(url, paths, token, n, deadline, latencies, statuses) for n in range(clients)))
+    return latencies, statuses
+
+
+def _wait_until_up(url, timeout=30):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port), 1))
+            return
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def _start(kind, port):
+    if kind == 'sync':
+        cmd = [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+               '--log-level', 'warning', '--backlog', '4096']
+    return subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--user-id', type=int, default=1, help='existing user whose borrowings are read')
+    parser.add_argument('--sync-url')
+    parser.add_argument('--asgi-url')
+    args = parser.parse_args(argv)
+
+    # one socket per client, plus the servers' own when they run here
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.clients * 3 + 256)), hard))
+
+    from app import create_access_token
+    token = create_access_token(args.user_id)
+    paths = ['/api/books?limit=20', f'/api/users/{args.user_id}/borrowings', '/api/admin/dashboard',
+             '/api/books?limit=20&sort=newest']
+
+    for kind, url, port in (('sync', args.sync_url, 5101), ('asgi', args.asgi_url, 5102)):
+        server = None
+        if url is None:
+            url = f'http://127.0.0.1:{port}'
+            server = _start(kind, port)
+        try:
+            _wait_until_up(url)
+            asyncio.run(_run(url, paths, token, 50, 2))  # warm caches and pools
+            latencies, statuses = asyncio.run(_run(url, paths, token, args.clients, args.seconds))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        ok = sum(n for status, n in statuses.items() if status == 200)
+        print(f'{kind}: {args.clients} clients, {ok / args.seconds:,.0f} req/s ok, '
+              f'p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, '
+              f'responses {dict(sorted(statuses.items(), key=str))}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
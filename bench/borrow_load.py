@@ -0,0 +1,177 @@
+"""Concurrent borrow load test against a real MySQL/MariaDB database.
+
+Creates one book with a limited number of copies and a batch of throwaway
+users, then fires every borrow at /api/borrow at once through the Flask app.
+Afterwards it checks that the book was never oversold: the copies taken
+equal the successful borrows, nobody holds two copies, and available_copies
+never dropped below zero. Everything it created is deleted at the end.
+
+With --mode both (the default) the same load first runs through the old
+read-check-write borrow (SELECT the stock and any active loan, then INSERT
+and decrement), issued straight against the database, and then through the
+current /api/borrow. Both are reported, so throughput can be compared and the
+overselling of the old path seen. Only the current path's checks decide the
+exit status.
+
+Uses the connection settings from .env, like app.py does.
+
+    python bench/borrow_load.py --requests 5000 --copies 200 --workers 64
+    python bench/borrow_load.py --dupes 2    # each user fires two borrows
+    python bench/borrow_load.py --mode new   # skip the baseline
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--copies', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--dupes', type=int, default=1, help='borrows per user (>1 exercises the active-loan unique key)')
+    parser.add_argument('--mode', choices=('both', 'baseline', 'new'), default='both',
+                        help='baseline: the old read-check-write borrow, new: /api/borrow')
+    args = parser.parse_args(argv)
+
+    # every worker thread needs its own connection, plus the watcher and the setup connection
+    os.environ.setdefault('MYSQL_POOL_SIZE', str(args.workers + 2))
+    from mysql.connector import IntegrityError
+    from app import app, create_access_token
+    from db import get_pool
+
+    n_users = max(1, args.requests // args.dupes)
+    tag = f'loadtest-{int(time.time())}'
+    conn = get_pool().get_connection()
+    cur = conn.cursor()
+    cur.execute('INSERT INTO books (title, author, total_copies, available_copies, created_at) VALUES (%s,%s,%s,%s,NOW())',
+                (tag, 'borrow_load', args.copies, args.copies))
+    book_id = cur.lastrowid
+    cur.executemany('INSERT INTO users (name, email, status, created_at) VALUES (%s,%s,%s,NOW())',
+                    [(tag, f'{tag}-{i}@example.invalid', 'active') for i in range(n_users)])
+    conn.commit()
+    cur.execute('SELECT id FROM users WHERE name = %s', (tag,))
+    user_ids = [r[0] for r in cur.fetchall()]
+    borrowers = [uid for uid in user_ids for _ in range(args.dupes)]
+    tokens = {uid: create_access_token(uid) for uid in user_ids}
+
+    local = threading.local()
+
+    def borrow(user_id):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        resp = client.post('/api/borrow', json={'book_id': book_id}, headers={'Authorization': f'Bearer {tokens[user_id]}'})
+        return resp.status_code
+
+    def legacy_borrow(user_id):
+        """The borrow /api/borrow used before the guarded UPDATE: read, check in Python, write."""
+        lconn = get_pool().get_connection()
+        lcur = lconn.cursor()
+        try:
+            lcur.execute('SELECT available_copies FROM books WHERE id = %s', (book_id,))
+            row = lcur.fetchone()
+            if not row:
+                return 404
+            if row[0] <= 0:
+                return 400
+            lcur.execute("SELECT id FROM borrowings WHERE user_id = %s AND book_id = %s AND status = 'borrowed'",
+                         (user_id, book_id))
+            if lcur.fetchone():
+                return 400
+            try:
+                lcur.execute("""INSERT INTO borrowings (user_id, book_id, borrowed_at, due_at, status, created_at)
+                                VALUES (%s, %s, NOW(), NOW() + INTERVAL 14 DAY, 'borrowed', NOW())""", (user_id, book_id))
+            except IntegrityError:
+                # uq_borrowings_active now stops the duplicate loans the old code let through
+                lconn.rollback()
+                return 400
+            lcur.execute('UPDATE books SET available_copies = available_copies - 1 WHERE id = %s', (book_id,))
+            lcur.execute('UPDATE users SET active_loans = active_loans + 1 WHERE id = %s', (user_id,))
+            lconn.commit()
+            return 200
+        finally:
+            lcur.close()
+            lconn.close()
+
+    def reset():
+        conn.rollback()
+        cur.execute('DELETE FROM borrowings WHERE book_id = %s', (book_id,))
+        cur.execute('UPDATE books SET available_copies = %s WHERE id = %s', (args.copies, book_id))
+        cur.execute('UPDATE users SET active_loans = 0 WHERE name = %s', (tag,))
+        conn.commit()
+
+    def run(label, fn):
+        lowest = [args.copies]
+        statuses = {}
+        lock = threading.Lock()
+
+        def call(user_id):
+            status = fn(user_id)
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+        def watch(stop):
+            wconn = get_pool().get_connection()
+            wcur = wconn.cursor()
+            while not stop.is_set():
+                wconn.rollback()
+                wcur.execute('SELECT available_copies FROM books WHERE id = %s', (book_id,))
+                lowest[0] = min(lowest[0], wcur.fetchone()[0])
+                time.sleep(0.005)
+            wconn.close()
+
+        stop = threading.Event()
+        watcher = threading.Thread(target=watch, args=(stop,))
+        watcher.start()
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                list(pool.map(call, borrowers))
+            elapsed = time.perf_counter() - start
+        finally:
+            stop.set()
+            watcher.join()
+
+        conn.rollback()
+        cur.execute('SELECT available_copies FROM books WHERE id = %s', (book_id,))
+        available = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*), COUNT(DISTINCT user_id) FROM borrowings WHERE book_id = %s AND status = 'borrowed'", (book_id,))
+        loans, holders = cur.fetchone()
+        ok = statuses.get(200, 0)
+
+        print(f'{label}: {len(borrowers)} borrows, {args.workers} workers: {elapsed:.2f}s, {len(borrowers) / elapsed:,.0f} req/s')
+        print(f'  responses: {dict(sorted(statuses.items()))}')
+        print(f'  copies {args.copies}, available now {available}, lowest seen {lowest[0]}, active loans {loans}')
+        checks = {
+            'never negative': lowest[0] >= 0 and available >= 0,
+            'copies taken == successful borrows': args.copies - available == ok == loans,
+            'one active loan per user': loans == holders,
+        }
+        for name, passed in checks.items():
+            print(f"    {'PASS' if passed else 'FAIL'}  {name}")
+        return all(checks.values())
+
+    try:
+        passed = True
+        if args.mode in ('both', 'baseline'):
+            run('baseline (read-check-write)', legacy_borrow)
+            reset()
+        if args.mode in ('both', 'new'):
+            passed = run('new (/api/borrow)', borrow)
+        return 0 if passed else 1
+    finally:
+        conn.rollback()
+        cur.execute('DELETE FROM users WHERE name = %s', (tag,))
+        cur.execute('DELETE FROM books WHERE id = %s', (book_id,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+"""Encoding time of /api/books bodies: Flask's default JSON, the fast provider, cached fragments.
+
+Builds synthetic book rows shaped like the database returns them (Decimal
+prices, datetime columns) and times, per listing size:
+
+  before     stdlib json with Flask's default provider settings, full rows
+             copied per request (how listings were encoded before)
+  provider   the same payload through fastjson.dumps (JSON_PROVIDER)
+  cards      the card projection (the listing default) through fastjson.dumps
+  fragments  the card projection assembled from warm per-book fragments,
+             as books() now does on a listing cache hit
+
+No database needed.
+
+    python bench/json_encode.py
+    python bench/json_encode.py --sizes 100 1000 --repeat 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_rows(n):
+    base = datetime(2024, 1, 1)
+    return [{
+        'id': i,
+        'title': f'Book title number {i}',
+        'author': f'Author {i % 97}',
+        'category': ('Travel', 'Mystery', 'Poetry', 'History', 'Fiction')[i % 5],
+        'price': Decimal('%d.%02d' % (10 + i % 50, i % 100)),
+        'rating': i % 6,
+        'image_url': f'https://example.invalid/media/cache/{i:06d}.jpg',
+        'reviews': i % 40,
+        'has_pdf': i % 2,
+        'total_copies': 3,
+        'available_copies': i % 4,
+        'description': 'A long description of the book. ' * 60,
+        'created_at': base + timedelta(hours=i),
+        'catalog_key': '%040x' % i,
+    } for i in range(n)]
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, len(body)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    import fastjson
+    from app import CARD_FIELDS, _book_listing_body, _listing_select, _shape_listing_rows
+
+    print(f'provider: {fastjson.PROVIDER}')
+    for n in args.sizes:
+        full = make_rows(n)
+
+        def before():
+            books = []
+            for b in full:
+                book = dict(b)
+                book['display_price'] = float(book.get('price') or 0)
+                book['availability'] = 'Available' if book.get('has_pdf') else 'Coming Soon'
+                books.append(book)
+            payload = {'status': 'success', 'data': {'books': books, 'next_cursor': None, 'prev_cursor': None}}
+            return (json.dumps(payload, default=fastjson._default, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+        def provider():
+            payload = {'status': 'success', 'data': {'books': full, 'next_cursor': None, 'prev_cursor': None}}
+            return fastjson.dumps(payload)
+
+        # card rows as the listing query returns them, shaped once like a cache fill
+        _, helpers = _listing_select(CARD_FIELDS, 'id')
+        cards = _shape_listing_rows([{**{k: r[k] for k in CARD_FIELDS if k in r},
+                                      'availability': 'Available' if r['has_pdf'] else 'Coming Soon'} for r in full],
+                                    CARD_FIELDS, helpers)
+        _book_listing_body(cards, None, None, CARD_FIELDS, False)  # warm the fragments
+
+        def card_payload():
+            return fastjson.dumps({'status': 'success', 'data': {'books': cards, 'next_cursor': None, 'prev_cursor': None}})
+
+        def fragments():
+            return _book_listing_body(cards, None, None, CARD_FIELDS, False)
+
+        assert json.loads(fragments()) == json.loads(card_payload())
+        for name, fn in (('before', before), ('provider', provider), ('cards', card_payload), ('fragments', fragments)):
+            seconds, size = timed(fn, args.repeat)
+            print(f'{n:>6} books  {name:<9} {seconds * 1000:9.2f} ms  {size / 1024:9.1f} KiB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,107 @@
+"""Login throughput next to catalog latency under mixed load, against a real database.
+
+Creates a batch of throwaway users, then for --seconds runs --login-workers
+threads logging in as them while --catalog-workers threads read /api/books,
+all through the Flask app. Reports logins per second, shed (503) logins and
+catalog latency percentiles. Run it once with the password pool and once with
+--inline (hashing on the request thread, the old behaviour) to compare.
+Everything it created is deleted at the end.
+
+Uses the connection settings from .env, like app.py does.
+
+    python bench/login_mixed.py --seconds 20 --login-workers 32 --catalog-workers 8
+    python bench/login_mixed.py --inline
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--login-workers', type=int, default=16)
+    parser.add_argument('--catalog-workers', type=int, default=4)
+    parser.add_argument('--inline', action='store_true', help='hash on the request thread (PASSWORD_HASH_WORKERS=0)')
+    args = parser.parse_args(argv)
+
+    if args.inline:
+        os.environ['PASSWORD_HASH_WORKERS'] = '0'
+    os.environ.setdefault('MYSQL_POOL_SIZE', str(args.login_workers + args.catalog_workers))
+    from app import app
+    from db import get_pool
+    from passwords import password_pool
+
+    tag = f'loginbench-{int(time.time())}'
+    password = 'bench-password'
+    hashed = password_pool.hash(password)
+    conn = get_pool().get_connection()
+    cur = conn.cursor()
+    cur.executemany('INSERT INTO users (name, email, password, status, created_at) VALUES (%s,%s,%s,%s,NOW())',
+                    [(tag, f'{tag}-{i}@example.invalid', hashed, 'active') for i in range(args.users)])
+    conn.commit()
+
+    local = threading.local()
+    lock = threading.Lock()
+    logins = {}
+    catalog_ms = []
+    deadline = time.monotonic() + args.seconds
+
+    def client():
+        c = getattr(local, 'client', None)
+        if c is None:
+            c = local.client = app.test_client()
+        return c
+
+    def login_loop(worker):
+        i = worker
+        while time.monotonic() < deadline:
+            resp = client().post('/api/auth/login', json={'email': f'{tag}-{i % args.users}@example.invalid', 'password': password})
+            with lock:
+                logins[resp.status_code] = logins.get(resp.status_code, 0) + 1
+            i += args.login_workers
+
+    def catalog_loop(worker):
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            client().get('/api/books?limit=20')
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                catalog_ms.append(elapsed)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.login_workers + args.catalog_workers) as pool:
+            for w in range(args.login_workers):
+                pool.submit(login_loop, w)
+            for w in range(args.catalog_workers):
+                pool.submit(catalog_loop, w)
+
+        mode = 'inline' if args.inline else f'{password_pool.workers} hash workers, max {password_pool.max_pending} pending'
+        print(f'{args.seconds:.0f}s, {mode}, rounds {password_pool.rounds}')
+        print(f'logins: {logins.get(200, 0) / args.seconds:,.1f}/s ok, responses {dict(sorted(logins.items()))}')
+        print(f'catalog: {len(catalog_ms) / args.seconds:,.1f} req/s, '
+              f'p50 {percentile(catalog_ms, 50):.1f} ms, p95 {percentile(catalog_ms, 95):.1f} ms, '
+              f'p99 {percentile(catalog_ms, 99):.1f} ms')
+        return 0
+    finally:
+        cur.execute('DELETE FROM users WHERE name = %s', (tag,))
+        conn.commit()
+        conn.close()
+        password_pool.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,82 @@
+"""Catalog search latency vs. catalog size.
+
+Compares the in-process inverted index (search.BookSearchIndex) with a linear
+substring scan, which is what `title LIKE '%q%' OR author LIKE '%q%'` costs the
+database. Books are synthetic, so no MySQL server is needed.
+
+    python bench/search_bench.py                 # 1k, 10k, 100k, 1M
+    python bench/search_bench.py 1000 50000      # custom sizes
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import BookSearchIndex  # noqa: E402
+
+CATEGORIES = ['Fiction', 'Poetry', 'History', 'Science', 'Travel', 'Mystery', 'Romance', 'Fantasy']
+QUERIES = ['light', 'dark water', 'garden', 'mou', 'silent river night']
+
+
+def make_words(rng, n):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = {'light', 'dark', 'water', 'garden', 'mountain', 'silent', 'river', 'night'}
+    while len(words) < n:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def make_books(n, seed=7):
+    rng = random.Random(seed)
+    words = make_words(rng, 20000)
+    for i in range(1, n + 1):
+        yield {
+            'id': i,
+            'title': ' '.join(rng.choices(words, k=rng.randint(2, 6))).title(),
+            'author': ' '.join(rng.choices(words, k=2)).title(),
+            'category': rng.choice(CATEGORIES),
+            'description': ' '.join(rng.choices(words, k=12)),
+        }
+
+
+def time_it(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def run(size):
+    books = list(make_books(size))
+    start = time.perf_counter()
+    index = BookSearchIndex(ttl=0)
+    index.load(books)
+    build_ms = (time.perf_counter() - start) * 1000.0
+
+    def indexed():
+        for q in QUERIES:
+            index.search(q, limit=100)
+
+    def scan():
+        for q in QUERIES:
+            needle = q.lower()
+            [b['id'] for b in books if needle in b['title'].lower() or needle in b['author'].lower()][:100]
+
+    repeat = 5 if size <= 100000 else 2
+    idx_ms = time_it(indexed, repeat) / len(QUERIES)
+    scan_ms = time_it(scan, repeat) / len(QUERIES)
+    print(f'{size:>9,} books  build {build_ms:9.1f} ms  index {idx_ms:8.3f} ms/query  scan {scan_ms:9.3f} ms/query')
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [1000, 10000, 100000, 1000000]
+    for size in sizes:
+        run(size)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
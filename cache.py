@@ -0,0 +1,303 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Entries can carry tags so writers can drop everything derived from a row
+    (e.g. "book:42") without knowing the exact keys. hits/misses/evictions are
+    counted for sizing; expired and invalidated entries are not evictions.
+
+    A value loaded from the database can be older than an invalidation that
+    ran while it was loading. Callers read `generation` before loading and
+    pass it to set() as `since`; the value is dropped if any of its tags was
+    invalidated (or the cache cleared) after that point.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._tags = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+        # invalidate()/clear() calls so far; tag -> the call that last invalidated it
+        self._generation = 0
+        self._invalidated_at = {}
+        self._cleared_at = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def generation(self):
+        """Token to pass to set() as `since` by a caller about to load a value."""
+        return self._generation
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires, _ = entry
+            if expires < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_many(self, keys):
+        """Values for `keys` in order, None for misses, under a single lock acquisition."""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None or entry[1] < now:
+                    if entry is not None:
+                        self._drop(key)
+                    self.misses += 1
+                    values.append(None)
+                    continue
+                self._data.move_to_end(key)
+                self.hits += 1
+                values.append(entry[0])
+        return values
+
+    def set(self, key, value, tags=(), ttl=None, since=None):
+        """Store `value`; with `since` (a `generation`), only if none of `tags` was invalidated after it."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        tags = frozenset(tags)
+        with self._lock:
+            if since is not None and (self._cleared_at > since
+                                      or any(self._invalidated_at.get(tag, 0) > since for tag in tags)):
+                self.stale_sets += 1
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, expires, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of `tags`."""
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._invalidated_at[tag] = self._generation
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cleared_at = self._generation
+            self._invalidated_at.clear()
+            self._data.clear()
+            self._tags.clear()
+
+    def _drop(self, key):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_sets': self.stale_sets,
+            }
+
+
+class Snapshot:
+    """A single computed value kept in memory for at most `max_age` seconds.
+
+    Only one caller recomputes an expired snapshot; concurrent callers wait for
+    that result instead of all hitting the database at once. `on_invalidate`,
+    if given, is called whenever a writer marks the value stale. A value whose
+    load overlapped an invalidate() is returned to its caller but not kept.
+    """
+
+    def __init__(self, loader, max_age, on_invalidate=None):
+        self.loader = loader
+        self.max_age = max_age
+        self.on_invalidate = on_invalidate
+        self._lock = threading.Lock()
+        # held only to check the generation and store, never while loading
+        self._stamp_lock = threading.Lock()
+        self._value = None
+        self._computed_at = None
+        self.refreshes = 0
+        # invalidate() calls so far; a load is kept only if none ran while it loaded
+        self.generation = 0
+
+    def _fresh(self):
+        return self._computed_at is not None and time.monotonic() - self._computed_at < self.max_age
+
+    def get(self):
+        if self._fresh():
+            return self._value
+        with self._lock:
+            if not self._fresh():
+                generation = self.generation
+                value = self.loader()
+                self.refreshes += 1
+                self._store(value, generation)
+                return value
+            return self._value
+
+    def peek(self):
+        """The value if it is still fresh, else None; never recomputes."""
+        return self._value if self._fresh() else None
+
+    def put(self, value, since=None):
+        """Store a value computed by the caller (e.g. through another driver), unless
+        `since`, the `generation` read before computing it, is no longer current.
+        Does not take the recompute lock, so it never waits on a running loader."""
+        self.refreshes += 1
+        self._store(value, since)
+
+    def _store(self, value, since):
+        with self._stamp_lock:
+            if since is not None and since != self.generation:
+                return
+            self._value = value
+            self._computed_at = time.monotonic()
+
+    @property
+    def age(self):
+        if self._computed_at is None:
+            return None
+        return time.monotonic() - self._computed_at
+
+    def invalidate(self):
+        with self._stamp_lock:
+            self.generation += 1
+            self._computed_at = None
+        if self.on_invalidate:
+            self.on_invalidate()
+
+
+VERSION_CHECK_SQL = 'SELECT name, version FROM cache_versions'
+# LAST_INSERT_ID(expr) hands the new version back as the cursor's lastrowid
+VERSION_BUMP_SQL = 'UPDATE cache_versions SET version = LAST_INSERT_ID(version + 1) WHERE name = %s'
+
+
+class VersionSignal:
+    """Per-scope version counters in the cache_versions table, so processes that
+    cache the same data (preforked workers) drop it after each other's writes.
+
+    A write calls bump() once it has committed; check() reads every version at
+    most every `interval` seconds and runs the handlers of each scope that
+    another process moved, so their writes show here within `interval` seconds.
+    A process's own bumps do not run its handlers.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        # guards _versions; held only to compare and record, never across a query
+        self._lock = threading.Lock()
+        # one check at a time, held while the table is read
+        self._check_lock = threading.Lock()
+        self._handlers = {}
+        self._versions = None
+        self._checked_at = None
+        self.checks = 0
+        self.signals = 0
+
+    def on(self, scope, handler):
+        """Call `handler()` whenever another process bumps `scope`."""
+        self._handlers.setdefault(scope, []).append(handler)
+
+    def bump(self, cur, scope):
+        """Move `scope` on; commit afterwards unless the caller's transaction does."""
+        cur.execute(VERSION_BUMP_SQL, (scope,))
+        version = cur.lastrowid
+        with self._lock:
+            if self._versions is not None and self._versions.get(scope) == version - 1:
+                # nobody else moved it since the last check
+                self._versions[scope] = version
+
+    def due(self):
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.interval
+
+    def apply(self, rows):
+        """Record the VERSION_CHECK_SQL rows (dicts) and run the handlers of the scopes that moved.
+        Before the first check nothing is known, so every handler runs."""
+        with self._lock:
+            previous = self._versions
+            versions = {row['name']: row['version'] for row in rows}
+            if previous is None:
+                moved = list(self._handlers)
+            else:
+                moved = [scope for scope, version in versions.items() if version > previous.get(scope, version)]
+                # a bump of ours can commit after the read it raced with
+                versions = {scope: max(version, previous.get(scope, version)) for scope, version in versions.items()}
+            self._versions = versions
+            self._checked_at = time.monotonic()
+            self.checks += 1
+        for scope in moved:
+            for handler in self._handlers.get(scope, ()):
+                handler()
+            self.signals += 1
+
+    def check(self, connect):
+        """Catch up with other processes' bumps; `connect` is only called when a check is due."""
+        if not self.due():
+            return
+        with self._check_lock:
+            if not self.due():
+                return
+            cur = connect().cursor(dictionary=True)
+            try:
+                cur.execute(VERSION_CHECK_SQL)
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+            self.apply(rows)
+
+    def stats(self):
+        return {'interval': self.interval, 'checks': self.checks, 'signals': self.signals, 'versions': self._versions}
+
+
+catalog_cache = TTLCache(
+    maxsize=int(os.environ.get('CATALOG_CACHE_SIZE', '1024')),
+    ttl=float(os.environ.get('CATALOG_CACHE_TTL', '60')),
+)
+
+# Pre-encoded JSON of single books keyed by (book_id, projection, variant) and tagged
+# book:<id>; listing responses are assembled from these instead of re-encoding rows
+fragment_cache = TTLCache(
+    maxsize=int(os.environ.get('BOOK_FRAGMENT_CACHE_SIZE', '20000')),
+    ttl=float(os.environ.get('BOOK_FRAGMENT_CACHE_TTL', '600')),
+)
+
+# Cross-process invalidation of the caches above and the app's other derived state
+cache_signal = VersionSignal(interval=float(os.environ.get('CACHE_SIGNAL_INTERVAL', '1')))
@@ -0,0 +1,93 @@
+"""The category_stats aggregate: per-category book count, available copies and price total.
+
+Catalog writes keep it current inside their own transaction by applying
+signed deltas, so a write costs the same however large its categories are.
+The touched books are read before and after the write (the first read
+locks them), and the difference goes to category_stats in one statement:
+
+    before = categories.snapshot(cur, [book_id], lock=True)
+    cur.execute('UPDATE books ...')
+    categories.apply(cur, before, categories.snapshot(cur, [book_id]))
+    db.commit()
+
+Locks are always taken books -> category_stats. Borrow and return move
+available_copies by one with adjust_available(). rebuild() recounts
+everything, for writes that touch an unknown set of books.
+"""
+from decimal import Decimal
+
+_SELECT = '''SELECT category, COUNT(*), COALESCE(SUM(available_copies), 0), COALESCE(SUM(price), 0)
+    FROM books WHERE category IS NOT NULL AND category <> \'\''''
+_INSERT = 'INSERT INTO category_stats (category, book_count, available_copies, price_total) '
+_ADD = ''' ON DUPLICATE KEY UPDATE book_count = book_count + VALUES(book_count),
+    available_copies = available_copies + VALUES(available_copies), price_total = price_total + VALUES(price_total)'''
+CHUNK_SIZE = 500
+
+FACETS_SQL = '''SELECT category, book_count, available_copies, price_total FROM category_stats
+    WHERE book_count > 0 ORDER BY category'''
+
+
+def _in_list(values):
+    return '(' + ','.join(['%s'] * len(values)) + ')'
+
+
+def snapshot(cur, book_ids, lock=False):
+    """book_id -> (category, available_copies, price) of the existing `book_ids`;
+    lock=True takes the row locks, for the read before a write."""
+    book_ids = sorted(set(book_ids))
+    found = {}
+    for i in range(0, len(book_ids), CHUNK_SIZE):
+        chunk = book_ids[i:i + CHUNK_SIZE]
+        cur.execute('SELECT id, category, available_copies, price FROM books WHERE id IN ' + _in_list(chunk)
+                    + (' FOR UPDATE' if lock else ''), tuple(chunk))
+        for row in cur.fetchall():
+            if isinstance(row, dict):
+                row = (row['id'], row['category'], row['available_copies'], row['price'])
+            found[row[0]] = row[1:]
+    return found
+
+
+def apply(cur, before, after):
+    """Move category_stats from the `before` snapshot of some books to their `after` snapshot."""
+    deltas = {}
+    for rows, sign in ((before, -1), (after, 1)):
+        for category, available, price in rows.values():
+            if not category:
+                continue
+            count, copies, total = deltas.get(category, (0, 0, Decimal(0)))
+            deltas[category] = (count + sign, copies + sign * (available or 0), total + sign * Decimal(price or 0))
+    # a price-only change in one category nets to zero on count and copies but not on total
+    deltas = {c: d for c, d in deltas.items() if any(d)}
+    if not deltas:
+        return
+    categories = sorted(deltas)
+    cur.execute(_INSERT + 'VALUES ' + ','.join(['(%s,%s,%s,%s)'] * len(categories)) + _ADD,
+                tuple(v for c in categories for v in (c,) + deltas[c]))
+
+
+def adjust_available(cur, book_id, delta):
+    """Move the available_copies total of `book_id`'s category by `delta`."""
+    cur.execute('''UPDATE category_stats s JOIN books b ON b.category = s.category
+        SET s.available_copies = s.available_copies + %s WHERE b.id = %s''', (delta, book_id))
+
+
+def rebuild(cur):
+    """Recount every category."""
+    cur.execute('DELETE FROM category_stats')
+    cur.execute(_INSERT + _SELECT + ' GROUP BY category')
+
+
+def facets(rows):
+    """The facet list sent with /api/books from FACETS_SQL rows (tuples or dicts)."""
+    out = []
+    for row in rows:
+        if isinstance(row, dict):
+            row = (row['category'], row['book_count'], row['available_copies'], row['price_total'])
+        category, count, available, price_total = row
+        out.append({
+            'category': category,
+            'count': int(count),
+            'available_copies': int(available),
+            'avg_price': round(float(price_total) / count, 2) if count else 0.0,
+        })
+    return out
@@ -0,0 +1,268 @@
+"""On-the-fly compression of API responses.
+
+CompressionMiddleware wraps the WSGI app. Responses under COMPRESS_PATHS with
+a compressible content type are encoded with the best coding the client
+accepts: zstd and brotli when their packages are available, gzip always.
+Bodies under COMPRESS_MIN_BYTES are sent as they are, since the headers would
+cost more than the bytes saved. Bodies of known length up to
+COMPRESS_BUFFER_BYTES are compressed in one piece and keep a Content-Length.
+Larger or streamed bodies are compressed chunk by chunk as the app produces
+them. Bytes in and out and the CPU time spent are exported per coding.
+"""
+import os
+import time
+import zlib
+
+from metrics import registry
+
+try:
+    import brotli
+except ImportError:  # optional: no br
+    brotli = None
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:  # optional: no zstd
+        zstd = None
+
+MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+BUFFER_BYTES = int(os.environ.get('COMPRESS_BUFFER_BYTES', str(1024 * 1024)))
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', '6'))
+BROTLI_LEVEL = int(os.environ.get('COMPRESS_BROTLI_LEVEL', '4'))
+ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL', '3'))
+PATHS = tuple(p for p in os.environ.get('COMPRESS_PATHS', '/api/').split(',') if p)
+# server preference among codings the client accepts with equal q
+PREFERENCE = tuple(e.strip() for e in os.environ.get('COMPRESS_ENCODINGS', 'zstd,br,gzip').split(',') if e.strip())
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/')
+# streams that must reach the client as soon as each event is written
+NEVER = ('text/event-stream',)
+
+compressed_bytes_in = registry.counter('http_compression_bytes_in_total', 'Response bytes before compression.', ('encoding',))
+compressed_bytes_out = registry.counter('http_compression_bytes_out_total', 'Response bytes after compression.', ('encoding',))
+compression_seconds = registry.counter('http_compression_cpu_seconds_total', 'Thread CPU time spent compressing responses.', ('encoding',))
+compression_skipped = registry.counter('http_compression_skipped_total', 'Eligible responses sent uncompressed.', ('reason',))
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def flush(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_LEVEL)
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def flush(self):
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        if hasattr(zstd, 'ZstdCompressor') and hasattr(zstd.ZstdCompressor, 'compressobj'):
+            self._c = zstd.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self._c = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+
+    def compress(self, data):
+        return self._c.compress(data)
+
+    def flush(self):
+        return self._c.flush()
+
+
+CODECS = {'gzip': _Gzip}
+if brotli is not None:
+    CODECS['br'] = _Brotli
+if zstd is not None:
+    CODECS['zstd'] = _Zstd
+
+
+def negotiate(accept_encoding):
+    """The coding to use for an Accept-Encoding header, or None for identity."""
+    best, best_q = None, 0.0
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        for candidate in (PREFERENCE if coding == '*' else (coding,)):
+            if candidate not in CODECS or candidate not in PREFERENCE:
+                continue
+            if q > best_q or (q == best_q and best and PREFERENCE.index(candidate) < PREFERENCE.index(best)):
+                best, best_q = candidate, q
+    return best
+
+
+def compressible(content_type):
+    content_type = (content_type or '').lower()
+    return content_type.startswith(COMPRESSIBLE) and not content_type.startswith(NEVER)
+
+
+def compress_body(body, encoding):
+    """Compress a whole body with `encoding`, recording the metrics."""
+    start = time.thread_time()
+    compressor = CODECS[encoding]()
+    out = compressor.compress(body) + compressor.flush()
+    _record(encoding, len(body), len(out), time.thread_time() - start)
+    return out
+
+
+def compress_response(status, headers, body, accept_encoding, min_bytes=MIN_BYTES):
+    """(headers, body) of an in-memory response, compressed when it qualifies, as the middleware would send it."""
+    headers = list(headers)
+    if not _applies(status, headers):
+        return headers, body
+    encoding = negotiate(accept_encoding)
+    if _skip(headers, encoding, len(body), min_bytes):
+        return headers, body
+    headers = _encoded_headers(headers, encoding)
+    return headers, compress_body(body, encoding)
+
+
+def _record(encoding, size_in, size_out, seconds):
+    compressed_bytes_in.inc(encoding, amount=size_in)
+    compressed_bytes_out.inc(encoding, amount=size_out)
+    compression_seconds.inc(encoding, amount=seconds)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, paths=PATHS, min_bytes=MIN_BYTES, buffer_bytes=BUFFER_BYTES):
+        self.app = app
+        self.paths = paths
+        self.min_bytes = min_bytes
+        self.buffer_bytes = buffer_bytes
+
+    def __call__(self, environ, start_response):
+        if not environ.get('PATH_INFO', '').startswith(self.paths) or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        state = {}
+
+        def capture(status, headers, exc_info=None):
+            # held back until the body is seen; the app (Flask) never uses the returned write()
+            state['start'] = (status, headers, exc_info)
+            return _no_write
+
+        result = self.app(environ, capture)
+        status, headers, exc_info = state['start']
+        plan = self._plan(status, headers, encoding)
+        if plan is None:
+            start_response(status, headers, exc_info)
+            return result
+        headers = _encoded_headers(headers, encoding)
+        if plan == 'buffer':
+            try:
+                body = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            body = compress_body(body, encoding)
+            start_response(status, headers + [('Content-Length', str(len(body)))], exc_info)
+            return [body]
+        start_response(status, headers, exc_info)
+        return self._stream(result, encoding)
+
+    def _plan(self, status, headers, encoding):
+        """'buffer', 'stream' or None (send as is) for a response."""
+        if not _applies(int(status.split(' ', 1)[0]), headers):
+            return None
+        length = _header(headers, 'content-length')
+        length = int(length) if length is not None else None
+        if _skip(headers, encoding, length, self.min_bytes):
+            return None
+        return 'buffer' if length is not None and length <= self.buffer_bytes else 'stream'
+
+    def _stream(self, result, encoding):
+        compressor = CODECS[encoding]()
+        size_in = size_out = 0
+        seconds = 0.0
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                size_in += len(chunk)
+                start = time.thread_time()
+                out = compressor.compress(chunk)
+                seconds += time.thread_time() - start
+                if out:
+                    size_out += len(out)
+                    yield out
+            start = time.thread_time()
+            out = compressor.flush()
+            seconds += time.thread_time() - start
+            size_out += len(out)
+            if out:
+                yield out
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            _record(encoding, size_in, size_out, seconds)
+
+
+def _no_write(data):
+    raise RuntimeError('CompressionMiddleware does not support the WSGI write() callable')
+
+
+def _header(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _applies(status, headers):
+    """Whether the response could be compressed for some client; adds Vary: Accept-Encoding if so."""
+    if status < 200 or status in (204, 206, 304) or not compressible(_header(headers, 'content-type')):
+        return False
+    _add_vary(headers)
+    return True
+
+
+def _skip(headers, encoding, length, min_bytes):
+    """Whether to send an applicable response as it is, counting the reason."""
+    if _header(headers, 'content-encoding'):
+        reason = 'encoded'
+    elif encoding is None:
+        reason = 'not_accepted'
+    elif length is not None and length < min_bytes:
+        reason = 'small'
+    else:
+        return False
+    compression_skipped.inc(reason)
+    return True
+
+
+def _encoded_headers(headers, encoding):
+    etag = _header(headers, 'etag')
+    headers = [(k, v) for k, v in headers if k.lower() not in ('content-length', 'etag')]
+    headers.append(('Content-Encoding', encoding))
+    if etag:
+        # another representation of the same resource, so If-None-Match matches it weakly
+        headers.append(('ETag', etag if etag.startswith('W/') else 'W/' + etag))
+    return headers
+
+
+def _add_vary(headers):
+    for i, (key, value) in enumerate(headers):
+        if key.lower() == 'vary':
+            if 'accept-encoding' not in value.lower():
+                headers[i] = (key, value + ', Accept-Encoding')
+            return
+    headers.append(('Vary', 'Accept-Encoding'))
@@ -1,15 +1,249 @@
+import hashlib
 import os
+import threading
+import time
+from collections import deque
 import mysql.connector
-from mysql.connector import pooling
+from mysql.connector import errorcode
 
 _pool = None
 
-def get_pool():
-    global _pool
-    if _pool is not None:
-        return _pool
+# Upper bounds (seconds) of the checkout wait-time histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# callables run as listener(statement, seconds) after each statement executed
+# through a cursor of a pooled connection
+_query_listeners = []
+
+
+def add_query_listener(listener):
+    _query_listeners.append(listener)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute()/executemany() and reports to the query listeners."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def _timed(self, method, operation, args, kwargs):
+        start = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            for listener in _query_listeners:
+                listener(operation, elapsed)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, args, kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, args, kwargs)
+
+
+class PooledConnection:
+    """Proxy handed out by QueuedPool; close() returns the connection to the pool."""
+
+    def __init__(self, pool, cnx, created_at):
+        self._pool = pool
+        self._cnx = cnx
+        self._created_at = created_at
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
+
+    def is_connected(self):
+        return not self._closed and self._cnx.is_connected()
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._cnx.cursor(*args, **kwargs)
+        return InstrumentedCursor(cursor) if _query_listeners else cursor
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._checkin(self._cnx, self._created_at)
+
+
+class QueuedPool:
+    """Connection pool that queues callers instead of failing when it runs dry.
+
+    Keeps up to `pool_size` connections idle and lets `max_overflow` extra ones
+    be opened under load (closed again on return). A checkout waits up to
+    `timeout` seconds for a free connection and then raises PoolTimeout.
+    Connections older than `recycle` seconds are replaced, and idle ones are
+    pinged before reuse once they have sat for `ping_after` seconds.
+    """
+
+    def __init__(self, pool_size=5, max_overflow=10, timeout=30.0, recycle=3600, ping_after=30.0, **db_config):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._db_config = db_config
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._open = 0
+        self._waiting = 0
+        self.checkouts = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self._wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self._wait_sum = 0.0
+        # open one connection up front so configuration errors surface immediately
+        cnx = self._connect()
+        self._open = 1
+        self._idle.append((cnx, time.monotonic(), time.monotonic()))
+
+    def _connect(self):
+        return mysql.connector.connect(**self._db_config)
+
+    def get_connection(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    cnx, created_at, last_used = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    cnx = None
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    self.failures += 1
+                    raise PoolTimeout(f'no database connection available after {self.timeout}s')
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+        try:
+            now = time.monotonic()
+            if cnx is not None and not self._usable(cnx, created_at, last_used, now):
+                self._discard(cnx)
+                cnx = None
+            if cnx is None:
+                cnx = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self.failures += 1
+                self._cond.notify()
+            raise
+        self._record_wait(time.monotonic() - start)
+        return PooledConnection(self, cnx, created_at)
 
-    db_config = {
+    def _usable(self, cnx, created_at, last_used, now):
+        if self.recycle and now - created_at > self.recycle:
+            self.recycled += 1
+            return False
+        if now - last_used < self.ping_after:
+            return True
+        try:
+            cnx.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, cnx):
+        try:
+            cnx.close()
+        except Exception:
+            pass
+
+    def _checkin(self, cnx, created_at):
+        try:
+            # never hand the next caller someone else's open transaction
+            if cnx.is_connected():
+                cnx.rollback()
+            else:
+                raise ConnectionError('lost connection')
+        except Exception:
+            self._discard(cnx)
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            if len(self._idle) >= self.pool_size:
+                self._open -= 1
+                overflow = cnx
+            else:
+                overflow = None
+                self._idle.append((cnx, created_at, time.monotonic()))
+            self._cond.notify()
+        if overflow is not None:
+            self._discard(overflow)
+
+    def _record_wait(self, waited):
+        with self._cond:
+            self.checkouts += 1
+            self._wait_sum += waited
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self._wait_counts[i] += 1
+                    break
+            else:
+                self._wait_counts[-1] += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': self._open - len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.failures,
+                'checkout_timeouts': self.timeouts,
+                'recycled': self.recycled,
+                'wait_seconds': {
+                    'buckets': dict(zip([str(b) for b in WAIT_BUCKETS] + ['+Inf'], self._wait_counts)),
+                    'sum': round(self._wait_sum, 6),
+                    'count': self.checkouts,
+                },
+            }
+
+
+def _pool_settings():
+    return {
+        'pool_size': int(os.environ.get('MYSQL_POOL_SIZE', '5')),
+        'max_overflow': int(os.environ.get('MYSQL_POOL_MAX_OVERFLOW', '10')),
+        'timeout': float(os.environ.get('MYSQL_POOL_TIMEOUT', '30')),
+        'recycle': int(os.environ.get('MYSQL_POOL_RECYCLE', '3600')),
+        'ping_after': float(os.environ.get('MYSQL_POOL_PING_AFTER', '30')),
+    }
+
+def _db_config():
+    return {
         'host': os.environ.get('MYSQL_HOST', '127.0.0.1'),
         'port': int(os.environ.get('MYSQL_PORT', '3306')),
         'user': os.environ.get('MYSQL_USER', 'root'),
@@ -17,9 +251,16 @@ def get_pool():
         'database': os.environ.get('MYSQL_DATABASE', 'librarydb'),
     }
 
+def get_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    db_config = _db_config()
+
     # Create a connection pool. If the database does not exist, try to create it (best-effort).
     try:
-        _pool = pooling.MySQLConnectionPool(pool_name='libpool', pool_size=5, **db_config)
+        _pool = QueuedPool(**_pool_settings(), **db_config)
         return _pool
     except Exception as e:
         # If unknown database, try to create it and retry
@@ -38,7 +279,7 @@ def get_pool():
                 cur.close()
                 conn.close()
                 # retry pool creation
-                _pool = pooling.MySQLConnectionPool(pool_name='libpool', pool_size=5, **db_config)
+                _pool = QueuedPool(**_pool_settings(), **db_config)
                 return _pool
         except Exception:
             pass
@@ -75,21 +316,49 @@ def get_db():
     conn = pool.get_connection()
     return conn
 
-def init_db():
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.sql')
+
+# one row per version of schema.sql that has been applied to this database
+SCHEMA_VERSIONS_TABLE = """CREATE TABLE IF NOT EXISTS `schema_versions` (
+  `fingerprint` char(64) NOT NULL,
+  `applied_at` datetime NOT NULL,
+  PRIMARY KEY (`fingerprint`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci"""
+
+
+def reset_pool():
+    """Forget the pool inherited from a parent process without closing its sockets,
+    which the parent still owns; the next get_pool() opens this process's own."""
+    global _pool
+    _pool = None
+
+
+def connect(database=True):
+    """A plain connection outside the pool, for one-off work such as startup checks."""
+    config = _db_config()
+    if not database:
+        config.pop('database')
+    return mysql.connector.connect(**config)
+
+
+def init_db(conn=None):
     """Create tables if they do not exist using bundled schema.sql (best-effort).
+    Re-runs every statement, seed data included; ensure_schema() skips it when unchanged.
+    Returns the statements that failed, as (statement, error) pairs.
     """
-    here = os.path.dirname(__file__)
-    schema_path = os.path.join(here, 'schema.sql')
-    if not os.path.exists(schema_path):
+    if not os.path.exists(SCHEMA_PATH):
         print('schema.sql not found, skipping init')
-        return
+        return []
 
-    with open(schema_path, 'r', encoding='utf-8') as f:
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
         sql = f.read()
 
     # split on ; for simple execution
-    conn = get_db()
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db()
     cur = conn.cursor()
+    failed = []
     for stmt in sql.split(';'):
         s = stmt.strip()
         if not s:
@@ -97,8 +366,61 @@ def init_db():
         try:
             cur.execute(s)
         except Exception as e:
+            # the seed INSERTs hit existing rows on every re-run; that is not a failure
+            if getattr(e, 'errno', None) == errorcode.ER_DUP_ENTRY and s.upper().startswith('INSERT'):
+                continue
             # best-effort, continue
             print('init_db statement failed:', e)
+            failed.append((s, e))
     conn.commit()
     cur.close()
-    conn.close()
+    if own_conn:
+        conn.close()
+    return failed
+
+
+def schema_fingerprint():
+    with open(SCHEMA_PATH, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def ensure_schema():
+    """Apply schema.sql unless this exact version of it has been applied before.
+
+    Costs one indexed lookup when nothing changed. Runs on its own connection so
+    a preforking master holds no pooled sockets, and under a named lock so
+    processes starting together apply it once. Returns True if it ran init_db.
+    The version is only recorded once every statement succeeded, so a failed
+    migration is retried on the next start.
+    """
+    if not os.path.exists(SCHEMA_PATH):
+        print('schema.sql not found, skipping init')
+        return False
+    fingerprint = schema_fingerprint()
+    db_name = _db_config()['database']
+    conn = connect(database=False)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}` DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        cur.execute(f'USE `{db_name}`')
+        cur.execute(SCHEMA_VERSIONS_TABLE)
+        cur.execute("SELECT GET_LOCK('schema_migration', 300)")
+        cur.fetchall()
+        try:
+            cur.execute('SELECT 1 FROM `schema_versions` WHERE `fingerprint` = %s', (fingerprint,))
+            if cur.fetchall():
+                return False
+            failed = init_db(conn)
+            # schema.sql may switch databases
+            cur.execute(f'USE `{db_name}`')
+            if failed:
+                print(f'schema.sql: {len(failed)} statement(s) failed, version not recorded')
+                return True
+            cur.execute('INSERT IGNORE INTO `schema_versions` (`fingerprint`, `applied_at`) VALUES (%s, NOW())', (fingerprint,))
+            conn.commit()
+            return True
+        finally:
+            cur.execute("SELECT RELEASE_LOCK('schema_migration')")
+            cur.fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,87 @@
+"""Response JSON encoding, pluggable through JSON_PROVIDER.
+
+JSON_PROVIDER=orjson (the default when orjson is installed) encodes through
+orjson's C encoder; JSON_PROVIDER=default keeps Flask's own provider. Values
+are converted as Flask's default does: Decimal as a string and dates as HTTP
+dates, so clients see the same values. Unlike Flask's default, keys are not
+sorted but kept in insertion order, the same order as the /api/books bodies
+assembled by hand from fragments; the clients in static/js read fields by
+name and nothing depends on key order. dumps() is also what pre-encodes
+cached fragments, so those stay byte-compatible with full responses.
+"""
+import dataclasses
+import decimal
+import json
+import os
+import uuid
+from datetime import date, datetime, timezone
+from email.utils import format_datetime
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder below is used instead
+    orjson = None
+
+PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson' if orjson else 'default').lower()
+
+
+def _http_date(value):
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _default(o):
+    # the conversions of Flask's default provider
+    if isinstance(o, date):
+        return _http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+if orjson is not None and PROVIDER == 'orjson':
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        """Compact JSON as bytes."""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(',', ':'), ensure_ascii=False)
+
+    def dumps(obj):
+        """Compact JSON as bytes."""
+        return _encoder.encode(obj).encode('utf-8')
+
+    loads = json.loads
+
+
+def install(app):
+    """Make `app` (jsonify, request.get_json) use this module's encoder unless JSON_PROVIDER=default."""
+    if PROVIDER == 'default':
+        return
+    from flask.json.provider import DefaultJSONProvider
+
+    class FastJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            if kwargs:
+                # explicit json.dumps options (indent, sort_keys...) keep the stdlib path
+                return super().dumps(obj, **kwargs)
+            return dumps(obj).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return super().loads(s, **kwargs) if kwargs else loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,64 @@
+"""Production launcher settings; gunicorn picks this file up from the working directory:
+
+    gunicorn app:app
+
+Preforks WEB_WORKERS processes of WEB_THREADS threads each. The app is imported
+once in the master (preload_app), which also checks the schema once for the
+whole server and warms the search index and templates before forking, so
+workers start with that state instead of each building it. Connection pools,
+background threads and password-hash processes are created in each worker
+after the fork, never inherited.
+"""
+import os
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', str(min(8, (os.cpu_count() or 1) * 2 + 1))))
+threads = int(os.environ.get('WEB_THREADS', '4'))
+worker_class = 'gthread'
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+# recycle workers now and then so slow leaks cannot build up; jitter keeps them from restarting together
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('WEB_ACCESS_LOG') or None
+
+# every thread of a worker may hold a connection at once
+os.environ.setdefault('MYSQL_POOL_SIZE', str(threads))
+# Each worker caches the catalog, search index and user flags in memory. Writes in other
+# workers reach them through the cache_versions table within CACHE_SIGNAL_INTERVAL
+# seconds; the TTLs below bound the staleness should that signal fail.
+if workers > 1:
+    os.environ.setdefault('SEARCH_INDEX_TTL', '600')
+    os.environ.setdefault('CATALOG_CACHE_TTL', '60')
+    os.environ.setdefault('USER_CACHE_TTL', '30')
+
+
+def on_starting(server):
+    import app
+    from db import ensure_schema
+
+    try:
+        if ensure_schema():
+            server.log.info('schema.sql applied')
+        app.preload()
+    except Exception:
+        # workers still connect and load everything lazily
+        server.log.exception('schema check or preload failed')
+
+
+def post_fork(server, worker):
+    from db import reset_pool
+
+    reset_pool()
+
+
+def post_worker_init(worker):
+    from db import get_pool
+
+    # open the first connection now rather than on the first request
+    try:
+        get_pool()
+    except Exception:
+        worker.log.exception('database not reachable yet')
@@ -0,0 +1,252 @@
+"""Streaming bulk import of catalog feeds (books.json style JSON or CSV) into `books`.
+
+Records are parsed incrementally and written in batches of multi-row
+INSERT ... ON DUPLICATE KEY UPDATE statements, one commit per batch, so memory
+stays bounded by the batch size whatever the feed size. Books are matched on
+their natural key, catalog_key = SHA1(LOWER(title) + CHAR(31) + LOWER(author)),
+so re-importing a feed updates rows in place instead of duplicating them.
+
+    python importer.py books.json
+    python importer.py feed.csv --batch-size 5000
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+import categories
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+
+# books column -> accepted source field names, first match wins
+FIELD_ALIASES = {
+    'title': ('title', 'Books_Name', 'name', 'Title'),
+    'author': ('author', 'Author', 'Books_Author'),
+    'category': ('category', 'Type', 'Category', 'genre'),
+    'price': ('price', 'Books_Price', 'Price_Incl_Tax', 'Price'),
+    'rating': ('rating', 'Books_Rate', 'Rating'),
+    'image_url': ('image_url', 'Image_URL', 'image'),
+    'reviews': ('reviews', 'Reviews'),
+    'has_pdf': ('has_pdf', 'Availability'),
+    'available_copies': ('available_copies', 'Available_Quantity', 'quantity'),
+    'total_copies': ('total_copies', 'Available_Quantity', 'quantity'),
+    'description': ('description', 'Description'),
+}
+COLUMNS = tuple(FIELD_ALIASES)
+NUMERIC = {'price': float, 'rating': int, 'reviews': int, 'has_pdf': int, 'available_copies': int, 'total_copies': int}
+DEFAULTS = {'author': '', 'price': 0.0, 'rating': 0, 'reviews': 0, 'has_pdf': 0, 'available_copies': 1, 'total_copies': 1}
+
+# catalog_key of a (title, author or '') parameter pair; every books insert sets it this way
+CATALOG_KEY_SQL = 'SHA1(CONCAT(LOWER(%s),CHAR(31),LOWER(%s)))'
+# the same key from a row's own columns, for UPDATEs that change title or author
+CATALOG_KEY_COLUMNS_SQL = "SHA1(CONCAT(LOWER(title),CHAR(31),LOWER(COALESCE(author,''))))"
+
+_ROW_SQL = '(' + ','.join(['%s'] * len(COLUMNS)) + ',' + CATALOG_KEY_SQL + ',NOW())'
+_INSERT_SQL = 'INSERT INTO books (' + ','.join(COLUMNS) + ',catalog_key,created_at) VALUES '
+# available_copies is assigned before total_copies so it still sees the old total:
+# copies currently lent out stay lent out when the feed restates the stock level
+_UPSERT_SQL = ''' ON DUPLICATE KEY UPDATE
+    available_copies = GREATEST(VALUES(available_copies) - (total_copies - available_copies), 0),
+    total_copies = VALUES(total_copies),
+    category = VALUES(category), price = VALUES(price), rating = VALUES(rating),
+    image_url = VALUES(image_url), reviews = VALUES(reviews), has_pdf = VALUES(has_pdf),
+    description = VALUES(description)'''
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self.affected = 0
+        self.rejected = 0
+        self.batches = 0
+        self.started = time.monotonic()
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'read': self.read,
+            'written': self.written,
+            # MySQL reports 1 per inserted row, 2 per updated row and 0 per unchanged row
+            'affected_rows': self.affected,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.read / elapsed) if elapsed else 0,
+        }
+
+
+def iter_json_records(fp, chunk_size=65536):
+    """Yield objects from a JSON array, JSON Lines or concatenated JSON stream
+    without reading the whole document into memory."""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    while True:
+        # skip array brackets, separators and whitespace between records
+        while pos < len(buf) and buf[pos] in ' \t\r\n,[]':
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                return
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buf, pos = chunk, 0
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # drop the records already decoded only when reading more, so
+            # each record is copied once rather than the buffer per record
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        pos = end
+        yield obj
+
+
+def iter_csv_records(fp):
+    yield from csv.DictReader(fp)
+
+
+def map_record(record):
+    """Map a source record onto books columns. Returns None when it has no title."""
+    row = {}
+    for column, aliases in FIELD_ALIASES.items():
+        value = next((record[a] for a in aliases if record.get(a) not in (None, '')), None)
+        if value is None:
+            value = DEFAULTS.get(column)
+        elif column in NUMERIC:
+            try:
+                value = NUMERIC[column](float(value))
+            except (TypeError, ValueError):
+                value = DEFAULTS.get(column)
+        row[column] = value
+    if not row['title']:
+        return None
+    row['title'] = str(row['title'])[:512]
+    return row
+
+
+def _write_batch(conn, batch, stats):
+    params = []
+    for row in batch:
+        params.extend(row[c] for c in COLUMNS)
+        params.extend((row['title'], row['author'] or ''))
+    cur = conn.cursor()
+    try:
+        cur.execute(_INSERT_SQL + ','.join([_ROW_SQL] * len(batch)) + _UPSERT_SQL, params)
+        affected = max(cur.rowcount, 0)
+        conn.commit()
+    finally:
+        cur.close()
+    stats.written += len(batch)
+    stats.affected += affected
+    stats.batches += 1
+
+
+def import_books(conn, records, batch_size=None, progress=None):
+    """Write mapped `records` to the books table in batches; returns ImportStats.
+
+    `progress`, if given, is called with the stats after every committed batch.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    stats = ImportStats()
+    batch = []
+    try:
+        for record in records:
+            stats.read += 1
+            row = map_record(record) if isinstance(record, dict) else None
+            if row is None:
+                stats.rejected += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _write_batch(conn, batch, stats)
+                batch = []
+                if progress:
+                    progress(stats)
+        if batch:
+            _write_batch(conn, batch, stats)
+            if progress:
+                progress(stats)
+    except Exception:
+        # batches committed before the failure still moved books between
+        # categories; recount them, but never in place of the original error
+        if stats.batches:
+            try:
+                conn.rollback()
+                _rebuild_categories(conn)
+            except Exception:
+                logger.exception('category_stats rebuild after a failed import failed')
+        raise
+    # upserts can move books between categories, so recount them all once
+    if stats.batches:
+        _rebuild_categories(conn)
+    return stats
+
+
+def _rebuild_categories(conn):
+    cur = conn.cursor()
+    try:
+        categories.rebuild(cur)
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def iter_records(fp, fmt):
+    if fmt == 'csv':
+        return iter_csv_records(fp)
+    return iter_json_records(fp)
+
+
+def detect_format(filename):
+    return 'csv' if filename and filename.lower().endswith('.csv') else 'json'
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Bulk import books from a JSON or CSV feed.')
+    parser.add_argument('path', help='feed file, or - for stdin')
+    parser.add_argument('--format', choices=('json', 'csv'), help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from db import get_pool
+    load_dotenv()
+
+    fmt = args.format or detect_format(args.path)
+    if args.path == '-':
+        fp = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    else:
+        fp = open(args.path, 'r', encoding='utf-8', newline='')
+
+    def report(stats):
+        s = stats.as_dict()
+        print(f"\r{s['read']:,} read, {s['written']:,} written, "
+              f"{s['rejected']:,} rejected ({s['rows_per_second']:,}/s)", end='', file=sys.stderr, flush=True)
+
+    conn = get_pool().get_connection()
+    try:
+        with fp:
+            stats = import_books(conn, iter_records(fp, fmt), args.batch_size, progress=report)
+    finally:
+        conn.close()
+    print(file=sys.stderr)
+    print(json.dumps(stats.as_dict()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,156 @@
+import base64
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+# Hard cap on rows per page for every listing endpoint, whatever the client asks for
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '100'))
+
+
+class CursorError(ValueError):
+    pass
+
+
+def clamp_limit(value, default=20, maximum=None):
+    maximum = maximum or MAX_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(sort, direction, value, last_id):
+    payload = {'s': sort, 'd': direction, 'v': _encode_value(value), 'i': last_id}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Decode an opaque cursor issued for `sort`. Returns (direction, value, last_id)."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        direction = payload['d']
+        last_id = int(payload['i'])
+        value = _decode_value(payload.get('v'))
+    except Exception:
+        raise CursorError('Invalid cursor')
+    if payload.get('s') != sort or direction not in ('next', 'prev'):
+        raise CursorError('Cursor does not match this listing')
+    return direction, value, last_id
+
+
+def _after(column, ascending, value, last_id):
+    """WHERE fragment for rows strictly after (value, last_id) in ORDER BY column, id.
+
+    MySQL sorts NULL first ascending and last descending, so a NULL sort value
+    needs its own branch to keep the cursor stable.
+    """
+    op = '>' if ascending else '<'
+    if column == 'id':
+        return f'id {op} %s', [last_id]
+    if value is None:
+        if ascending:
+            return f'(({column} IS NULL AND id {op} %s) OR {column} IS NOT NULL)', [last_id]
+        return f'({column} IS NULL AND id {op} %s)', [last_id]
+    cond = f'({column} {op} %s OR ({column} = %s AND id {op} %s)'
+    if not ascending:
+        cond += f' OR {column} IS NULL'
+    return cond + ')', [value, value, last_id]
+
+
+def keyset_query(sql, params, sort, column, ascending, cursor=None, limit=20):
+    """Extend `sql` with the seek condition, ORDER BY and LIMIT for one page.
+
+    Returns (sql, params, direction); run it with any driver and hand the rows
+    to keyset_result(). keyset_page() does both with a DB-API cursor.
+    """
+    direction = 'next'
+    params = list(params)
+    if cursor:
+        direction, value, last_id = decode_cursor(cursor, sort)
+        # paging backwards is a forward seek in the opposite order
+        cond, cond_params = _after(column, ascending == (direction == 'next'), value, last_id)
+        sql += ' AND ' + cond
+        params.extend(cond_params)
+    scan_ascending = ascending == (direction == 'next')
+    order = 'ASC' if scan_ascending else 'DESC'
+    if column == 'id':
+        sql += f' ORDER BY id {order}'
+    else:
+        sql += f' ORDER BY {column} {order}, id {order}'
+    sql += ' LIMIT %s'
+    params.append(limit + 1)
+    return sql, tuple(params), direction
+
+
+def keyset_seek(keyed, sort, ascending, cursor=None, limit=20, key=None):
+    """In-memory twin of keyset_query() over `keyed`, a list of (sort key, id) in
+    ascending order. `key` turns a cursor's value into its sort key.
+
+    Returns (ids, direction): up to limit + 1 ids in scan order; fetch their rows
+    in that order and hand them to keyset_result().
+    """
+    direction = 'next'
+    start, stop = 0, len(keyed)
+    if cursor:
+        direction, value, last_id = decode_cursor(cursor, sort)
+        point = (key(value) if key else value, last_id)
+        if ascending == (direction == 'next'):
+            start = bisect_right(keyed, point)
+        else:
+            stop = bisect_left(keyed, point)
+    if ascending == (direction == 'next'):
+        window = keyed[start:min(stop, start + limit + 1)]
+    else:
+        window = keyed[max(start, stop - limit - 1):stop][::-1]
+    return [row_id for _, row_id in window], direction
+
+
+def keyset_result(rows, sort, column, direction, cursor=None, limit=20):
+    """Trim the rows fetched for keyset_query() to the page. Returns (rows, next_cursor, prev_cursor)."""
+    rows = list(rows)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    def token(row, to):
+        return encode_cursor(sort, to, row.get(column) if column != 'id' else None, row['id'])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == 'next':
+            next_cursor = token(rows[-1], 'next') if has_more else None
+            prev_cursor = token(rows[0], 'prev') if cursor else None
+        else:
+            next_cursor = token(rows[-1], 'next')
+            prev_cursor = token(rows[0], 'prev') if has_more else None
+    return rows, next_cursor, prev_cursor
+
+
+def keyset_page(cur, sql, params, sort, column, ascending, cursor=None, limit=20):
+    """Fetch one page of `sql` (which must already contain a WHERE clause) in
+    ORDER BY column, id order, seeking from `cursor` instead of using OFFSET.
+
+    `cur` must be a dictionary cursor and the select list must include id and
+    `column`. Returns (rows, next_cursor, prev_cursor); cursors are None at the
+    ends of the listing.
+    """
+    sql, params, direction = keyset_query(sql, params, sort, column, ascending, cursor, limit)
+    cur.execute(sql, params)
+    return keyset_result(cur.fetchall(), sort, column, direction, cursor, limit)
@@ -0,0 +1,136 @@
+"""Password hashing and verification off the request thread.
+
+pbkdf2 is deliberately slow, so it runs in a small dedicated process pool
+instead of on the web worker. At most PASSWORD_MAX_PENDING calls may be
+queued or running at once; beyond that callers get PasswordPoolBusy right
+away instead of piling up behind a login storm. PASSWORD_HASH_WORKERS=0
+hashes inline, as before.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.hash import pbkdf2_sha256
+
+HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', str(pbkdf2_sha256.default_rounds)))
+WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.environ.get('PASSWORD_MAX_PENDING', str(max(1, WORKERS) * 8)))
+TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+def _hasher(rounds):
+    # min_desired_rounds makes needs_update() flag hashes made with fewer rounds
+    return pbkdf2_sha256.using(rounds=rounds, min_desired_rounds=rounds)
+
+
+def _hash(password, rounds):
+    return _hasher(rounds).hash(password)
+
+
+def _verify(password, hashed, rounds):
+    """Returns (matches, replacement hash or None when the stored one is current)."""
+    hasher = _hasher(rounds)
+    try:
+        if not hasher.verify(password, hashed):
+            return False, None
+    except ValueError:
+        # not a pbkdf2_sha256 hash
+        return False, None
+    return True, hasher.hash(password) if hasher.needs_update(hashed) else None
+
+
+class PasswordPool:
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, timeout=TIMEOUT, rounds=HASH_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the web process has threads and open sockets
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy('Too many password operations in progress')
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self.shutdown()
+            raise PasswordPoolBusy('Password workers restarting')
+        except BaseException:
+            self._release()
+            raise
+        # the slot is held until the work itself finishes, not just until this call gives
+        # up: cancel() cannot stop a task already running in a worker
+        future.add_done_callback(self._release)
+        try:
+            result = future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy('Password operation timed out')
+        except BrokenProcessPool:
+            # a worker died; start a fresh pool on the next call
+            self.shutdown()
+            raise PasswordPoolBusy('Password workers restarting')
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, hashed):
+        """Returns (matches, upgraded hash to store or None)."""
+        if not hashed:
+            return False, None
+        return self._run(_verify, password, hashed, self.rounds)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'rounds': self.rounds,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        # outside the lock: cancelled futures run _release, which takes it
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordPool()
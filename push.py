@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Broker:
+    """In-process fan-out of pushed messages to SSE and long-poll subscribers.
+
+    Each message is stored once in a bounded backlog under an increasing
+    sequence number; subscribers remember the last number they sent and wait
+    on a shared condition, so publishing costs the same for 1 or 1000 clients.
+    A subscriber that falls off the end of the backlog is told to resync.
+    """
+
+    def __init__(self, backlog=256):
+        self._cond = threading.Condition()
+        self._backlog = deque(maxlen=backlog)
+        self._seq = 0
+        self.subscribers = 0
+        self.published = 0
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._seq += 1
+            self._backlog.append((self._seq, kind, data))
+            self.published += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def since(self, seq):
+        """Messages after `seq` as (messages, complete); complete is False when
+        some of them have already dropped out of the backlog."""
+        with self._cond:
+            return self._since(seq)
+
+    def _since(self, seq):
+        if seq > self._seq:
+            # issued by another process or before a restart
+            return [], False
+        messages = [m for m in self._backlog if m[0] > seq]
+        complete = seq == self._seq or (messages and messages[0][0] == seq + 1)
+        return messages, bool(complete)
+
+    def wait(self, seq, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seq, timeout)
+            return self._since(seq)
+
+    def subscribe(self):
+        with self._cond:
+            self.subscribers += 1
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'subscribers': self.subscribers,
+                'last_seq': self._seq,
+                'backlog': len(self._backlog),
+                'published': self.published,
+            }
+
+
+class Pump:
+    """Background thread that runs `tick` while anyone is subscribed.
+
+    `tick` runs at most every `interval` seconds, or sooner after poke(), and
+    never more often than every `min_interval` seconds, so a burst of writes
+    costs one recomputation however many clients are listening.
+    """
+
+    def __init__(self, broker, tick, interval=2.0, min_interval=0.25):
+        self.broker = broker
+        self.tick = tick
+        self.interval = interval
+        self.min_interval = min_interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.ticks = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='push-pump', daemon=True)
+                self._thread.start()
+
+    def poke(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self.broker.subscribers:
+                continue
+            try:
+                self.tick()
+                self.ticks += 1
+            except Exception:
+                logger.exception('push tick failed')
+            time.sleep(self.min_interval)
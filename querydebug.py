@@ -0,0 +1,74 @@
+"""Development-mode query accounting: N+1 detection and per-route query budgets.
+
+Enabled with QUERY_DEBUG=1 (report) or QUERY_DEBUG=strict (also raise
+QueryBudgetExceeded, so a test client sees the regression as an error).
+Every statement executed on the request's connection is recorded by shape,
+i.e. with literals and placeholder lists folded, so the same query issued
+once per row shows up as one shape with a high count.
+"""
+import json
+import os
+import re
+from collections import Counter
+
+MODE = os.environ.get('QUERY_DEBUG', '').lower()
+ENABLED = MODE in ('1', 'true', 'yes', 'strict')
+STRICT = MODE == 'strict'
+# routes without their own @query_budget
+DEFAULT_BUDGET = int(os.environ.get('QUERY_BUDGET_DEFAULT', '10'))
+# a shape executed this many times in one request is reported as a likely N+1
+REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', '3'))
+
+HEADER = 'X-Query-Debug'
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit, **per_method):
+    """Declare the most statements a view may execute per request; keyword
+    arguments (POST=5) set a different budget for a method. Put it directly
+    under @app.route so it applies to the registered view."""
+    def decorator(fn):
+        fn.query_budget = limit
+        fn.query_budgets = per_method
+        return fn
+    return decorator
+
+
+def budget_for(view, method):
+    """The budget of `view` for a request `method`."""
+    budgets = getattr(view, 'query_budgets', {})
+    return budgets.get(method, getattr(view, 'query_budget', DEFAULT_BUDGET))
+
+
+def statement_shape(statement):
+    if isinstance(statement, (bytes, bytearray)):
+        statement = statement.decode('utf-8', 'replace')
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape).replace('%s', '?')
+    shape = _LIST.sub('(?...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def summarize(queries, budget):
+    """`queries` is a list of (shape, seconds) for one request."""
+    counts = Counter(shape for shape, _ in queries)
+    repeated = [{'count': n, 'shape': shape[:160]} for shape, n in counts.most_common(3) if n >= REPEAT_THRESHOLD]
+    return {
+        'queries': len(queries),
+        'sql_ms': round(sum(seconds for _, seconds in queries) * 1000, 2),
+        'budget': budget,
+        'over_budget': budget is not None and len(queries) > budget,
+        'repeated': repeated,
+    }
+
+
+def header_value(summary):
+    return json.dumps(summary, separators=(',', ':'))
@@ -34,7 +34,13 @@ CREATE TABLE IF NOT EXISTS `books` (
   `available_copies` int(11) DEFAULT 1,
   `description` text DEFAULT NULL,
   `created_at` datetime DEFAULT NULL,
-  PRIMARY KEY (`id`)
+  `catalog_key` char(40) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_books_catalog_key` (`catalog_key`),
+  KEY `idx_books_created` (`created_at`,`id`),
+  KEY `idx_books_rating` (`rating`,`id`),
+  KEY `idx_books_title` (`title`,`id`),
+  KEY `idx_books_category` (`category`,`id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=521 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- Dumping data for table librarypro.books: ~518 rows (approximately)
@@ -568,7 +574,9 @@ CREATE TABLE IF NOT EXISTS `borrowings` (
   `status` varchar(50) DEFAULT 'borrowed',
   `notes` text DEFAULT NULL,
   `created_at` datetime DEFAULT current_timestamp(),
+  `active_flag` tinyint(4) GENERATED ALWAYS AS (if(`status` = 'borrowed',1,NULL)) STORED,
   PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_borrowings_active` (`user_id`,`book_id`,`active_flag`),
   KEY `user_id` (`user_id`,`status`),
   KEY `book_id` (`book_id`,`status`),
   CONSTRAINT `borrowings_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
@@ -579,11 +587,14 @@ CREATE TABLE IF NOT EXISTS `borrowings` (
 CREATE TABLE IF NOT EXISTS `password_resets` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
   `user_id` int(11) NOT NULL,
-  `token` varchar(255) NOT NULL,
+  `token` char(64) NOT NULL,
   `expires_at` datetime NOT NULL,
   `used` tinyint(4) DEFAULT 0,
   `created_at` datetime DEFAULT current_timestamp(),
   PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_password_resets_token` (`token`),
+  KEY `idx_password_resets_expires` (`expires_at`),
+  KEY `idx_password_resets_used` (`used`),
   KEY `user_id` (`user_id`),
   CONSTRAINT `password_resets_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -594,9 +605,14 @@ CREATE TABLE IF NOT EXISTS `password_resets` (
 CREATE TABLE IF NOT EXISTS `refresh_tokens` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
   `user_id` int(11) NOT NULL,
-  `token` varchar(255) NOT NULL,
+  `token` char(64) NOT NULL,
   `created_at` datetime DEFAULT NULL,
+  `expires_at` datetime DEFAULT NULL,
+  `revoked_at` datetime DEFAULT NULL,
   PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_refresh_tokens_token` (`token`),
+  KEY `idx_refresh_tokens_expires` (`expires_at`),
+  KEY `idx_refresh_tokens_revoked` (`revoked_at`),
   KEY `user_id` (`user_id`),
   CONSTRAINT `refresh_tokens_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=11 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -617,7 +633,153 @@ CREATE TABLE IF NOT EXISTS `users` (
   `state` varchar(100) DEFAULT NULL,
   `city` varchar(100) DEFAULT NULL,
   `postal_code` varchar(20) DEFAULT NULL,
+  `active_loans` int(11) NOT NULL DEFAULT 0,
+  `token_version` int(11) NOT NULL DEFAULT 0,
+  `token_version_at` datetime DEFAULT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE KEY `email` (`email`)
+  UNIQUE KEY `email` (`email`),
+  KEY `idx_users_name` (`name`),
+  KEY `idx_users_created` (`created_at`,`id`),
+  KEY `idx_users_subscriber_created` (`is_subscriber`,`created_at`,`id`),
+  KEY `idx_users_token_version_at` (`token_version_at`)
 ) ENGINE=InnoDB AUTO_INCREMENT=5 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
+-- Indexes added after the original dump. CREATE TABLE IF NOT EXISTS leaves existing
+-- databases untouched, so init_db also applies them here (IF NOT EXISTS is MariaDB syntax).
+-- Keyset pagination: every listing seeks on (sort column, id)
+ALTER TABLE `books` ADD INDEX IF NOT EXISTS `idx_books_created` (`created_at`,`id`);
+ALTER TABLE `books` ADD INDEX IF NOT EXISTS `idx_books_rating` (`rating`,`id`);
+ALTER TABLE `books` ADD INDEX IF NOT EXISTS `idx_books_title` (`title`,`id`);
+ALTER TABLE `books` ADD INDEX IF NOT EXISTS `idx_books_category` (`category`,`id`);
+ALTER TABLE `users` ADD INDEX IF NOT EXISTS `idx_users_created` (`created_at`,`id`);
+ALTER TABLE `users` ADD INDEX IF NOT EXISTS `idx_users_subscriber_created` (`is_subscriber`,`created_at`,`id`);
+
+-- Before uq_borrowings_active below can be added, any (user, book) with more than one active
+-- loan is collapsed to its newest: the older duplicates are marked returned and their copies
+-- given back to the book. Both statements match nothing once the unique key exists.
+UPDATE `books` bk
+  JOIN (SELECT o.`book_id`, COUNT(DISTINCT o.`id`) AS n
+          FROM `borrowings` o JOIN `borrowings` nw
+            ON nw.`user_id` = o.`user_id` AND nw.`book_id` = o.`book_id` AND nw.`id` > o.`id` AND nw.`status` = 'borrowed'
+          WHERE o.`status` = 'borrowed'
+          GROUP BY o.`book_id`) d ON d.`book_id` = bk.`id`
+  SET bk.`available_copies` = LEAST(bk.`available_copies` + d.n, GREATEST(bk.`total_copies`, bk.`available_copies`));
+UPDATE `borrowings` o
+  JOIN `borrowings` nw
+    ON nw.`user_id` = o.`user_id` AND nw.`book_id` = o.`book_id` AND nw.`id` > o.`id` AND nw.`status` = 'borrowed'
+  SET o.`status` = 'returned', o.`returned_at` = COALESCE(o.`returned_at`, NOW())
+  WHERE o.`status` = 'borrowed';
+
+-- Per-user count of books currently borrowed, kept in step by borrow/return.
+-- The backfill recomputes it from borrowings on each init_db run, which also repairs any drift.
+ALTER TABLE `users` ADD COLUMN IF NOT EXISTS `active_loans` int(11) NOT NULL DEFAULT 0;
+ALTER TABLE `users` ADD INDEX IF NOT EXISTS `idx_users_name` (`name`);
+UPDATE `users` u
+  LEFT JOIN (SELECT `user_id`, COUNT(*) AS n FROM `borrowings` WHERE `status` = 'borrowed' GROUP BY `user_id`) b ON b.`user_id` = u.`id`
+  SET u.`active_loans` = COALESCE(b.n, 0);
+
+-- At most one active loan per (user, book): active_flag is NULL once a loan is returned,
+-- and NULLs never collide in a unique key, so only 'borrowed' rows are constrained.
+-- Existing duplicates were closed above, before the active_loans recount.
+ALTER TABLE `borrowings` ADD COLUMN IF NOT EXISTS `active_flag` tinyint(4) GENERATED ALWAYS AS (if(`status` = 'borrowed',1,NULL)) STORED;
+ALTER TABLE `borrowings` ADD UNIQUE INDEX IF NOT EXISTS `uq_borrowings_active` (`user_id`,`book_id`,`active_flag`);
+
+-- Natural key used by the bulk importer to upsert feed rows: SHA1 of lower(title), CHAR(31), lower(author).
+-- Every insert path sets it (importer.CATALOG_KEY_SQL) and title/author updates recompute it.
+-- UPDATE IGNORE leaves the key NULL on rows that would collide with an existing title/author pair.
+ALTER TABLE `books` ADD COLUMN IF NOT EXISTS `catalog_key` char(40) DEFAULT NULL;
+ALTER TABLE `books` ADD UNIQUE INDEX IF NOT EXISTS `uq_books_catalog_key` (`catalog_key`);
+UPDATE IGNORE `books` SET `catalog_key` = SHA1(CONCAT(LOWER(`title`), CHAR(31), LOWER(COALESCE(`author`, ''))))
+  WHERE `catalog_key` IS NULL;
+
+-- Generation counter behind the role/subscription claims in access tokens: writes that
+-- change is_admin, is_subscriber or status bump it, and claims from older tokens are ignored
+ALTER TABLE `users` ADD COLUMN IF NOT EXISTS `token_version` int(11) NOT NULL DEFAULT 0;
+ALTER TABLE `users` ADD COLUMN IF NOT EXISTS `token_version_at` datetime DEFAULT NULL;
+ALTER TABLE `users` ADD INDEX IF NOT EXISTS `idx_users_token_version_at` (`token_version_at`);
+
+-- Refresh tokens and password reset tokens are stored as SHA-256 hex digests under a unique
+-- index, so lookups are a single index probe. Tokens issued before this change are hashed in
+-- place (raw tokens were 36-character UUIDs). Refresh tokens expire, are spent on use, and
+-- expired/revoked/used rows are purged in batches by the token sweeper.
+UPDATE `refresh_tokens` SET `token` = SHA2(`token`, 256) WHERE CHAR_LENGTH(`token`) <> 64;
+ALTER TABLE `refresh_tokens` MODIFY `token` char(64) NOT NULL;
+ALTER TABLE `refresh_tokens` ADD COLUMN IF NOT EXISTS `expires_at` datetime DEFAULT NULL;
+ALTER TABLE `refresh_tokens` ADD COLUMN IF NOT EXISTS `revoked_at` datetime DEFAULT NULL;
+UPDATE `refresh_tokens` SET `expires_at` = COALESCE(`created_at`, NOW()) + INTERVAL 30 DAY WHERE `expires_at` IS NULL;
+ALTER TABLE `refresh_tokens` ADD UNIQUE INDEX IF NOT EXISTS `uq_refresh_tokens_token` (`token`);
+ALTER TABLE `refresh_tokens` ADD INDEX IF NOT EXISTS `idx_refresh_tokens_expires` (`expires_at`);
+ALTER TABLE `refresh_tokens` ADD INDEX IF NOT EXISTS `idx_refresh_tokens_revoked` (`revoked_at`);
+UPDATE `password_resets` SET `token` = SHA2(`token`, 256) WHERE CHAR_LENGTH(`token`) <> 64;
+ALTER TABLE `password_resets` MODIFY `token` char(64) NOT NULL;
+ALTER TABLE `password_resets` ADD UNIQUE INDEX IF NOT EXISTS `uq_password_resets_token` (`token`);
+ALTER TABLE `password_resets` ADD INDEX IF NOT EXISTS `idx_password_resets_expires` (`expires_at`);
+ALTER TABLE `password_resets` ADD INDEX IF NOT EXISTS `idx_password_resets_used` (`used`);
+
+-- Append-only activity log behind /api/admin/activity, written by register, book adds, borrow and return
+CREATE TABLE IF NOT EXISTS `activity_events` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `type` varchar(32) NOT NULL,
+  `title` varchar(64) NOT NULL,
+  `description` varchar(1024) NOT NULL,
+  `user_id` int(11) DEFAULT NULL,
+  `book_id` int(11) DEFAULT NULL,
+  `created_at` datetime NOT NULL COMMENT 'UTC',
+  PRIMARY KEY (`id`),
+  KEY `idx_activity_created` (`created_at`,`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- One-time backfill from the source tables, in time order, while the log is still empty.
+-- activity_events.created_at is UTC (activity.record stamps new events in UTC), while the
+-- source columns hold session time, so they are converted. CONVERT_TZ needs the time zone
+-- tables for named zones, without them the current UTC offset is applied instead.
+INSERT INTO `activity_events` (`type`, `title`, `description`, `user_id`, `book_id`, `created_at`)
+SELECT t.`type`, t.`title`, t.`description`, t.`user_id`, t.`book_id`,
+       COALESCE(CONVERT_TZ(t.`created_at`, @@session.time_zone, '+00:00'),
+                t.`created_at` - INTERVAL TIMESTAMPDIFF(SECOND, UTC_TIMESTAMP(), NOW()) SECOND)
+FROM (
+  SELECT 'user_registered' AS `type`, 'New User' AS `title`, CONCAT(COALESCE(u.`name`, u.`email`), ' registered to the platform') AS `description`,
+         u.`id` AS `user_id`, NULL AS `book_id`, u.`created_at` AS `created_at`
+    FROM `users` u WHERE u.`created_at` IS NOT NULL
+  UNION ALL
+  SELECT 'book_added', 'Book Added', CONCAT('"', b.`title`, '" added to system'), NULL, b.`id`, b.`created_at`
+    FROM `books` b WHERE b.`created_at` IS NOT NULL
+  UNION ALL
+  SELECT 'book_borrowed', 'Book Borrowed', CONCAT('"', b.`title`, '" borrowed by ', COALESCE(u.`name`, u.`email`)), u.`id`, b.`id`, br.`borrowed_at`
+    FROM `borrowings` br JOIN `books` b ON br.`book_id` = b.`id` JOIN `users` u ON br.`user_id` = u.`id`
+    WHERE br.`borrowed_at` IS NOT NULL
+  UNION ALL
+  SELECT 'book_returned', 'Book Returned', CONCAT('"', b.`title`, '" returned by ', COALESCE(u.`name`, u.`email`)), u.`id`, b.`id`, br.`returned_at`
+    FROM `borrowings` br JOIN `books` b ON br.`book_id` = b.`id` JOIN `users` u ON br.`user_id` = u.`id`
+    WHERE br.`returned_at` IS NOT NULL
+) t
+WHERE NOT EXISTS (SELECT 1 FROM `activity_events`)
+ORDER BY t.`created_at`;
+
+-- Per-category aggregate behind /api/categories and the /api/books facets, kept current by
+-- the catalog write paths (categories.py), avg price is price_total / book_count
+CREATE TABLE IF NOT EXISTS `category_stats` (
+  `category` varchar(255) NOT NULL,
+  `book_count` int(11) NOT NULL DEFAULT 0,
+  `available_copies` int(11) NOT NULL DEFAULT 0,
+  `price_total` decimal(14,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (`category`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- One-time backfill while the aggregate is still empty
+INSERT INTO `category_stats` (`category`, `book_count`, `available_copies`, `price_total`)
+SELECT `category`, COUNT(*), COALESCE(SUM(`available_copies`), 0), COALESCE(SUM(`price`), 0)
+  FROM `books`
+  WHERE `category` IS NOT NULL AND `category` <> ''
+    AND NOT EXISTS (SELECT 1 FROM `category_stats`)
+  GROUP BY `category`;
+
+-- Version counters of cached state, bumped by each write so the other server processes
+-- drop what they derived from it (cache.VersionSignal)
+CREATE TABLE IF NOT EXISTS `cache_versions` (
+  `name` varchar(32) NOT NULL,
+  `version` bigint(20) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+INSERT IGNORE INTO `cache_versions` (`name`, `version`) VALUES ('catalog', 0), ('search', 0), ('users', 0);
@@ -0,0 +1,266 @@
+import math
+import os
+import re
+import threading
+import time
+import heapq
+from bisect import bisect_left, insort
+
+# Fields that take part in catalog search and how much a hit in each one counts
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'author': 2.0,
+    'category': 1.5,
+    'description': 1.0,
+}
+
+# A short prefix such as "th" can match thousands of terms; only expand this many
+PREFIX_EXPANSION_LIMIT = 64
+MIN_PREFIX_LENGTH = 2
+
+# Columns an explicitly sorted search orders its matches by, kept per book next to the postings
+SORT_COLUMNS = ('created_at', 'rating', 'title')
+
+LOAD_SQL = 'SELECT id, ' + ', '.join(dict.fromkeys(tuple(FIELD_WEIGHTS) + SORT_COLUMNS)) + ' FROM books'
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def sort_key(column, value):
+    """Orderable form of a SORT_COLUMNS value: NULL first, as MySQL sorts it ascending,
+    and titles compared case-insensitively like the column's collation."""
+    if value is None:
+        return (0,)
+    if column == 'title':
+        return (1, str(value).casefold())
+    if column == 'rating':
+        return (1, float(value))
+    return (1, value)
+
+
+class BookSearchIndex:
+    """In-process inverted index over the searchable book columns.
+
+    Each token maps to a postings dict of {book_id: weighted term frequency}.
+    Queries AND their terms together (the last one may be a prefix, so type-ahead
+    works) and rank matches with a tf-idf style score. The index is loaded lazily
+    from the database on first use and kept current by calling add()/remove()
+    from the catalog write paths. Each book's SORT_COLUMNS values are kept too,
+    so sorted_matches() can order every match without handing the ids to SQL. Every
+    process keeps its own copy, cleared when another one writes (cache.cache_signal);
+    SEARCH_INDEX_TTL (seconds) also rebuilds it periodically, as a backstop.
+    """
+
+    def __init__(self, ttl=None):
+        if ttl is None:
+            ttl = int(os.environ.get('SEARCH_INDEX_TTL', '0') or 0)
+        self.ttl = ttl
+        # guards the structures below; held only for in-memory work, never across a query
+        self._lock = threading.RLock()
+        # one (re)load at a time, held while the books table is read
+        self._load_lock = threading.RLock()
+        self._postings = {}
+        self._vocab = []
+        self._docs = {}
+        self._loaded_at = None
+        # add()/remove() calls made while load() builds the next contents, or None
+        self._replay = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    @property
+    def loaded(self):
+        if self._loaded_at is None:
+            return False
+        if self.ttl and time.monotonic() - self._loaded_at > self.ttl:
+            return False
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._vocab = []
+            self._docs = {}
+            self._loaded_at = None
+            # a load running now may have read rows from before the change that cleared us
+            self._replay = None
+
+    def begin_load(self):
+        """Start recording add()/remove() calls for load(); call it before reading the rows."""
+        with self._lock:
+            self._replay = []
+            return self._replay
+
+    def load(self, rows, since=None):
+        """Rebuild the index from an iterable of book rows (dicts).
+
+        The new contents are built aside while searches keep using the current
+        ones, then swapped in with the add()/remove() calls made since
+        `since` (what begin_load() returned) replayed onto them.
+        """
+        with self._load_lock:
+            replay = self.begin_load() if since is None else since
+            fresh = BookSearchIndex(self.ttl)
+            for row in rows:
+                fresh._add(row)
+            with self._lock:
+                if self._replay is not replay:
+                    # cleared while building: leave the index unloaded
+                    return
+                for op, arg in replay:
+                    op(fresh, arg)
+                self._postings, self._vocab, self._docs = fresh._postings, fresh._vocab, fresh._docs
+                self._loaded_at = time.monotonic()
+                self._replay = None
+
+    def ensure_loaded(self, conn):
+        """Build the index from the books table unless it is already current.
+        Searches are not held up while the table is read."""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            since = self.begin_load()
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute(LOAD_SQL)
+                self.load(iter(cur.fetchone, None), since)
+            finally:
+                cur.close()
+
+    def add(self, row):
+        """Index (or re-index) a single book row."""
+        with self._lock:
+            self._add(row)
+            if self._replay is not None:
+                self._replay.append((BookSearchIndex._add, row))
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+            if self._replay is not None:
+                self._replay.append((BookSearchIndex._remove, book_id))
+
+    def _add(self, row):
+        book_id = row['id']
+        self._remove(book_id)
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for tok in tokenize(row.get(field)):
+                weights[tok] = weights.get(tok, 0.0) + weight
+        if not weights:
+            return
+        # dampen long descriptions repeating the same word
+        for tok, w in weights.items():
+            postings = self._postings.get(tok)
+            if postings is None:
+                postings = self._postings[tok] = {}
+                insort(self._vocab, tok)
+            postings[book_id] = 1.0 + math.log(w)
+        category = (row.get('category') or '').lower()
+        sort_keys = tuple(sort_key(column, row.get(column)) for column in SORT_COLUMNS)
+        self._docs[book_id] = (tuple(weights), category, sort_keys)
+
+    def _remove(self, book_id):
+        doc = self._docs.pop(book_id, None)
+        if doc is None:
+            return
+        for tok in doc[0]:
+            postings = self._postings.get(tok)
+            if postings is None:
+                continue
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[tok]
+                i = bisect_left(self._vocab, tok)
+                if i < len(self._vocab) and self._vocab[i] == tok:
+                    del self._vocab[i]
+
+    def _expand(self, term, prefix):
+        terms = []
+        if term in self._postings:
+            terms.append((term, 1.0))
+        if prefix and len(term) >= MIN_PREFIX_LENGTH:
+            i = bisect_left(self._vocab, term)
+            while i < len(self._vocab) and len(terms) < PREFIX_EXPANSION_LIMIT:
+                tok = self._vocab[i]
+                if not tok.startswith(term):
+                    break
+                if tok != term:
+                    terms.append((tok, 0.5))
+                i += 1
+        return terms
+
+    def search(self, query, category=None, limit=None):
+        """Return [(book_id, score), ...] best first for books matching every query term."""
+        with self._lock:
+            scores = self._scores(query, category)
+        ranked = ((s, b) for b, s in scores.items())
+        if limit is not None:
+            top = heapq.nlargest(limit, ranked)
+        else:
+            top = sorted(ranked, reverse=True)
+        return [(b, s) for s, b in top]
+
+    def sorted_matches(self, query, column, category=None):
+        """Return [(sort_key, book_id), ...] ascending for the books search() matches,
+        keyed on `column` (one of SORT_COLUMNS)."""
+        pos = SORT_COLUMNS.index(column)
+        with self._lock:
+            keyed = [(self._docs[b][2][pos], b) for b in self._scores(query, category)]
+        keyed.sort()
+        return keyed
+
+    def _scores(self, query, category):
+        """book_id -> score of the books matching every term of `query`; call with the lock held."""
+        terms = tokenize(query)
+        if not terms:
+            return {}
+        category = category.lower() if category else None
+        total = len(self._docs) or 1
+        per_term = []
+        for pos, term in enumerate(terms):
+            expanded = self._expand(term, prefix=(pos == len(terms) - 1))
+            if not expanded:
+                return {}
+            per_term.append(expanded)
+        # intersect starting from the rarest term so the candidate set stays small
+        per_term.sort(key=lambda ex: sum(len(self._postings[t]) for t, _ in ex))
+        scores = None
+        for expanded in per_term:
+            term_scores = {}
+            for tok, boost in expanded:
+                postings = self._postings[tok]
+                idf = math.log(1.0 + total / len(postings))
+                if scores is None:
+                    for book_id, w in postings.items():
+                        term_scores[book_id] = term_scores.get(book_id, 0.0) + w * idf * boost
+                else:
+                    for book_id in scores:
+                        w = postings.get(book_id)
+                        if w is not None:
+                            term_scores[book_id] = term_scores.get(book_id, 0.0) + w * idf * boost
+            if scores is not None:
+                for book_id in term_scores:
+                    term_scores[book_id] += scores[book_id]
+            scores = term_scores
+            if not scores:
+                return {}
+        if category:
+            scores = {b: s for b, s in scores.items() if self._docs[b][1] == category}
+        return scores
+
+
+_index = BookSearchIndex()
+
+
+def get_search_index():
+    return _index
@@ -10,6 +10,10 @@
   let api;
   let statsRefreshInterval;
   let activityRefreshInterval;
+  let eventSource = null;
+  let longPollActive = false;
+  let liveStats = null;
+  let liveActivity = [];
   let isInitialized = false;
   let connectionRetryCount = 0;
   const MAX_RETRY_COUNT = 3;
@@ -291,6 +295,10 @@
       }
     }
 
+    renderDashboardStats(stats, isLiveData, errorDetails);
+  }
+
+  function renderDashboardStats(stats, isLiveData = false, errorDetails = null) {
     // Update the stat cards with error state if needed
     updateStatCard(1, stats.total_books, stats.books_this_month, "books", "Total Books", isLiveData, errorDetails);
     updateStatCard(2, stats.total_users, stats.users_this_week, "users", "Active Users", isLiveData, errorDetails);
@@ -565,25 +573,127 @@
   // -------------------------
   // Real-time Updates with Pool Awareness
   // -------------------------
-  function startRealTimeUpdates() {
-    // Refresh stats every 30 seconds, but slow down if pool issues
-    const statsInterval = connectionRetryCount > 0 ? 60000 : 30000;
-    statsRefreshInterval = setInterval(loadDashboardStats, statsInterval);
+  // -------------------------
+  // Live updates pushed by the server: one shared stream instead of timers.
+  // EventSource first, long-polling where it is unavailable, timers as a last resort.
+  // -------------------------
+  function applySnapshot(snapshot) {
+    liveStats = Object.assign({}, snapshot.stats);
+    liveActivity = snapshot.activity || [];
+    renderDashboardStats(liveStats, true);
+    renderActivityList(liveActivity, true);
+  }
 
-    // Refresh activity every minute, adjust based on connection health
-    const activityInterval = connectionRetryCount > 0 ? 120000 : 60000;
-    activityRefreshInterval = setInterval(loadRecentActivity, activityInterval);
+  function applyUpdate(type, data) {
+    if (type === 'stats') {
+      // a resumed stream or long-poll starts with the full stats, possibly before any snapshot
+      liveStats = Object.assign(liveStats || {}, data);
+      renderDashboardStats(liveStats, true);
+    } else if (type === 'activity') {
+      liveActivity = [data].concat(liveActivity || []).slice(0, 10);
+      renderActivityList(liveActivity, true);
+    }
+  }
+
+  // `since` is the id of the last event seen; ids are the same on every server process,
+  // so a reopened stream only sends what was missed
+  function startEventStream(since) {
+    let opened = false;
+    let lastId = since;
+    const source = eventSource = new EventSource('/api/admin/stream' + api._buildQuery({ since }));
+    const handle = apply => e => {
+      if (e.lastEventId) lastId = e.lastEventId;
+      apply(JSON.parse(e.data));
+    };
+    source.addEventListener('open', () => { opened = true; });
+    source.addEventListener('snapshot', handle(applySnapshot));
+    source.addEventListener('stats', handle(data => applyUpdate('stats', data)));
+    source.addEventListener('activity', handle(data => applyUpdate('activity', data)));
+    source.addEventListener('error', () => {
+      // while CONNECTING the browser is reconnecting by itself
+      if (source.readyState !== EventSource.CLOSED || eventSource !== source) return;
+      eventSource = null;
+      if (!opened) {
+        // refused outright (e.g. every stream slot taken): long-poll instead
+        startLongPoll();
+        return;
+      }
+      // a working stream the server stopped accepting, usually a 401 once the access token
+      // behind the session cookie expired: renew the session and resume, else long-poll
+      api.bootstrapSession()
+        .then(() => startEventStream(lastId))
+        .catch(() => startLongPoll());
+    });
+  }
+
+  async function startLongPoll() {
+    longPollActive = true;
+    let seq = null;
+    let statsTag = null;
+    let failures = 0;
+    while (longPollActive) {
+      try {
+        const res = await api.request('/admin/updates' + api._buildQuery({ since: seq, stats: statsTag }), 'GET', null, true, { timeout: 40000 });
+        const data = res.data || {};
+        if (data.snapshot) applySnapshot(data.snapshot);
+        (data.events || []).forEach(ev => applyUpdate(ev.type, ev.data));
+        seq = data.seq;
+        statsTag = data.stats_tag;
+        failures = 0;
+        // the server could not hold the request open; do not ask again straight away
+        if (data.retry_ms) await new Promise(resolve => setTimeout(resolve, data.retry_ms));
+      } catch (err) {
+        if (++failures >= MAX_RETRY_COUNT) {
+          console.warn("Live updates unavailable, falling back to polling:", err.message);
+          longPollActive = false;
+          startPolling();
+          return;
+        }
+        await new Promise(resolve => setTimeout(resolve, 5000 * failures));
+      }
+    }
+  }
 
+  async function startRealTimeUpdates() {
     // Refresh badges every 2 minutes
     setInterval(() => {
       updateMessageBadge();
       updateNotificationBadge();
     }, 120000);
 
+    if (window.EventSource) {
+      try {
+        // EventSource cannot send an Authorization header; authenticate it with the session cookie
+        await api.bootstrapSession();
+        startEventStream();
+        console.log("🔄 Live updates started (server-sent events)");
+        return;
+      } catch (err) {
+        console.warn("Could not start event stream:", err.message);
+      }
+    }
+    startLongPoll();
+    console.log("🔄 Live updates started (long polling)");
+  }
+
+  function startPolling() {
+    // Refresh stats every 30 seconds, but slow down if pool issues
+    const statsInterval = connectionRetryCount > 0 ? 60000 : 30000;
+    statsRefreshInterval = setInterval(loadDashboardStats, statsInterval);
+
+    // Refresh activity every minute, adjust based on connection health
+    const activityInterval = connectionRetryCount > 0 ? 120000 : 60000;
+    activityRefreshInterval = setInterval(loadRecentActivity, activityInterval);
+
     console.log(`🔄 Real-time updates started (stats: ${statsInterval}ms, activity: ${activityInterval}ms)`);
   }
 
   function stopRealTimeUpdates() {
+    if (eventSource) {
+      eventSource.close();
+      eventSource = null;
+    }
+    longPollActive = false;
     if (statsRefreshInterval) {
       clearInterval(statsRefreshInterval);
       statsRefreshInterval = null;
@@ -176,7 +176,7 @@ function updatePreview() {
 async function loadBooks({ page = 1, limit = 50, search = '' } = {}) {
   try {
     const q = new URLSearchParams({ page, limit, search }).toString();
-    const res = await api.getBooks({ page, limit, search });
+    const res = await api.getBooks({ page, limit, search, fields: 'id,title,author,category,price,available_copies', facets: false });
     // Normalize response
     let books = [];
     if (res && res.data && Array.isArray(res.data.books)) books = res.data.books;
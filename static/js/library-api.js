@@ -323,8 +323,14 @@ class LibraryAPI {
   }
 
   // Books (examples)
-  getBooks({ page = 1, limit = 10, category = null, search = null, sort = null } = {}) {
-    const q = this._buildQuery({ page, limit, category, search, sort });
+  // `fields` (array or comma-separated string) picks the columns of each book; the
+  // server defaults to a compact card projection, full records come from getBook().
+  // The first page also carries data.facets.categories (name, count, available_copies,
+  // avg_price); pass facets: false to skip them or true to get them on any page
+  getBooks({ page = 1, limit = 10, category = null, search = null, sort = null, fields = null, facets = null } = {}) {
+    if (Array.isArray(fields)) fields = fields.join(',');
+    if (facets !== null) facets = facets ? 1 : 0;
+    const q = this._buildQuery({ page, limit, category, search, sort, fields, facets });
     return this.request(`/books${q}`, 'GET');
   }
   getCategories() {
@@ -22,14 +22,14 @@ async function initializeLibrary() {
     }
     // Then refresh from API (non-blocking for first paint)
     try {
-        const latest = await api.getBooks({ page: 1, limit: 12, search: null });
+        const latest = await api.getBooks({ page: 1, limit: 12, search: null, fields: 'id,title,author,category,price,rating,image_url,availability,reviews', facets: false });
         const list = (latest && latest.data && latest.data.books) ? latest.data.books : [];
         if (list.length) {
             booksData.new = list.slice(0, 8);
             booksData.trending = list.slice(0, 8);
             booksData.all = list;
         }
-        const popularRes = await api.getBooks({ page: 1, limit: 12, search: null });
+        const popularRes = await api.getBooks({ page: 1, limit: 12, search: null, fields: 'id,title,author,category,price,rating,image_url,availability,reviews', facets: false });
         const popList = (popularRes && popularRes.data && popularRes.data.books) ? popularRes.data.books : [];
         if (popList.length) {
             booksData.popular = popList.slice(0, 8);
@@ -91,7 +91,16 @@ function openBookModal(bookId) {
     document.getElementById('modalAuthor').textContent = `by ${book.author}`;
     document.getElementById('modalRating').textContent = `⭐ ${book.rating}`;
     document.getElementById('modalReviews').textContent = `(${book.reviews} reviews)`;
-    document.getElementById('modalDescription').textContent = book.description;
+    document.getElementById('modalDescription').textContent = book.description || '';
+    if (book.description === undefined) {
+        // listings carry card fields only; fetch the full record for the description
+        new LibraryAPI().getBook(bookId).then(res => {
+            if (res && res.status === 'success' && res.data) {
+                book.description = res.data.description || '';
+                document.getElementById('modalDescription').textContent = book.description;
+            }
+        }).catch(() => {});
+    }
     document.getElementById('modalGenre').textContent = book.genre;
     document.getElementById('modalYear').textContent = book.year;
     document.getElementById('modalPages').textContent = book.pages;
@@ -48,29 +48,36 @@ window.LibraryAPI = window.LibraryAPI || class {
 };
 
 const api = new LibraryAPI('/api');
+// card fields plus what the grid sorts and badges on; the modal loads the full record
+const LIST_FIELDS = 'id,title,author,category,price,rating,image_url,availability,available_copies,total_copies,reviews';
 
 async function loadBooks() {
     try {
         console.log('Loading books...');
-        const response = await api.getBooks({ limit: 50 });
+        const response = await api.getBooks({ limit: 50, fields: LIST_FIELDS });
         
         if (response.status === 'success') {
             console.log('Books loaded successfully:', response.data.books.length);
             // cache master and last results for client-side features
             window.__allBooks = response.data.books;
             window.__lastBooks = response.data.books;
-            // populate categories from server
-            try {
-                const catsRes = await api.getCategories();
-                if (catsRes && catsRes.status === 'success' && catsRes.data && Array.isArray(catsRes.data.categories)) {
-                    const chips = document.querySelector('.filter-chips');
-                    if (chips) {
-                        const cats = ['All', ...catsRes.data.categories];
-                        chips.innerHTML = cats.map(c => `<div class="chip">${c}</div>`).join('');
-                    }
-                }
-            } catch (e) {
-                console.warn('Failed to load categories, using default chips', e);
+            // category chips with their counts come with the listing
+            const facets = response.data.facets && response.data.facets.categories;
+            const chips = document.querySelector('.filter-chips');
+            if (chips && Array.isArray(facets)) {
+                const total = facets.reduce((n, f) => n + f.count, 0);
+                chips.replaceChildren(...[{ category: 'All', count: total }, ...facets].map(f => {
+                    const chip = document.createElement('div');
+                    chip.className = 'chip';
+                    chip.dataset.category = f.category;
+                    chip.append(`${f.category} `);
+                    const count = document.createElement('small');
+                    count.className = 'chip-count';
+                    count.textContent = f.count;
+                    chip.append(count);
+                    return chip;
+                }));
+                chips.firstChild.classList.add('active');
             }
 
             displayBooks(response.data.books);
@@ -306,19 +313,29 @@ function setupEventListeners() {
     
     // Category chips
     document.querySelectorAll('.chip').forEach(chip => {
-        chip.addEventListener('click', function(e) {
+        chip.addEventListener('click', async function(e) {
             // toggle active state (only one active at a time for now)
             document.querySelectorAll('.chip').forEach(c => c.classList.remove('active'));
             this.classList.add('active');
-            const category = this.textContent.trim();
-            // filter using master list
+            const category = this.dataset.category || this.textContent.trim();
             const all = window.__allBooks || window.__lastBooks || [];
             if (!all.length || category === 'All') {
                 displayBooks(all);
                 setupEventListeners();
                 return;
             }
-            const filtered = all.filter(b => (b.category || '').toLowerCase().includes(category.toLowerCase()));
+            // the server filters the whole catalog by category; fall back to the loaded list
+            let filtered;
+            try {
+                const res = await api.getBooks({ limit: 50, category, fields: LIST_FIELDS, facets: false });
+                filtered = res.status === 'success' ? res.data.books : null;
+            } catch (err) {
+                filtered = null;
+            }
+            if (!filtered) {
+                filtered = all.filter(b => (b.category || '').toLowerCase().includes(category.toLowerCase()));
+            }
+            window.__lastBooks = filtered;
             displayBooks(filtered);
             setupEventListeners();
         });
@@ -393,7 +410,14 @@ function openBookModal(bookId) {
     updateElement('.book-details > p', `by ${book.author || 'Unknown Author'}`);
     updateElement('.rating-value', book.rating || '4.0');
     updateElement('.reviews', `(${book.reviews || '0'} reviews)`);
-    updateElement('.description', book.description || 'No description available');
+    updateElement('.description', book.description || 'Loading description...');
+    if (book.description === undefined && typeof api.getBook === 'function') {
+        api.getBook(bookId).then(res => {
+            if (res && res.status === 'success' && res.data) Object.assign(book, res.data);
+        }).catch(() => {}).finally(() => {
+            if (window.__currentBook === book) updateElement('.description', book.description || 'No description available');
+        });
+    }
     
     // Update meta items
     const metaItems = modal.querySelectorAll('.meta-item');
@@ -526,7 +550,7 @@ function searchBooks(event) {
     // try server-side search first
     (async () => {
         try {
-            const res = await api.getBooks({ search: query, limit: 100 });
+            const res = await api.getBooks({ search: query, limit: 100, fields: LIST_FIELDS, facets: false });
             if (res && res.status === 'success' && Array.isArray(res.data.books)) {
                 window.__lastBooks = res.data.books;
                 displayBooks(res.data.books);
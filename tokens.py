@@ -0,0 +1,263 @@
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_DAYS = int(os.environ.get('REFRESH_TOKEN_DAYS', '30'))
+# live refresh tokens kept per user; logging in again past this drops the oldest session
+MAX_SESSIONS_PER_USER = int(os.environ.get('MAX_SESSIONS_PER_USER', '10'))
+# rotated-out refresh tokens are kept this long so a replayed one can be recognised
+REVOKED_RETENTION_HOURS = int(os.environ.get('REFRESH_REVOKED_RETENTION_HOURS', '24'))
+RESET_TOKEN_MINUTES = int(os.environ.get('RESET_TOKEN_MINUTES', '60'))
+
+# Version of the user claims embedded in access tokens; bump it when their shape changes
+# and tokens issued before the change fall back to a users-table lookup.
+CLAIMS_VERSION = 1
+
+# Writes that change a user's role, subscription or status add this to their UPDATE
+# so claims already issued in tokens stop being trusted.
+BUMP_TOKEN_VERSION = 'token_version = token_version + 1, token_version_at = NOW()'
+
+# how far back each incremental sync re-reads, to catch bumps committed late
+_SYNC_OVERLAP_SECONDS = 10
+
+
+def user_claims(row):
+    """Claims for an access token from a users row carrying is_admin, is_subscriber, status and token_version."""
+    return {
+        'v': CLAIMS_VERSION,
+        'gen': row.get('token_version') or 0,
+        'admin': bool(row.get('is_admin')),
+        'subscriber': bool(row.get('is_subscriber')),
+        'status': row.get('status'),
+    }
+
+
+class TokenGenerations:
+    """users.token_version of every user whose claims have ever been revoked.
+
+    Claims in a token are trusted only while their `gen` is at least the
+    user's current version. Versions are synced for all users at once by an
+    incremental `token_version_at >= last seen` query at most every
+    `sync_interval` seconds, so checking a token never costs a per-request
+    users lookup; bumps made by this process are seen on the next check.
+    """
+
+    def __init__(self, sync_interval=2.0):
+        self.sync_interval = sync_interval
+        # guards the synced state; held only to apply rows, never across a query
+        self._lock = threading.Lock()
+        # one sync at a time, held while the users table is read
+        self._sync_lock = threading.Lock()
+        self._versions = {}
+        self._synced_through = None
+        self._synced_at = None
+        self.syncs = 0
+
+    def mark_stale(self):
+        self._synced_at = None
+
+    def due(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval
+
+    def sync_query(self):
+        """(sql, params) of the next incremental sync; feed its rows to apply()."""
+        if self._synced_through is None:
+            return 'SELECT id, token_version, token_version_at FROM users WHERE token_version_at IS NOT NULL', ()
+        return ('SELECT id, token_version, token_version_at FROM users WHERE token_version_at >= %s - INTERVAL %s SECOND',
+                (self._synced_through, _SYNC_OVERLAP_SECONDS))
+
+    def apply(self, rows):
+        with self._lock:
+            for row in rows:
+                if row['token_version'] > self._versions.get(row['id'], 0):
+                    self._versions[row['id']] = row['token_version']
+                if self._synced_through is None or row['token_version_at'] > self._synced_through:
+                    self._synced_through = row['token_version_at']
+            if self._synced_through is None:
+                # nothing revoked yet; later syncs scan the index from the start
+                self._synced_through = datetime(1970, 1, 1)
+            self._synced_at = time.monotonic()
+            self.syncs += 1
+
+    def _sync(self, conn):
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(*self.sync_query())
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        self.apply(rows)
+
+    def current(self, user_id, connect):
+        """Current token version of `user_id`; `connect` is only called when a sync is due."""
+        if self.due():
+            with self._sync_lock:
+                if self.due():
+                    self._sync(connect())
+        return self._versions.get(user_id, 0)
+
+    def version(self, user_id):
+        """Last synced version, without syncing."""
+        return self._versions.get(user_id, 0)
+
+    def stats(self):
+        return {'revoked_users': len(self._versions), 'syncs': self.syncs, 'sync_interval': self.sync_interval}
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def hash_token(token):
+    """Only this digest is stored, so a leaked table cannot be replayed; the unique index is on it."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_refresh_token(cur, user_id):
+    """Insert a new refresh token for `user_id` and trim the user's sessions to
+    MAX_SESSIONS_PER_USER. Runs in the caller's transaction; returns the raw token."""
+    token = new_token()
+    cur.execute('INSERT INTO refresh_tokens (user_id, token, created_at, expires_at) '
+                'VALUES (%s, %s, NOW(), NOW() + INTERVAL %s DAY)',
+                (user_id, hash_token(token), REFRESH_TOKEN_DAYS))
+    cur.execute('''DELETE FROM refresh_tokens WHERE user_id = %s AND revoked_at IS NULL AND id NOT IN (
+                       SELECT id FROM (SELECT id FROM refresh_tokens WHERE user_id = %s AND revoked_at IS NULL
+                                       ORDER BY id DESC LIMIT %s) newest)''',
+                (user_id, user_id, MAX_SESSIONS_PER_USER))
+    return token
+
+
+def rotate_refresh_token(cur, token):
+    """Spend `token` and issue its replacement in the caller's transaction.
+
+    `cur` must be a dictionary cursor. Returns (users row, new raw token), or
+    None when the token is unknown, expired or already spent. Presenting a
+    spent token again means it was copied, so every session of that user is
+    revoked.
+    """
+    cur.execute('''SELECT rt.id, rt.user_id, rt.expires_at < NOW() AS expired, rt.revoked_at,
+                          u.is_admin, u.is_subscriber, u.status, u.token_version
+                   FROM refresh_tokens rt JOIN users u ON u.id = rt.user_id
+                   WHERE rt.token = %s''', (hash_token(token),))
+    row = cur.fetchone()
+    if not row or row['expired']:
+        return None
+    if row['revoked_at'] is not None:
+        revoke_user_sessions(cur, row['user_id'])
+        return None
+    # guarded so two concurrent refreshes with the same token cannot both succeed
+    cur.execute('UPDATE refresh_tokens SET revoked_at = NOW() WHERE id = %s AND revoked_at IS NULL', (row['id'],))
+    if cur.rowcount == 0:
+        return None
+    return row, issue_refresh_token(cur, row['user_id'])
+
+
+def revoke_refresh_token(cur, token):
+    cur.execute('UPDATE refresh_tokens SET revoked_at = NOW() WHERE token = %s AND revoked_at IS NULL', (hash_token(token),))
+
+
+def revoke_user_sessions(cur, user_id):
+    cur.execute('UPDATE refresh_tokens SET revoked_at = NOW() WHERE user_id = %s AND revoked_at IS NULL', (user_id,))
+
+
+def issue_reset_token(cur, user_id):
+    """Insert a single-use password reset token; returns (raw token, expires_at)."""
+    token = new_token()
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=RESET_TOKEN_MINUTES)
+    # stored as naive UTC and compared with UTC_TIMESTAMP()
+    cur.execute('INSERT INTO password_resets (user_id, token, expires_at, used, created_at) VALUES (%s,%s,%s,0,NOW())',
+                (user_id, hash_token(token), expires_at.replace(tzinfo=None)))
+    return token, expires_at
+
+
+def claim_reset_token(cur, token):
+    """Mark `token` used in the caller's transaction. Returns (user_id, None), or
+    (None, reason) when it cannot be used."""
+    cur.execute('SELECT id, user_id, used, expires_at < UTC_TIMESTAMP() AS expired FROM password_resets WHERE token = %s',
+                (hash_token(token),))
+    row = cur.fetchone()
+    if not row:
+        return None, 'Invalid token'
+    if row['used']:
+        return None, 'Token already used'
+    if row['expired']:
+        return None, 'Token expired'
+    cur.execute('UPDATE password_resets SET used = 1 WHERE id = %s AND used = 0', (row['id'],))
+    if cur.rowcount == 0:
+        return None, 'Token already used'
+    return row['user_id'], None
+
+
+# (table, condition) pairs the sweeper deletes in batches; each condition is served by an index
+_SWEEPS = (
+    ('refresh_tokens', 'expires_at < NOW()'),
+    ('refresh_tokens', f'revoked_at < NOW() - INTERVAL {REVOKED_RETENTION_HOURS} HOUR'),
+    ('password_resets', 'expires_at < UTC_TIMESTAMP()'),
+    ('password_resets', 'used = 1'),
+)
+
+
+class TokenSweeper:
+    """Background thread purging expired, revoked and used tokens.
+
+    Deletes at most `batch_size` rows per statement and commits between
+    batches, so a large backlog never holds long locks on the tables.
+    """
+
+    def __init__(self, connect, interval=300.0, batch_size=1000):
+        self.connect = connect
+        self.interval = interval
+        self.batch_size = batch_size
+        self._thread = None
+        self._lock = threading.Lock()
+        self.deleted = 0
+        self.runs = 0
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='token-sweeper', daemon=True)
+                self._thread.start()
+
+    def sweep(self):
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            deleted = 0
+            for table, condition in _SWEEPS:
+                while True:
+                    cur.execute(f'DELETE FROM {table} WHERE {condition} LIMIT %s', (self.batch_size,))
+                    conn.commit()
+                    deleted += cur.rowcount
+                    if cur.rowcount < self.batch_size:
+                        break
+            cur.close()
+        finally:
+            conn.close()
+        self.deleted += deleted
+        self.runs += 1
+        return deleted
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('token sweep failed')
+            time.sleep(self.interval)
+
+    def stats(self):
+        return {'runs': self.runs, 'deleted': self.deleted, 'interval': self.interval, 'batch_size': self.batch_size}
+
+
+token_generations = TokenGenerations(
+    sync_interval=float(os.environ.get('TOKEN_VERSION_SYNC_SECONDS', '2')),
+)